@@ -0,0 +1,186 @@
+import asyncio
+import time
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from multidict import CIMultiDict
+from types import SimpleNamespace
+from Crawler import Crawler
+from DnsCache import CachedResolver
+
+class AsyncCrawler(Crawler):
+    '''
+    Asyncio variant of the Crawler. A single event loop runs `num_workers` coroutines sharing one aiohttp session,
+    so thousands of fetches can be in flight at once, while the Frontier's back queue heap still enforces per-host politeness.
+    Responses are converted to `requests.Response` objects, so the Corpus and parsing code is shared with the threaded Crawler.
+    '''
+
+    def __init__(self, seeds: list[str], to_crawl: int, verbose: bool=False, num_workers: int=1000, **kwargs):
+        '''Takes the same arguments as `Crawler`, `num_workers` being the number of coroutines'''
+        super().__init__(seeds, to_crawl, verbose, num_workers, **kwargs)
+        self.session = None
+
+    def _setup_sessions(self) -> None:
+        'A single aiohttp session is shared by all coroutines, created inside the event loop'
+        self.pool = None
+
+    def run(self) -> None:
+        '''Runs the whole crawl in a new event loop, returning when the target number of pages was crawled'''
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        connector = aiohttp.TCPConnector(limit=self.num_workers, resolver=CachedResolver(self.dns), use_dns_cache=False)
+        timeout = aiohttp.ClientTimeout(total=5)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers,
+                                         trace_configs=[self._observer()]) as session:
+            self.session = session
+            self.policies.session = session
+            await asyncio.gather(*(self.crawl_async(i) for i in range(self.num_workers)))
+
+        self.corpus.close()
+        self.close_metrics()
+
+    def _observer(self) -> aiohttp.TraceConfig:
+        '''
+        Reports every request of the session to `PolicyManager.observe`, as HostPool does for the threaded Crawler,
+        and the time to open new connections to `metrics`, as DnsCache does.
+        '''
+
+        async def on_start(session, ctx, params):
+            ctx.start = time.monotonic()
+
+        async def on_end(session, ctx, params):
+            self.policies.observe(str(params.url), time.monotonic() - ctx.start, params.response.status,
+                                  params.response.headers.get('Retry-After'))
+
+        async def on_exception(session, ctx, params):
+            self.policies.observe(str(params.url), time.monotonic() - ctx.start, None)
+
+        async def on_connect_start(session, ctx, params):
+            ctx.connect_start = time.perf_counter()
+
+        async def on_connect_end(session, ctx, params):
+            self.metrics.observe('connect_seconds', time.perf_counter() - ctx.connect_start)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_exception)
+        trace.on_connection_create_start.append(on_connect_start)
+        trace.on_connection_create_end.append(on_connect_end)
+        return trace
+
+    async def crawl_async(self, worker: int) -> None:
+        '''Coroutine version of `Crawler.crawl`, only storing pages differently'''
+
+        while not self.done():
+            if self.controller is not None:
+                await self.controller.admit_async(worker)
+            res = await self.frontier.get_async(self.fetch_url_async, worker)
+            if res == None: #Fetch unsuccesful (errors, robots.txt, not HTML...), or frontier closed
+                if not self.frontier.closed:
+                    self.metrics.count('fetches_dropped_total')
+                continue
+
+            depth = self.frontier.depth(worker)
+            if self.handle_response(res, depth, worker):
+                date = await self.corpus.write_async(res.url, res)
+                self.page_stored(res, depth, date)
+
+        self.frontier.close()
+        if self.controller is not None:
+            self.controller.close()
+
+    async def fetch_url_async(self, url: str) -> requests.Response | None:
+        '''
+        Coroutine version of `Crawler.fetch_url`, honoring `fetch_mode` the same way.
+        Returns None if fetch was unsucessful according to `robots.txt` or other errors.
+        '''
+
+        if not await self.policies.can_fetch_async(url):
+            return None
+
+        if self.fetch_mode == 'stream':
+            return await self.fetch_streamed_async(url)
+
+        previous, headers = self.conditional_headers(url)
+        try:
+            with self.metrics.timer('fetch_seconds{method="head"}'):
+                head = await self.session.head(url, allow_redirects=False, headers=headers)
+            async with head:
+                head.raise_for_status()
+                if head.status == 304:
+                    return self._to_response(url, head, b'', previous) if previous is not None else None
+
+                mime = head.headers.get('Content-Type', '')
+                if not ('text/html' in mime or head.status in [301, 302, 307, 308]):
+                    return None
+
+            with self.metrics.timer('fetch_seconds{method="get"}'):
+                resp = await self.session.get(url, allow_redirects=False)
+                async with resp:
+                    resp.raise_for_status()
+                    if resp.status == 304: #Sent without validators
+                        return None
+                    body = await resp.read()
+            return self._to_response(url, resp, body)
+
+        except Exception: #Broad crawl, fine to skip everything
+            return None
+
+    async def fetch_streamed_async(self, url: str) -> requests.Response | None:
+        '''Coroutine version of `Crawler.fetch_streamed`'''
+
+        previous, headers = self.conditional_headers(url)
+        try:
+            with self.metrics.timer('fetch_seconds{method="get"}'): #Until headers arrive
+                resp = await self.session.get(url, allow_redirects=False, headers=headers)
+            async with resp:
+                if resp.status >= 400:
+                    return None
+
+                if resp.status == 304:
+                    return self._to_response(url, resp, b'', previous) if previous is not None else None
+
+                if resp.status in [301, 302, 307, 308]:
+                    return self._to_response(url, resp, b'')
+
+                mime = resp.headers.get('Content-Type', '')
+                if 'text/html' not in mime or (resp.content_length or 0) > self.max_body_size:
+                    resp.close() #Drop the connection instead of draining the body
+                    return None
+
+                deadline = time.monotonic() + self.max_fetch_time
+                chunks = []
+                size = 0
+                with self.metrics.timer('download_seconds'):
+                    async for chunk in resp.content.iter_chunked(64 * 1024):
+                        size += len(chunk)
+                        if size > self.max_body_size or time.monotonic() > deadline:
+                            resp.close()
+                            return None
+                        chunks.append(chunk)
+
+                return self._to_response(url, resp, b''.join(chunks))
+
+        except Exception:
+            return None
+
+    def _to_response(self, url: str, resp: aiohttp.ClientResponse, body: bytes, previous: dict=None) -> requests.Response:
+        'Wraps an aiohttp response and its body into a `requests.Response`, with the ValidatorIndex entry it was fetched with'
+
+        res = requests.Response()
+        res.status_code = resp.status
+        res.reason = resp.reason
+        res.url = url
+        res.headers = CaseInsensitiveDict(resp.headers)
+        res.encoding = get_encoding_from_headers(res.headers)
+        res._content = body
+        res.previous = previous
+
+        #Corpus reads the raw headers and protocol, as urllib3 exposes them
+        res.raw = SimpleNamespace(headers=CIMultiDict(resp.headers),
+                                  version_string=f"HTTP/{resp.version.major}.{resp.version.minor}")
+        return res
@@ -0,0 +1,60 @@
+from array import array
+
+class BackQueue:
+    '''
+    FIFO of the URLs of a single host, as the Frontier's back queues hold them: `(depth, path)` pairs, `path` being what
+    follows `scheme://netloc`, as the host is only kept once by the frontier.
+
+    Paths are stored UTF-8 encoded, one after the other in a single buffer, with their end offsets and depths in arrays.
+    A queued URL costs the bytes of its path and 6 more, instead of a tuple and a str with their object headers.
+    Popped entries are reclaimed once they make up half the queue, or at once when it drains.
+    '''
+
+    __slots__ = ('data', 'ends', 'depths', 'head')
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array('I') #End offset of each path in `data`
+        self.depths = array('H')
+        self.head = 0 #First entry not popped yet
+
+    def append(self, depth: int, path: str) -> None:
+        self.data += path.encode()
+        self.ends.append(len(self.data))
+        self.depths.append(min(depth, 0xFFFF))
+
+    def popleft(self) -> tuple[int, str]:
+        i = self.head
+        if i >= len(self.ends):
+            raise IndexError('pop from an empty BackQueue')
+
+        start = self.ends[i - 1] if i else 0
+        entry = self.depths[i], self.data[start:self.ends[i]].decode()
+        self.head += 1
+
+        if self.head == len(self.ends): #Drained, start over
+            self.data = bytearray()
+            self.ends = array('I')
+            self.depths = array('H')
+            self.head = 0
+        elif self.head >= 64 and 2 * self.head >= len(self.ends):
+            self._compact()
+        return entry
+
+    def __len__(self) -> int:
+        return len(self.ends) - self.head
+
+    def __iter__(self):
+        start = self.ends[self.head - 1] if self.head else 0
+        for i in range(self.head, len(self.ends)):
+            yield self.depths[i], self.data[start:self.ends[i]].decode()
+            start = self.ends[i]
+
+    def _compact(self) -> None:
+        'Drops popped entries from the buffer and arrays'
+
+        offset = self.ends[self.head - 1]
+        del self.data[:offset]
+        self.ends = array('I', [end - offset for end in self.ends[self.head:]])
+        self.depths = self.depths[self.head:]
+        self.head = 0
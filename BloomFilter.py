@@ -5,7 +5,7 @@ class BloomFilter:
     '''Class representing a Bloom Filter, a probabilistic set-like structure which saves memory by not storing items themselves,
     but hashing the items and storing them int a bitarray'''
 
-    def __init__(self, num_items: int, epsilon: float=0.01):
+    def __init__(self, num_items: int, epsilon: float=0.01, key: bytes=b'bloom'):
         #Number of hash functions
         self.k = int(math.ceil(-math.log(epsilon) / math.log(2)))
 
@@ -14,44 +14,49 @@ class BloomFilter:
 
         self.bitset = bytearray((self.size + 7) // 8)
 
-        #Good practice would be to parameterize this
-        self.hash_func = hashlib.sha512
+        #Keyed blake2b, 16 bytes are enough for two 64 bit hashes
+        self.hash_func = hashlib.blake2b
+        self.key = key
 
     def add(self, s:str):
         '''Adds `s` into bloom filter'''
 
+        self.check_and_add(s)
+
+    def check(self, s:str):
+        '''Checks if `s` is in bloom filter'''
         h1, h2 = self._get_h1_h2(s)
         hsh = h1
+        bitset = self.bitset
         for _ in range(self.k):
-            self._set_bit(hsh)
-            #Apply Kirsch-Mitzenmacher-Optimization hi = h1 + ih2 mod m
-            #Should work OK even if self.size is not a prime?
+            if not (bitset[hsh >> 3] >> (hsh & 7)) & 1: return False
             hsh = (hsh + h2) % self.size
 
-    def check(self, s:str):
-        '''Checks if `s` is in bloom filter'''
+        return True
+
+    def check_and_add(self, s:str) -> bool:
+        '''Adds `s` into bloom filter, returning if it was already there. Hashes only once, unlike `check` followed by `add`'''
+
         h1, h2 = self._get_h1_h2(s)
         hsh = h1
+        bitset = self.bitset
+        present = True
         for _ in range(self.k):
-            if not self._check_bit(hsh): return False
+            byte, bit = hsh >> 3, 1 << (hsh & 7)
+            if not bitset[byte] & bit:
+                present = False
+                bitset[byte] |= bit
+            #Apply Kirsch-Mitzenmacher-Optimization hi = h1 + ih2 mod m
             hsh = (hsh + h2) % self.size
-        
-        return True
+
+        return present
 
     def _get_h1_h2(self, s:str):
         '''Gets hashes `h1` and `h2`, which can determine all k hashes (Kirsch-Mitzenmacher optimization)'''
-        full = self.hash_func(s.encode()).hexdigest()
+        digest = self.hash_func(s.encode(), digest_size=16, key=self.key).digest()
 
-        #Splits the SHA512 in half
-        h1 = int(full[:64], 16) % self.size
-        h2 = int(full[64:], 16) % self.size
+        #Splits the digest into two 64 bit integers
+        h1 = int.from_bytes(digest[:8], 'little') % self.size
+        h2 = int.from_bytes(digest[8:], 'little') % self.size
 
         return h1, h2
-    
-    def _set_bit(self, b: int):
-        'Sets bit `b` in bitset'
-        self.bitset[b // 8] |= (1 << (b % 8))
-    
-    def _check_bit(self, b: int):
-        'Checks bit `b` in bitset'
-        return (self.bitset[b // 8] >> (b % 8)) & 1
\ No newline at end of file
@@ -0,0 +1,154 @@
+import os
+import json
+import heapq
+import zlib
+from io import BytesIO
+from urllib.parse import urlsplit
+from warcio.archiveiterator import ArchiveIterator
+
+def surt(url: str) -> str:
+    '''
+    Gets the SURT form of an URL, the sort key of CDX indexes: scheme and `www.` are dropped and host labels are reversed,
+    so captures of the same site sort together. `http://www.example.com/a?b` becomes `com,example)/a?b`.
+    '''
+
+    parts = urlsplit(url.lower())
+    host = parts.hostname or ''
+    if host.startswith('www.'):
+        host = host[4:]
+
+    labels = host.split('.')
+    key = host if all(l.isdigit() for l in labels) else ','.join(reversed(labels)) #IPs are kept as they are
+    if parts.port and parts.port not in (80, 443):
+        key += f":{parts.port}"
+
+    key += ')' + (parts.path or '/')
+    if parts.query:
+        key += '?' + parts.query
+    return key
+
+def cdx_line(url: str, timestamp: str, fields: dict) -> str:
+    '''Builds a CDXJ line: SURT key, 14 digit timestamp and a JSON block'''
+
+    return f"{surt(url)} {timestamp} {json.dumps(fields, separators=(',', ':'))}\n"
+
+def merge_indexes(paths: list[str], target: str) -> None:
+    '''Merges sorted CDXJ files into `target`, streaming them'''
+
+    files = [open(p, 'rb') for p in paths]
+    try:
+        with open(target + '.tmp', 'wb') as out:
+            out.writelines(heapq.merge(*files))
+    finally:
+        for f in files:
+            f.close()
+
+    os.replace(target + '.tmp', target)
+
+def index_warc(path: str) -> list[str]:
+    '''
+    Builds the sorted CDXJ lines of a `.warc.gz` file written by Corpus, reading it back, for files whose index was never
+    written (a crawl killed before rotating or closing it). Stops at a truncated record, the one being written at the time.
+    '''
+
+    entries = []
+    with open(path, 'rb') as f:
+        records = ArchiveIterator(f)
+        try:
+            for record in records:
+                if record.rec_type not in ('response', 'revisit'):
+                    continue
+
+                url = record.rec_headers.get_header('WARC-Target-URI')
+                timestamp = ''.join(c for c in record.rec_headers.get_header('WARC-Date') if c.isdigit())
+                http = record.http_headers
+                mime = 'warc/revisit' if record.rec_type == 'revisit' else \
+                       (http.get_header('Content-Type') or '').split(';', 1)[0].strip()
+                fields = {'url': url, 'mime': mime, 'status': http.get_statuscode(),
+                          'digest': record.rec_headers.get_header('WARC-Payload-Digest')}
+                record.content_stream().read() #Offsets and lengths are known once the record is consumed
+
+                fields.update({'length': str(records.get_record_length()), 'offset': str(records.get_record_offset()),
+                               'filename': os.path.basename(path)})
+                for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+                    if http.get_header(header) is not None:
+                        fields[key] = http.get_header(header)
+                entries.append((url, timestamp, fields))
+        except Exception: #Truncated gzip member or record
+            pass
+
+        if entries: #Only the last member can be cut short, warcio reads what there is of it
+            fields = entries[-1][2]
+            f.seek(int(fields['offset']))
+            member = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            member.decompress(f.read(int(fields['length'])))
+            if not member.eof:
+                entries.pop()
+
+    return sorted(cdx_line(*entry) for entry in entries)
+
+class CdxIndex:
+    '''
+    Lookups into a sorted CDXJ index, such as the ones written by Corpus. The index is binary searched on disk, so a lookup reads
+    O(log n) lines, and a capture is loaded by seeking straight to its offset and decompressing only its own gzip member.
+    WARC filenames are resolved relative to the index's directory.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.file = open(path, 'rb')
+        self.size = os.path.getsize(path)
+
+    def lookup(self, url: str) -> list[dict]:
+        '''Returns every capture of `url`, oldest first, as the JSON fields of its index line plus its `timestamp`'''
+
+        key = surt(url).encode() + b' '
+        self.file.seek(self._bisect(key))
+
+        captures = []
+        for line in self.file:
+            if not line.startswith(key):
+                break
+            _, timestamp, fields = line.split(b' ', 2)
+            captures.append({**json.loads(fields), 'timestamp': timestamp.decode()})
+        return captures
+
+    def load(self, capture: dict):
+        '''Reads the WARC record of a capture returned by `lookup`. Its payload is at `record.content_stream()`.'''
+
+        with open(os.path.join(self.directory, capture['filename']), 'rb') as f:
+            f.seek(int(capture['offset']))
+            data = f.read(int(capture['length']))
+
+        return next(iter(ArchiveIterator(BytesIO(data))))
+
+    def close(self) -> None:
+        self.file.close()
+
+    def _bisect(self, key: bytes) -> int:
+        '''Offset of the first line not smaller than `key`'''
+
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._line_start(mid)
+            self.file.seek(start)
+            if self.file.readline() < key:
+                lo = self.file.tell()
+            else:
+                hi = start
+
+        return lo
+
+    def _line_start(self, offset: int) -> int:
+        'Offset of the line containing byte `offset`'
+
+        while offset > 0:
+            step = min(offset, 4096)
+            self.file.seek(offset - step)
+            i = self.file.read(step).rfind(b'\n')
+            if i != -1:
+                return offset - step + i + 1
+            offset -= step
+        return 0
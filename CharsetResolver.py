@@ -0,0 +1,74 @@
+import re
+import codecs
+from charset_normalizer import from_bytes
+
+#`charset=` parameter of a Content-Type header, quoted or not
+header_regex = re.compile(r'charset\s*=\s*["\']?([^"\'\s;,]+)', re.IGNORECASE)
+
+#<meta charset="..."> and <meta http-equiv="Content-Type" content="...; charset=..."> alike, since both end up with charset=
+meta_regex = re.compile(rb'<meta\b[^>]*?charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.()+-]+)', re.IGNORECASE)
+
+boms = [(codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF32_LE, 'utf-32-le'), (codecs.BOM_UTF32_BE, 'utf-32-be'),
+        (codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')] #UTF-32 LE starts like UTF-16 LE, check it first
+
+class CharsetResolver:
+    '''
+    Finds the encoding of an HTML response without decoding or scanning all of it, trying in order: the Content-Type header,
+    a byte order mark, a `<meta>` charset declaration in the first `sniff_size` bytes, and only then whether those bytes are
+    valid UTF-8, or statistical detection (charset_normalizer) on them. Falls back to `default`.
+    '''
+
+    def __init__(self, sniff_size: int=4096, detect_size: int=32768, default: str='utf-8'):
+        self.sniff_size = sniff_size
+        self.detect_size = detect_size
+        self.default = default
+
+    def resolve(self, content_type: str | None, body: bytes) -> str:
+        '''Gets the encoding of `body`, given the Content-Type header of its response (if any)'''
+
+        return (self.from_header(content_type) or self.from_bom(body) or self.from_meta(body) or self.detect(body)
+                or self.default)
+
+    def from_header(self, content_type: str | None) -> str | None:
+        if not content_type:
+            return None
+
+        match = header_regex.search(content_type)
+        return self._lookup(match.group(1)) if match else None
+
+    def from_bom(self, body: bytes) -> str | None:
+        for bom, encoding in boms:
+            if body.startswith(bom):
+                return encoding
+        return None
+
+    def from_meta(self, body: bytes) -> str | None:
+        match = meta_regex.search(body, 0, self.sniff_size)
+        if match is None:
+            return None
+
+        encoding = self._lookup(match.group(1).decode('ascii'))
+        if encoding is not None and encoding.startswith('utf-16'): #The declaration itself was read as ASCII, so it is wrong
+            return 'utf-8'
+        return encoding
+
+    def detect(self, body: bytes) -> str | None:
+        '''Detects the encoding from the first `detect_size` bytes: UTF-8 if they decode as such, else charset_normalizer's guess'''
+
+        prefix = body[:self.detect_size]
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(prefix) #Not final, a character can be cut at the end
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+
+        best = from_bytes(prefix).best()
+        return self._lookup(best.encoding) if best is not None else None
+
+    def _lookup(self, name: str) -> str | None:
+        'Canonical codec name, or None if Python does not know the encoding'
+
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            return None
@@ -0,0 +1,164 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+class ConcurrencyController:
+    '''
+    Adapts how many workers fetch at once, between `min_workers` and `max_workers`, AIMD style, resizing the Frontier's
+    back queues along with it. The frontier is sampled a few times per `interval` seconds, and once per interval the limit
+    is decided from the fetches completed (see `fetch_seconds` in Metrics), their mean latency, and how many back queues
+    were ready and how many workers idle on average:
+
+    - Mean latency over `latency_tolerance` times the lowest one of the last `window` intervals means the crawler or the
+      network is saturated, and so does throughput falling after the limit grew: the limit is cut by `backoff`.
+    - Ready back queues with no idle worker mean workers are the bottleneck: the limit grows, doubling until the first
+      cut (slow start), then one at a time.
+    - Over half the workers idle with nothing ready means few hosts, or only slow ones, are left: the limit is cut too,
+      releasing their back queues.
+
+    Crawlers start `max_workers` workers, which call `admit` before each fetch and park there while their id is over
+    the limit. Parked workers hold no URL, so the frontier does not count them as able to add any.
+    '''
+
+    def __init__(self, frontier, metrics, min_workers: int, max_workers: int, interval: float=1, backoff: float=.75,
+                 latency_tolerance: float=2, window: int=30):
+        self.frontier = frontier
+        self.metrics = metrics
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+
+        self.cond = threading.Condition() #Parked workers wait here for the limit to grow
+        self.limit = min_workers
+        self.parked = 0
+        self.closed = False
+
+        #Only used by the control loop
+        self.latencies = deque(maxlen=window) #Mean fetch latency of recent intervals
+        self.fetches, self.fetch_time = metrics.totals('fetch_seconds')
+        self.throughput = 0 #Fetches per second of the last interval
+        self.slow_start = True
+        self.grew = False
+        self.ready = self.idle = self.samples = 0
+
+        frontier.resize(self.limit)
+        metrics.gauge('worker_limit', lambda: self.limit)
+        metrics.gauge('active_workers', lambda: self.max_workers - self.parked)
+
+    def start(self) -> None:
+        threading.Thread(target=self._loop, daemon=True, name='concurrency').start()
+
+    def close(self) -> None:
+        'Stops adapting, and lets every parked worker go'
+
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def admit(self, worker: int) -> None:
+        '''Waits while `worker` is over the limit. Called by every worker before asking the frontier for an URL.'''
+
+        if worker < self.limit:
+            return
+
+        with self.cond:
+            if worker < self.limit or self.closed:
+                return
+            self._park(worker)
+            while worker >= self.limit and not self.closed:
+                self.cond.wait()
+            self._unpark(worker)
+
+    async def admit_async(self, worker: int) -> None:
+        '''Async version of `admit`, polling the limit without blocking the event loop'''
+
+        if worker < self.limit:
+            return
+
+        with self.cond:
+            if worker < self.limit or self.closed:
+                return
+            self._park(worker)
+        while worker >= self.limit and not self.closed:
+            await asyncio.sleep(self.interval / 5)
+        with self.cond:
+            self._unpark(worker)
+
+    def tick(self, elapsed: float) -> int:
+        '''Decides the limit from what was seen over the last `elapsed` seconds, applying and returning it'''
+
+        fetches, fetch_time = self.metrics.totals('fetch_seconds')
+        done, spent = fetches - self.fetches, fetch_time - self.fetch_time
+        self.fetches, self.fetch_time = fetches, fetch_time
+
+        ready, idle = self.ready / max(self.samples, 1), self.idle / max(self.samples, 1)
+        self.ready = self.idle = self.samples = 0
+
+        throughput = done / elapsed
+        latency = spent / done if done else None
+        if latency is not None:
+            self.latencies.append(latency)
+
+        limit = self.limit
+        if latency is not None and latency > self.latency_tolerance * min(self.latencies):
+            limit = self._cut('latency')
+        elif self.grew and throughput < self.throughput * .8: #More workers, fewer fetches
+            limit = self._cut('throughput')
+        elif ready >= 1 and idle < 1: #Work waiting for a worker
+            limit = limit * 2 if self.slow_start else limit + 1
+            self.metrics.count('concurrency_changes_total{reason="ready"}')
+        elif idle > limit / 2 and ready < 1:
+            limit = self._cut('idle')
+
+        limit = max(self.min_workers, min(self.max_workers, limit))
+        self.grew = limit > self.limit
+        self.throughput = throughput
+        self._set(limit)
+        return limit
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {'limit': self.limit, 'parked': self.parked, 'throughput': self.throughput}
+
+    def _cut(self, reason: str) -> int:
+        self.slow_start = False
+        self.metrics.count(f'concurrency_changes_total{{reason="{reason}"}}')
+        return int(self.limit * self.backoff)
+
+    def _set(self, limit: int) -> None:
+        if limit == self.limit:
+            return
+
+        with self.cond:
+            self.limit = limit
+            self.cond.notify_all()
+        self.frontier.resize(limit)
+
+    def _park(self, worker: int) -> None:
+        'Lock before calling this!'
+
+        self.parked += 1
+        self.frontier.park(worker)
+
+    def _unpark(self, worker: int) -> None:
+        'Lock before calling this!'
+
+        self.parked -= 1
+        self.frontier.unpark(worker)
+
+    def _loop(self) -> None:
+        last = time.monotonic()
+        while not self.closed:
+            time.sleep(self.interval / 5)
+            ready, idle = self.frontier.load()
+            self.ready += ready
+            self.idle += idle
+            self.samples += 1
+
+            now = time.monotonic()
+            if now - last >= self.interval and not self.closed:
+                self.tick(now - last)
+                last = now
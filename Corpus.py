@@ -1,18 +1,101 @@
 import sys
+import os
+import glob
 from warcio.warcwriter import WARCWriter
 from warcio.statusandheaders import StatusAndHeaders
 from io import BytesIO
+from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
 import requests
 import threading
+import asyncio
+from CdxIndex import cdx_line, merge_indexes, index_warc
+
+#Revisit profiles: payload identical to another record's, or the server answered 304 Not Modified
+identical_profile = 'http://netpreserve.org/warc/1.0/revisit/identical-payload-digest'
+not_modified_profile = 'http://netpreserve.org/warc/1.0/revisit/server-not-modified'
+
+def validators(headers_list: list) -> dict:
+    '''Gets the `etag` and `last_modified` index fields from response headers, for the ones present'''
+
+    fields = {}
+    for k, v in headers_list:
+        k = k.lower()
+        if k == 'etag':
+            fields['etag'] = v
+        elif k == 'last-modified':
+            fields['last_modified'] = v
+    return fields
+
+def last_file(target_directory: str, base_name: str='pages') -> int:
+    '''Number of the last `base_name-xxxx.warc.gz` file in `target_directory`, 0 if there is none'''
+
+    nums = [os.path.basename(p)[len(base_name) + 1:-len('.warc.gz')]
+            for p in glob.glob(f"{glob.escape(target_directory)}/{glob.escape(base_name)}-*.warc.gz")]
+    return max((int(n) for n in nums if n.isdigit()), default=0)
+
+def build_record(url: str, status_line: str, headers_list: list, protocol: str, payload: bytes) -> tuple[bytes, dict]:
+    '''
+    Builds a complete WARC response record as its own gzip member, ready to be appended to a `.warc.gz` file.
+    Also returns the fields of its index entry. Module level, so it can run in a process pool.
+    '''
+
+    out = BytesIO()
+    writer = WARCWriter(out, gzip=True)
+    http_headers = StatusAndHeaders(status_line, headers_list, protocol=protocol)
+
+    #warcio expects a stream, so convert content to stream
+    record = writer.create_warc_record(url, 'response', payload=BytesIO(payload), http_headers=http_headers)
+    writer.write_record(record)
+
+    mime = next((v for k, v in headers_list if k.lower() == 'content-type'), '')
+    date = record.rec_headers.get_header('WARC-Date')
+    meta = {'url': url, 'date': date, 'timestamp': ''.join(c for c in date if c.isdigit()),
+            'mime': mime.split(';', 1)[0].strip(), 'status': status_line.split(' ', 1)[0],
+            'digest': record.rec_headers.get_header('WARC-Payload-Digest'), **validators(headers_list)}
+
+    return out.getvalue(), meta
+
+def build_revisit(url: str, status_line: str, headers_list: list, protocol: str, digest: str, refers_to_url: str,
+                  refers_to_date: str, profile: str=identical_profile) -> tuple[bytes, dict]:
+    '''
+    Builds a WARC revisit record as its own gzip member, for a response whose payload was already stored in the response
+    record of `refers_to_url` at `refers_to_date`. Only the HTTP headers are kept.
+    '''
+
+    out = BytesIO()
+    writer = WARCWriter(out, gzip=True)
+    http_headers = StatusAndHeaders(status_line, headers_list, protocol=protocol)
+
+    record = writer.create_revisit_record(url, digest, refers_to_url, refers_to_date, http_headers=http_headers)
+    record.rec_headers.replace_header('WARC-Profile', profile)
+    writer.write_record(record)
+
+    date = record.rec_headers.get_header('WARC-Date')
+    meta = {'url': url, 'date': date, 'timestamp': ''.join(c for c in date if c.isdigit()),
+            'mime': 'warc/revisit', 'status': status_line.split(' ', 1)[0], 'digest': digest, **validators(headers_list)}
+
+    return out.getvalue(), meta
 
 class Corpus:
     '''
     Class responsible for writing WARC format entries, given request response, storing into local storage.
+
+    Records are built and compressed by the calling threads, in parallel and without any lock (zlib releases the GIL),
+    or in a pool of `processes` processes if given. Each record is a separate gzip member, so a single writer thread
+    only has to append finished members to the current file, rotating files every `pages_ratio` records.
+
+    The writer thread also records the offset and compressed length of every record, writing a sorted CDXJ index per WARC file
+    (`base_name-xxxx.cdxj`), all of them merged into `base_name.cdxj` on close. See CdxIndex for lookups.
     '''
-    def __init__(self, target_directory: str, base_name='pages', pages_ratio=1000):
+    def __init__(self, target_directory: str, base_name='pages', pages_ratio=1000, first_file=1, processes=0, queue_size=1000,
+                 metrics=None):
         '''
         Pages are split into separate files, each one of them with `pages_ratio` WARC entries.
-        Files are then stored as `"target_directory/base_name-xxxx.warc.gz"`
+        Files are then stored as `"target_directory/base_name-xxxx.warc.gz"`, numbered from `first_file`.
+        At most `queue_size` finished records wait for the writer thread, after which `write` blocks.
+        With `metrics` (see Metrics), the time spent in `write` and the contention of the lock are reported.
+        Previous files left without an index by a crash are indexed again first, see `_rebuild_indexes`.
         '''
 
         self.target_directory = target_directory
@@ -20,46 +103,170 @@ class Corpus:
         self.pages_ratio = pages_ratio
         if self.pages_ratio <= 0:
             sys.exit("error: pages per file ratio <= 0")
-        
-        self.file_num = 1
+
+        self.file_num = first_file
         self.count = 0
-        self.lock = threading.Lock()
+        self.metrics = metrics
+        self.lock = metrics.lock('corpus') if metrics is not None else threading.Lock()
+        self.closed = False
+
+        self.pool = ProcessPoolExecutor(processes) if processes > 0 else None
+
+        if self._rebuild_indexes():
+            self._merge_indexes()
+
+        self._open_file()
+        self.index = [] #CDXJ lines of the current file
+
+        self.queue = Queue(queue_size) #Finished (gzip member, index fields), or Events for `flush`
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
 
-        self.cur_file = open(f"{self.target_directory}/{self.base_name}-{self.file_num}.warc.gz", 'wb')
-        self.writer = WARCWriter(self.cur_file, gzip=True)
-    
     def _next_file(self) -> None:
-        'Lock before calling this! Closes current file, increments file counter and opens new .warc file for future writing.'
+        'Writer thread only! Closes current file, increments file counter and opens new .warc file for future writing.'
         self.cur_file.close()
+        self._write_index()
         self.count = 0
         self.file_num += 1
 
-        #Refresh file and writer
-        self.cur_file = open(f"{self.target_directory}/{self.base_name}-{self.file_num}.warc.gz", 'wb')
-        self.writer = WARCWriter(self.cur_file, gzip=True)
-    
-    def write(self, url: str, resp: requests.Response) -> None:
-        'Takes in raw response content and append to current file, swapping if necessary'
+        #Refresh file
+        self._open_file()
+
+    def _open_file(self) -> None:
+        '''
+        Opens file `file_num` for writing, overwriting the one a previous run may have left, and removes its index,
+        which no longer matches it. A new one is written on rotation or close.
+        '''
+
+        path = f"{self.target_directory}/{self.base_name}-{self.file_num}"
+        self.cur_file = open(f"{path}.warc.gz", 'wb')
+        if os.path.exists(f"{path}.cdxj"):
+            os.remove(f"{path}.cdxj")
+
+    def write(self, url: str, resp: requests.Response) -> str:
+        '''
+        Takes in raw response content, compresses it into a record and hands it to the writer thread.
+        Returns the WARC date of the record, which revisits of it refer to.
+        '''
+
+        if self.metrics is not None:
+            with self.metrics.timer('corpus_write_seconds'):
+                return self._write(url, resp)
+        return self._write(url, resp)
+
+    def _write(self, url: str, resp: requests.Response) -> str:
+        args = (url, f"{resp.status_code} {resp.reason}", list(resp.raw.headers.items()),
+                getattr(resp.raw, 'version_string', 'HTTP/1.1'), resp.content)
+
+        if self.pool is not None:
+            record = self.pool.submit(build_record, *args).result()
+        else:
+            record = build_record(*args)
+
+        self.queue.put(record)
+        return record[1]['date']
+
+    async def write_async(self, url: str, resp: requests.Response) -> str:
+        'Async version of `write`. Compression and disk writes run on the default executor, off the event loop.'
+        return await asyncio.get_running_loop().run_in_executor(None, self.write, url, resp)
+
+    def write_revisit(self, url: str, resp: requests.Response, digest: str, refers_to_url: str, refers_to_date: str,
+                      not_modified: bool=False) -> None:
+        '''
+        Writes a revisit record for a response whose payload, with digest `digest`, is already stored as the capture of
+        `refers_to_url` at `refers_to_date` (a WARC date), or `not_modified` since then for a 304 response.
+        Revisits are small, so they are always built by the calling thread.
+        '''
+
+        self.queue.put(build_revisit(url, f"{resp.status_code} {resp.reason}", list(resp.raw.headers.items()),
+                                     getattr(resp.raw, 'version_string', 'HTTP/1.1'), digest, refers_to_url, refers_to_date,
+                                     not_modified_profile if not_modified else identical_profile))
+
+    def flush(self) -> None:
+        'Blocks until every record handed to `write` so far is written to disk'
+
+        done = threading.Event()
+        with self.lock: #Once closed, everything was written already
+            if self.closed:
+                return
+            self.queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        'Writes pending records and closes current file, if not yet closed.'
         with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        self.queue.put(None)
+        self.writer_thread.join()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def _writer_loop(self) -> None:
+        '''Appends finished records to the current file, the only place where files are touched'''
+
+        while True:
+            record = self.queue.get()
+
+            if record is None: #Closed
+                self.cur_file.close()
+                self._write_index()
+                self._merge_indexes()
+                return
+
+            if isinstance(record, threading.Event): #Flush
+                self.cur_file.flush()
+                record.set()
+                continue
+
             #Get next file if needed
             if self.count == self.pages_ratio:
                 self._next_file()
-            
-            #Create record
-            headers_list = resp.raw.headers.items()
-            protocol = getattr(resp.raw, 'version_string', 'HTTP/1.1')
-            http_headers = StatusAndHeaders(f"{resp.status_code} {resp.reason}", headers_list, protocol=protocol)
-
-            #warcio expects a stream, so convert content to stream
-            record = self.writer.create_warc_record(url, 'response',
-                                                    payload=BytesIO(resp.content), http_headers=http_headers)
-            
+
             #Store & increment
-            self.writer.write_record(record)
+            member, meta = record
+            offset = self.cur_file.tell()
+            self.cur_file.write(member)
             self.count += 1
-    
-    def close(self) -> None:
-        'Closes current file, if not yet closed.'
-        with self.lock:
-            if not self.cur_file.closed:
-                self.cur_file.close()
\ No newline at end of file
+
+            fields = {'url': meta['url'], 'mime': meta['mime'], 'status': meta['status'], 'digest': meta['digest'],
+                      'length': str(len(member)), 'offset': str(offset), 'filename': f"{self.base_name}-{self.file_num}.warc.gz"}
+            for key in ('etag', 'last_modified'): #Validators, for incremental recrawls
+                if key in meta:
+                    fields[key] = meta[key]
+            self.index.append(cdx_line(meta['url'], meta['timestamp'], fields))
+
+    def _write_index(self) -> None:
+        'Writer thread only! Writes the sorted index of the current file.'
+
+        self.index.sort()
+        with open(f"{self.target_directory}/{self.base_name}-{self.file_num}.cdxj", 'w', encoding='utf-8') as f:
+            f.writelines(self.index)
+        self.index = []
+
+    def _rebuild_indexes(self) -> bool:
+        '''
+        Writes the missing or outdated index of every file numbered before `file_num`, reading its WARC back. Indexes are only
+        written on rotation and close, so the file being written when a crawl was killed has none, or an older one from
+        another run if it was a rewrite of its file. Returns True if any was written.
+        '''
+
+        rebuilt = False
+        for num in range(1, self.file_num):
+            path = f"{self.target_directory}/{self.base_name}-{num}"
+            if not os.path.exists(f"{path}.warc.gz"):
+                continue
+            if not os.path.exists(f"{path}.cdxj") or os.path.getmtime(f"{path}.cdxj") < os.path.getmtime(f"{path}.warc.gz"):
+                lines = index_warc(f"{path}.warc.gz")
+                with open(f"{path}.cdxj", 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+                rebuilt = True
+        return rebuilt
+
+    def _merge_indexes(self) -> None:
+        'Writer thread only! Merges the index of every file in the directory, including previous runs, into `base_name.cdxj`.'
+
+        paths = glob.glob(f"{glob.escape(self.target_directory)}/{glob.escape(self.base_name)}-*.cdxj")
+        merge_indexes(paths, os.path.join(self.target_directory, f"{self.base_name}.cdxj"))
@@ -1,26 +1,30 @@
 import requests
+import sys
 import json
+import os
+import shutil
+import threading
 from url_normalize import url_normalize
 from bs4 import BeautifulSoup
 import time
-from Corpus import Corpus
+from Corpus import Corpus, last_file
 from urllib.parse import urlparse, urljoin
 from Frontier import Frontier
 from PolicyManager import PolicyManager
-import re
-from threading import Lock
+from LinkExtractor import LinkExtractor
+from UrlNormalizer import UrlNormalizer
+from CharsetResolver import CharsetResolver
+from HostPool import HostPool
+from DnsCache import DnsCache
+from DuplicateDetector import DuplicateDetector, Duplicate
+from ValidatorIndex import ValidatorIndex
+from Metrics import Metrics, SamplingProfiler
+from ConcurrencyController import ConcurrencyController
 
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-#Taken from https://github.com/django/django/blob/main/django/core/validators.py
-url_regex = re.compile(
-        r'^(?:http)s?://' # http:// or https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|' #domain...
-        r'localhost|' #localhost...
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
-        r'(?::\d+)?' # optional port
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+#Bloom Filter size when it is only a pre-check for an exact SeenStore
+exact_filter_cap = 10_000_000
 
 class Crawler:
     '''
@@ -30,77 +34,366 @@ class Crawler:
     '''
 
     def __init__(self, seeds: list[str], to_crawl: int, verbose: bool=False, 
-                 num_workers: int=10, filter_ratio: int=1000):
+                 num_workers: int=10, filter_ratio: int=1000, output_dir: str="./output",
+                 fetch_mode: str='head', max_body_size: int=5*1024*1024, max_fetch_time: float=10, seen_dir: str | None=None,
+                 front_memory: int=1000000, checkpoint_interval: float=0, resume: bool=False, shard=None,
+                 dns: DnsCache | None=None, scorer=None, dedup: bool=False, incremental: bool=False,
+                 metrics_interval: float=0, metrics_port: int | None=None, profile_interval: float=0,
+                 min_workers: int | None=None, adapt_interval: float=1, max_per_host: int=1, latency_factor: float=10,
+                 min_delay: float | None=None, max_delay: float=30, slow_latency: float=1):
         '''
         Initializes Crawler class, specified `num_workers` threads to be used. `filter_ratio` will be multiplied by `to_crawl` to determine the size
         of the Frontier's Bloom Filter, that is because URLs are marked as visited BEFORE being added to the frontier. If you expect a lot of junk/404s,
-        consider a larger value.
+        consider a larger value. WARC files are written into `output_dir`.
+
+        `fetch_mode` is either `'head'`, which sends a HEAD before each GET, or `'stream'`, which sends a single streamed GET and aborts
+        non-HTML responses from their headers. In stream mode, bodies larger than `max_body_size` bytes or taking longer than
+        `max_fetch_time` seconds to download are dropped.
+
+        If `seen_dir` is given, visited URLs are tracked exactly on disk there (see SeenStore), and the Bloom Filter only serves as a
+        pre-check, capped at `exact_filter_cap` items so memory does not grow with `to_crawl`.
+
+        The frontier keeps `front_memory` URLs in memory, spilling the rest to `output_dir/frontier`. Every `checkpoint_interval` seconds
+        (never if 0), the crawl state is saved into `output_dir/checkpoint`. With `resume`, the crawl restarts from that checkpoint
+        instead of `seeds`, and new WARC files are numbered after the ones already written.
+
+        If `shard` is given (see Shard), this crawler only handles the hosts of that shard, sending other URLs to their own shard,
+        and `to_crawl` is the budget shared by all shards.
+
+        Hosts are resolved through `dns`, or a new DnsCache, installed for every connection of the process. `scorer` decides the
+        priority of URLs in the frontier (see UrlScorer, the default).
+
+        With `dedup`, pages are checked against those already crawled (see DuplicateDetector): exact duplicates are written as
+        WARC revisit records without counting towards `to_crawl`, and near duplicates are stored but their outlinks are not followed.
+
+        With `incremental`, pages already stored in `output_dir` by previous runs are fetched with conditional requests
+        (see ValidatorIndex). Unchanged ones are written as revisit records, their links read from the archived copy,
+        and new WARC files are numbered after the existing ones.
+
+        Fetch, parse, normalization and storage times, lock contention and queue sizes are tracked in `metrics` (see Metrics).
+        Every `metrics_interval` seconds (never if 0) and at the end, they are written into `output_dir/metrics.json` and
+        `output_dir/metrics.prom`. With `metrics_port`, they are also served over HTTP. With `profile_interval`, every thread is
+        sampled that often by a SamplingProfiler, written along with the metrics into `output_dir/profile.txt`.
+
+        With `min_workers`, `num_workers` is only the most workers fetching at once: a ConcurrencyController starts from
+        `min_workers`, and adds or parks workers every `adapt_interval` seconds as throughput, latency and the number of ready
+        back queues call for, the frontier's back queues following. All `num_workers` workers must still be started.
+
+        Without a crawl-delay, hosts are fetched `latency_factor` times their response time apart, within `[min_delay, max_delay]`
+        (see PolicyManager). With `max_per_host` above 1, hosts answering faster than `slow_latency` seconds, not backing off
+        and whose `robots.txt` sets no crawl-delay or request rate, are fetched by up to that many workers at once.
         '''
 
+        #Checkpoint
+        self.checkpoint_dir = f"{output_dir}/checkpoint"
+        state = self._load_checkpoint() if resume else {}
+
+        #Sharding
+        self.shard = shard
+        seeds = [url_normalize(s) for s in seeds]
+        share = to_crawl #Pages this crawler is expected to visit
+        if shard is not None:
+            seeds = [s for s in seeds if shard.owns(s)]
+            share = -(-to_crawl // shard.num_shards)
+
         #Structures
-        self.policies = PolicyManager()
-        self.frontier = Frontier(self.policies, num_workers, [url_normalize(s) for s in seeds], filter_ratio * to_crawl)
+        self.metrics = Metrics()
+        self.dns = dns if dns is not None else DnsCache(metrics=self.metrics)
+        if self.dns.metrics is None:
+            self.dns.metrics = self.metrics
+        self.dns.install()
+        self.policies = PolicyManager(latency_factor=latency_factor, min_delay=min_delay, max_delay=max_delay,
+                                      max_parallel=max_per_host, slow_latency=slow_latency, metrics=self.metrics)
+        filter_size = filter_ratio * share if seen_dir is None else min(filter_ratio * share, exact_filter_cap)
+        self.frontier = Frontier(self.policies, num_workers, seeds, filter_size, seen_dir=seen_dir,
+                                 spill_dir=f"{output_dir}/frontier", front_memory=front_memory,
+                                 resume_dir=self.checkpoint_dir if resume else None, close_when_empty=shard is None,
+                                 dns=self.dns, scorer=scorer, metrics=self.metrics)
+        self.controller = None
+        if min_workers is not None and min_workers < num_workers:
+            self.controller = ConcurrencyController(self.frontier, self.metrics, min_workers, num_workers, adapt_interval)
 
         #General attributes
         self.to_crawl = to_crawl #Number of pages to crawl
         self.verbose = verbose
-        self.corpus = Corpus("./output")
-        self.crawled = 0
-        self.lock = Lock()
+        self.num_workers = num_workers
+        self.fetch_mode = fetch_mode
+        self.max_body_size = max_body_size
+        self.max_fetch_time = max_fetch_time
+        first_file = state.get('corpus_file', 0) + 1 if resume or not incremental else last_file(output_dir) + 1
+        self.corpus = Corpus(output_dir, first_file=first_file, metrics=self.metrics) #Indexes files a crash left unindexed
+        self.validators = ValidatorIndex(output_dir) if incremental else None
+        self.crawled = state.get('crawled', 0)
+        self.lock = self.metrics.lock('crawler')
+        self.running = 0 #Workers inside `crawl`
+        self.extractor = LinkExtractor()
+        self.normalizer = UrlNormalizer()
+        self.charsets = CharsetResolver()
+        self.duplicates = DuplicateDetector() if dedup else None
         
         #Setup sessions
         self.headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36'}
-        self.sessions = [requests.session() for _ in range(num_workers)]
-        for s in self.sessions:
-            retries = Retry(total=3, backoff_factor=0.3)
-            adapter = HTTPAdapter(max_retries=retries)
-            s.mount("http://", adapter)
-            s.mount("https://", adapter)
+        self._setup_sessions()
+
+        self.checkpoint_interval = checkpoint_interval
+        if checkpoint_interval > 0:
+            threading.Thread(target=self._checkpoint_loop, daemon=True).start()
+
+        self.output_dir = output_dir
+        self.metrics_interval = metrics_interval
+        if profile_interval > 0:
+            self.metrics.profiler = SamplingProfiler(profile_interval)
+            self.metrics.profiler.start()
+        if metrics_interval > 0:
+            self.metrics.start_writer(output_dir, metrics_interval)
+        if metrics_port is not None:
+            self.metrics.serve(metrics_port)
+        if self.controller is not None:
+            self.controller.start()
+
+        if shard is not None:
+            shard.attach(self.frontier)
+
+    def _setup_sessions(self) -> None:
+        'Creates a single HTTP session shared by all workers, keeping connections per host (see HostPool)'
+
+        #Only connection failures are retried: urllib3 would otherwise sleep through Retry-After on 429s and 503s and send again,
+        #holding the worker while the backoff of PolicyManager never sees them
+        self.pool = HostPool(max_retries=Retry(total=3, read=0, status=0, respect_retry_after_header=False, backoff_factor=0.3))
+        self.pool.observer = self.policies.observe #Politeness adapts to every response, robots.txt included
+        self.session = requests.session()
+        self.session.mount("http://", self.pool)
+        self.session.mount("https://", self.pool)
+
+        #robots.txt warms up the connection to the host, but is never retried, so a dead host fails within its timeout
+        self.policies.http = requests.session()
+        robots = self.pool.with_retries(0)
+        self.policies.http.mount("http://", robots)
+        self.policies.http.mount("https://", robots)
     
     def crawl(self, tid: int) -> None:
         '''
         Basic crawling function. Gets response directly from frontier, where `fetch_func` is called.
-        If response is valid, parses and processes outlinks. Also handles redirects.
+        Responses go through `handle_response`, and the pages it accepts are stored, then passed to `page_stored`.
         '''
         # Need to call with tid
         fetch_func = (lambda url: self.fetch_url(url, tid))
 
-        while True:
-            with self.lock: #Done with crawl
-                if (self.crawled >= self.to_crawl): break
-
-            res = self.frontier.get(fetch_func)
-            if res == None: continue #Fetch unsuccesful
-
-            #Handle redirects, by adding the new location back in frontier
-            if res.status_code in [301, 302, 307, 308]:
-                if 'Location' not in res.headers:
-                    continue #Redirect, but no location??
-                new_url = res.headers['Location']
-                new_url = self.normalize_url(res.url, new_url)
-                if new_url != '':
-                    self.frontier.put(new_url)
+        with self.lock:
+            self.running += 1
+
+        while not self.done():
+            if self.controller is not None:
+                self.controller.admit(tid)
+            res = self.frontier.get(fetch_func, tid)
+            if res == None: #Fetch unsuccesful (errors, robots.txt, not HTML...), or frontier closed
+                if not self.frontier.closed:
+                    self.metrics.count('fetches_dropped_total')
                 continue
 
-            #Double check MIME type
-            mime = res.headers.get('Content-Type', '')
-            if not mime.startswith('text/html'): continue
+            depth = self.frontier.depth(tid)
+            if self.handle_response(res, depth, tid): #A failed claim ends the loop, see `done`
+                date = self.corpus.write(res.url, res)
+                self.page_stored(res, depth, date)
 
-            #All ok!
-            soup = BeautifulSoup(res.text, 'html.parser')
+        self.frontier.close() #Wake up workers still waiting for URLs
+        if self.controller is not None: #And parked ones
+            self.controller.close()
 
-            with self.lock: #One last check before writing
-                if self.crawled >= self.to_crawl: break
-                self.crawled += 1
+        with self.lock: #Last one out closes the corpus, once every write is queued
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            self.corpus.close()
+            self.close_metrics()
 
-            #Store in corpus + print
-            self.corpus.write(res.url, res)
-            if self.verbose:
-                self.print_request(res.url, soup)
-            
-            self.process_outlinks(res.url, soup)
+    def close_metrics(self) -> None:
+        'Writes the last metrics snapshot, if they are written at all, and stops the profiler'
+
+        if self.metrics_interval > 0 or self.metrics.profiler is not None:
+            self.metrics.write(self.output_dir)
+        self.metrics.close()
+
+    def extract(self, body: bytes, encoding: str) -> tuple[str | None, list[str]]:
+        'Extracts the `<base href>` and links of a page, see LinkExtractor'
+
+        with self.metrics.timer('parse_seconds'):
+            return self.extractor.extract(body, encoding)
+
+    def checkpoint(self) -> None:
+        '''
+        Saves the crawl state into `checkpoint_dir`: the frontier (see `Frontier.checkpoint`), the number of pages crawled
+        and the current Corpus file. The previous checkpoint is only removed once the new one is complete.
+        '''
+
+        tmp = self.checkpoint_dir + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        #Read while the frontier is paused. Held URLs are fetched again on resume, so their pages must not count yet
+        state = self.frontier.checkpoint(tmp, self._crawled_state)
+        state['crawled'] -= state.pop('claimed')
+
+        #Pages released by the frontier before its checkpoint must be on disk before this one is valid
+        self.corpus.flush()
+        state['corpus_file'] = self.corpus.file_num
+
+        with open(f"{tmp}/state.json", 'w') as f:
+            json.dump(state, f)
+
+        old = self.checkpoint_dir + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.checkpoint_dir):
+            os.replace(self.checkpoint_dir, old)
+        os.replace(tmp, self.checkpoint_dir)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _checkpoint_loop(self) -> None:
+        'Checkpoints every `checkpoint_interval` seconds until the crawl is done'
+
+        while True:
+            time.sleep(self.checkpoint_interval)
+            if self.done(): break
+            self.checkpoint()
+
+    def _load_checkpoint(self) -> dict:
+        'Reads the state of the last checkpoint, falling back to the previous one if a replacement was interrupted'
+
+        if not os.path.exists(self.checkpoint_dir) and os.path.exists(self.checkpoint_dir + '.old'):
+            os.replace(self.checkpoint_dir + '.old', self.checkpoint_dir)
+
+        try:
+            with open(f"{self.checkpoint_dir}/state.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            sys.exit(f"error: no checkpoint found in {self.checkpoint_dir}")
+
+    def done(self) -> bool:
+        'Checks if the crawl is over: either the target number of pages was already crawled, or the frontier ran out of URLs'
+
+        if self.shard is not None:
+            return self.shard.done() or self.frontier.closed
+
+        with self.lock:
+            return self.crawled >= self.to_crawl or self.frontier.closed
+
+    def _crawled_state(self) -> dict:
+        with self.lock:
+            return {'crawled': self.crawled}
+
+    def claim_page(self, worker=None) -> bool:
+        '''
+        Reserves one page of the crawl budget before storing the page of the URL held by `worker`. Returns False if the budget
+        is exhausted. The frontier records the claim along, so checkpoints do not count pages they requeue.
+        '''
+
+        return self.frontier.claim(worker, self._claim_page)
+
+    def _claim_page(self) -> bool:
+        if self.shard is not None and not self.shard.claim(): return False
+
+        with self.lock:
+            if self.crawled >= self.to_crawl: return False
+            self.crawled += 1
+        return True
+
+    def handle_response(self, res: requests.Response, depth: int=0, worker=None) -> bool:
+        '''
+        Everything done with a fetched response before storing its page, shared by the threaded and async crawlers:
+        304s are recorded as revisits, redirects enqueued and non-HTML dropped, then the charset is resolved and exact duplicates
+        recorded as revisits. Returns True once a page of the budget is claimed for `res`, fetched by `worker`, which the caller then stores
+        and passes to `page_stored`. Budget claims only fail when the crawl is `done`.
+        '''
+
+        if res.status_code == 304: #Unchanged since the last run
+            if self.claim_page(worker):
+                self.handle_not_modified(res, depth)
+            return False
+
+        if self.handle_redirect(res, depth) or not self.is_html(res): return False
 
-        self.corpus.close()
+        #All ok!
+        res.encoding = self.charsets.resolve(res.headers.get('Content-Type'), res.content)
+        res.duplicate = self.check_duplicate(res)
+        if res.duplicate is not None and res.duplicate.exact: #Payload already stored, only record the revisit
+            self.corpus.write_revisit(res.url, res, res.duplicate.digest, res.duplicate.url, res.duplicate.date)
+            self.metrics.count('revisits_total{reason="duplicate"}')
+            return False
+
+        return self.claim_page(worker) #One last check before writing
+
+    def page_stored(self, res: requests.Response, depth: int=0, date: str | None=None) -> None:
+        '''
+        Counts and prints the page of `res` once stored as a record of WARC date `date`, following its outlinks unless it
+        duplicates another page. Originals get their date recorded, for revisits of their copies to refer to.
+        '''
+
+        self.metrics.count('pages_total')
+        if self.verbose: #Only debugging needs the full tree
+            self.print_request(res.url, BeautifulSoup(res.content, 'html.parser', from_encoding=res.encoding))
+
+        if res.duplicate is None and self.duplicates is not None and date is not None:
+            self.duplicates.stored(res.url, date)
+
+        if res.duplicate is None: #Near duplicates link to what their original already did
+            base, links = self.extract(res.content, res.encoding)
+            self.process_outlinks(res.url, links, base, depth + 1)
+
+    def handle_redirect(self, res: requests.Response, depth: int=0) -> bool:
+        'If `res` is a redirect, adds the new location back in the frontier at the same `depth`. Returns if `res` was a redirect.'
+
+        if res.status_code not in [301, 302, 307, 308]:
+            return False
+
+        if 'Location' not in res.headers:
+            return True #Redirect, but no location??
+        new_url = self.normalize_url(res.url, res.headers['Location'])
+        if new_url != '':
+            self.enqueue([new_url], depth)
+        return True
+
+    def handle_not_modified(self, res: requests.Response, depth: int=0) -> None:
+        '''Records `res`, a 304 response, as a revisit of the archived copy of its page, whose outlinks are followed instead'''
+
+        previous = res.previous
+        capture = previous['capture']
+        self.corpus.write_revisit(res.url, res, previous['digest'], capture['url'], self.validators.warc_date(previous),
+                                  not_modified=True)
+        self.metrics.count('revisits_total{reason="not_modified"}')
+
+        try:
+            content_type, body = self.validators.load(previous)
+        except Exception: #Archive missing or broken, links are lost
+            return
+
+        encoding = self.charsets.resolve(content_type, body)
+        base, links = self.extract(body, encoding)
+        self.process_outlinks(res.url, links, base, depth + 1)
+
+    def conditional_headers(self, url: str) -> tuple[dict | None, dict]:
+        '''
+        Gets the ValidatorIndex entry of `url`, if it was stored by a previous run, and the headers to fetch it with:
+        conditional ones if it has an entry. 304 responses carry the entry as `previous`.
+        '''
+
+        previous = self.validators.lookup(url) if self.validators is not None else None
+        if previous is None:
+            return None, self.headers
+        return previous, {**self.headers, **self.validators.headers(previous)}
+
+    def check_duplicate(self, res: requests.Response) -> Duplicate | None:
+        'Checks if the page of `res` duplicates one already crawled, returning a `Duplicate` if so (see DuplicateDetector)'
+
+        if self.duplicates is None:
+            return None
+        with self.metrics.timer('dedup_seconds'):
+            return self.duplicates.check(res.url, res.content, res.encoding)
+
+    def is_html(self, res: requests.Response) -> bool:
+        'Double checks MIME type of a response'
+
+        mime = res.headers.get('Content-Type', '')
+        return mime.startswith('text/html')
             
     def fetch_url(self, url, tid) -> requests.models.Response | None:
         '''
@@ -110,13 +403,25 @@ class Crawler:
 
         if not self.policies.can_fetch(url): #Will check robots.txt allow/disallow
             return None
-        
+
+        if self.fetch_mode == 'stream':
+            return self.fetch_streamed(url, tid)
+
+        previous, headers = self.conditional_headers(url)
+
         #Fetch head to see if this is a text/html
         try:
-            head = self.sessions[tid].head(url, stream=False, timeout=5, allow_redirects=False, headers=self.headers)
+            with self.metrics.timer('fetch_seconds{method="head"}'):
+                head = self.session.head(url, stream=False, timeout=5, allow_redirects=False, headers=headers)
             head.raise_for_status()
         except: #Too much can go wrong...
             return None
+
+        if head.status_code == 304: #Unchanged, no need for a GET. Only meaningful if we sent validators
+            if previous is None:
+                return None
+            head.previous = previous
+            return head
         
         # Accept only mime-html OR a redirect
         mime = head.headers.get('Content-Type', '')
@@ -126,8 +431,11 @@ class Crawler:
         #Fetch actual content
         try:
             #Important detail -> disallow redirects
-            res = self.sessions[tid].get(url, stream=False, timeout=5, allow_redirects=False, headers=self.headers)
+            with self.metrics.timer('fetch_seconds{method="get"}'):
+                res = self.session.get(url, stream=False, timeout=5, allow_redirects=False, headers=self.headers)
             res.raise_for_status()
+            if res.status_code == 304: #Sent without validators, nothing to revisit
+                return None
 
         #Placeholder for exceptions... Since this is a broad crawl, it's fine to skip everything
         except requests.exceptions.SSLError:
@@ -143,44 +451,101 @@ class Crawler:
         
         return res
 
-    def process_outlinks(self, url: str, soup: BeautifulSoup) -> None:
+    def fetch_streamed(self, url, tid) -> requests.models.Response | None:
         '''
-        Processes outlinks parsed in all <a> tags in parsed structure, while also checking for url malformation and invalid protocols.
+        Fetches a given URL with a single streamed GET. Status and Content-Type are checked as soon as headers arrive,
+        dropping the connection for anything that is not HTML or a redirect. The body is read in chunks, bounded by
+        `max_body_size` and `max_fetch_time`, and stored in the response so it is never copied again.
+        '''
+
+        previous, headers = self.conditional_headers(url)
+        try:
+            with self.metrics.timer('fetch_seconds{method="get"}'): #Until headers arrive
+                res = self.session.get(url, stream=True, timeout=5, allow_redirects=False, headers=headers)
+        except: #Too much can go wrong...
+            return None
+
+        try:
+            if res.status_code >= 400:
+                res.close()
+                return None
+
+            if res.status_code == 304: #Unchanged, there is no body. Only meaningful if we sent validators
+                res.close()
+                if previous is None:
+                    return None
+                res._content = b''
+                res.previous = previous
+                return res
+
+            if res.status_code in [301, 302, 307, 308]: #Location is all we need
+                res.close()
+                res._content = b''
+                return res
+
+            mime = res.headers.get('Content-Type', '')
+            length = res.headers.get('Content-Length', '')
+            if 'text/html' not in mime or (length.isdigit() and int(length) > self.max_body_size):
+                res.close() #Abort before downloading the body
+                return None
+
+            deadline = time.monotonic() + self.max_fetch_time
+            chunks = []
+            size = 0
+            with self.metrics.timer('download_seconds'):
+                #read1 returns whatever arrived, so a slow server cannot hold a read past the deadline. iter_content waits for whole chunks
+                while chunk := res.raw.read1(64 * 1024, decode_content=True):
+                    size += len(chunk)
+                    if size > self.max_body_size or time.monotonic() > deadline:
+                        res.close()
+                        return None
+                    chunks.append(chunk)
+
+        except: #Broken connections, bad encodings... Fine to skip
+            res.close()
+            return None
+
+        res._content = b''.join(chunks)
+        return res
+
+    def process_outlinks(self, url: str, links: list[str], base: str | None=None, depth: int=0) -> None:
+        '''
+        Processes outlinks extracted from all <a> tags of a page, while also checking for url malformation and invalid protocols.
         Handles malformatted urls, relative urls and protocols, while also performing url normalization. Only HTTP/HTTPS protocols are allowed.
+        Relative links are resolved against the page's `<base href>`, if it has one. Outlinks are `depth` links away from the seeds.
         '''
 
-        #Expand queue by finding links
-        for tag in soup.find_all('a'):
-            link = tag.get('href')
+        if base:
+            try:
+                url = urljoin(url, base)
+            except: #Broken base, resolve against the page itself
+                pass
+
+        #Expand queue by finding links. Timed per page, a timer per link would cost as much as normalizing it
+        outlinks = []
+        with self.metrics.timer('normalize_seconds'):
+            for link in links:
+                #Skip empty/missing href and hashes
+                if link == '' or link[0] == '#': continue
 
-            #Skip empty/missing href and hashes
-            if link is None or link == '' or link[0] == '#': continue
+                normal = self.normalize_url(url, link)
 
-            normal = self.normalize_url(url, link)
+                if normal != '':
+                    outlinks.append(normal)
 
-            if normal != '':
-                self.frontier.put(normal) #Frontier will handle visited set
+        self.metrics.count('links_total', len(links))
+        self.enqueue(outlinks, depth)
+
+    def enqueue(self, urls: list[str], depth: int=0) -> None:
+        'Adds normalized URLs, `depth` links away from the seeds, to the frontier, or to the frontier of their shard'
+
+        if self.shard is not None:
+            urls = self.shard.route(urls, depth)
+        self.frontier.put_many(urls, depth) #Frontier will handle visited set
         
     def normalize_url(self, original_url: str, new_url: str) -> str:
         '''Normalizes an URL. Handles relative urls and relative protocols. If URL is invalid, returns `''`.'''
-
-        #Handle relative url + relative protocols
-        try:
-            new_url = urljoin(original_url, new_url)
-        except: #A lot can go wrong here, just skip if needed
-            return ''
-
-        #Check this BEFORE normalization, since url_normalize is apparently very cost inneficient
-        if re.match(url_regex, new_url) == None:
-            return ''
-       
-        try:
-            normal = url_normalize(new_url, filter_params=True)
-            normal = normal.split('#', 1)[0] #Remove hashes # in links too
-        except: #Couldnt parse url, probably not an url in the first place...
-            return ''
-
-        return normal #Sucess
+        return self.normalizer.normalize(original_url, new_url)
 
     def print_request(self, url, soup):
         #Get first 20 words. Very inefficient, but ok due to debugging only
@@ -0,0 +1,191 @@
+import socket
+import asyncio
+import ipaddress
+import time
+from threading import Lock, Event
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from aiohttp.abc import AbstractResolver
+import urllib3.util.connection
+
+_create_connection = urllib3.util.connection.create_connection #Original, before any `install`
+
+class DnsCache:
+    '''
+    Synchronized in-process DNS cache, shared by every fetch. Addresses are kept for `ttl` seconds, and failed lookups
+    for `negative_ttl` seconds, in an LRU of `cache_size` hosts. Like PolicyManager, lookups are single-flight: the first
+    caller for a host resolves it while concurrent callers wait, and `prefetch` resolves hosts ahead of time in the background.
+
+    `resolver` has the signature of `socket.getaddrinfo`, so a stub can be passed in. `install` makes every urllib3
+    (and so `requests`) connection go through the cache, and `CachedResolver` does the same for aiohttp.
+    With `metrics` (see Metrics), lookups reaching the resolver and urllib3 connections (lookup included) are timed.
+    '''
+
+    def __init__(self, ttl: float=300, negative_ttl: float=60, cache_size: int=10000, resolver=socket.getaddrinfo,
+                 prefetch_workers: int=8, metrics=None):
+        self.cache = OrderedDict() #host -> (addresses or gaierror, expires). Addresses are (family, proto, ip) tuples
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.resolver = resolver
+        self.metrics = metrics
+
+        self.lock = Lock()
+        self.pending = {} #Hosts being resolved right now, host -> Event set when done
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+        self.prefetcher = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='dns')
+
+    def resolve(self, host: str) -> list[tuple]:
+        '''Gets the `(family, proto, ip)` addresses of `host`, raising `socket.gaierror` if it does not resolve'''
+
+        host = host.lower()
+        while True:
+            with self.lock:
+                found, entry = self._lookup(host)
+                if found:
+                    return self._hit(entry)
+
+                done = self.pending.get(host)
+                if done is None: #Resolve it ourselves
+                    done = self.pending[host] = Event()
+                    self.misses += 1
+                    break
+            done.wait() #Someone else is resolving it, then look again
+
+        start = time.perf_counter()
+        try:
+            infos = self.resolver(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+            entry = list(dict.fromkeys((family, proto, sa[0]) for family, _, proto, _, sa in infos))
+            expires = time.time() + self.ttl
+        except socket.gaierror as e:
+            entry = socket.gaierror(*e.args) #Without the traceback and its frames
+            expires = time.time() + self.negative_ttl
+        except Exception as e: #Resolver broke, do not cache
+            entry = socket.gaierror(str(e))
+            expires = 0
+        if self.metrics is not None:
+            self.metrics.observe('dns_seconds', time.perf_counter() - start)
+
+        with self.lock:
+            if expires:
+                self.cache[host] = (entry, expires)
+                self.cache.move_to_end(host)
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            del self.pending[host]
+        done.set()
+
+        if isinstance(entry, socket.gaierror):
+            raise socket.gaierror(*entry.args)
+        return entry
+
+    async def resolve_async(self, host: str) -> list[tuple]:
+        '''Async version of `resolve`, only leaving the event loop on a miss'''
+
+        with self.lock:
+            found, entry = self._lookup(host.lower())
+            if found:
+                return self._hit(entry)
+        return await asyncio.get_running_loop().run_in_executor(self.prefetcher, self.resolve, host)
+
+    def prefetch(self, url: str) -> None:
+        '''Starts resolving the host of `url` (or `url` itself, if it is a host) in the background, if not cached yet'''
+
+        host = urlparse(url).hostname if '//' in url else url
+        if not host or self._is_ip(host):
+            return
+
+        with self.lock:
+            if host in self.pending or self._lookup(host)[0]:
+                return
+        self.prefetcher.submit(self._prefetch, host)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {'hits': self.hits, 'negative_hits': self.negative_hits, 'misses': self.misses,
+                    'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0, 'hosts': len(self.cache)}
+
+    def install(self) -> None:
+        '''Makes urllib3 resolve hosts through this cache, for the whole process'''
+        urllib3.util.connection.create_connection = self.create_connection
+
+    def create_connection(self, address: tuple[str, int], *args, **kwargs) -> socket.socket:
+        '''Replacement of `urllib3.util.connection.create_connection`, connecting to the cached addresses in order'''
+
+        if self.metrics is not None:
+            with self.metrics.timer('connect_seconds'):
+                return self._connect(address, *args, **kwargs)
+        return self._connect(address, *args, **kwargs)
+
+    def _connect(self, address: tuple[str, int], *args, **kwargs) -> socket.socket:
+        host, port = address
+        if self._is_ip(host.strip('[]')):
+            return _create_connection(address, *args, **kwargs)
+
+        err = None
+        for _, _, ip in self.resolve(host):
+            try:
+                return _create_connection((ip, port), *args, **kwargs)
+            except OSError as e:
+                err = e
+
+        raise err if err is not None else OSError("getaddrinfo returns an empty list")
+
+    def _prefetch(self, host: str) -> None:
+        try:
+            self.resolve(host)
+        except socket.gaierror:
+            pass
+
+    def _lookup(self, host: str) -> tuple[bool, list | socket.gaierror | None]:
+        'Lock before calling this! Returns `(found, entry)`, dropping the entry if expired'
+
+        cached = self.cache.get(host)
+        if cached is None:
+            return False, None
+
+        entry, expires = cached
+        if time.time() >= expires:
+            del self.cache[host]
+            return False, None
+
+        self.cache.move_to_end(host)
+        return True, entry
+
+    def _hit(self, entry: list | socket.gaierror) -> list[tuple]:
+        'Lock before calling this! Counts a cache hit, raising cached failures.'
+
+        if isinstance(entry, socket.gaierror):
+            self.negative_hits += 1
+            raise socket.gaierror(*entry.args) #A new one per hit, or tracebacks pile up on the cached instance
+        self.hits += 1
+        return entry
+
+    def _is_ip(self, host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+class CachedResolver(AbstractResolver):
+    '''aiohttp resolver backed by a DnsCache'''
+
+    def __init__(self, cache: DnsCache):
+        self.cache = cache
+
+    async def resolve(self, host: str, port: int=0, family: socket.AddressFamily=socket.AF_INET) -> list[dict]:
+        addresses = [(f, proto, ip) for f, proto, ip in await self.cache.resolve_async(host) if family in (0, f)]
+        if not addresses:
+            raise OSError(f"no address of family {family} for {host}")
+
+        return [{'hostname': host, 'host': ip, 'port': port, 'family': f, 'proto': proto,
+                 'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV} for f, proto, ip in addresses]
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,193 @@
+import re
+import time
+import calendar
+import base64
+import hashlib
+from array import array
+from threading import Lock
+
+#Everything that is not visible text: comments, script/style blocks and tags
+markup_regex = re.compile(r'<!--.*?(?:-->|$)|<(script|style)\b[^>]*>.*?(?:</\1\s*>|$)|<[^>]*>', re.IGNORECASE | re.DOTALL)
+word_regex = re.compile(r'\w+')
+
+#MinHash bins no shingle fell into
+empty_bin = 0xFFFFFFFF
+
+class DuplicateDetector:
+    '''
+    Detects pages already crawled under another URL: mirrors, session ID variants, templated copies...
+
+    Exact duplicates are found by payload digest, the same one written in WARC records, so they can be stored as revisits.
+    Near duplicates are found by MinHash: the visible text is split into `shingle_size` word shingles, and a signature keeps
+    the smallest 32 bit shingle hash in each of `bands * rows` bins (one hash per shingle, the bin being part of it). Two pages
+    agree on a bin as often as their shingle sets overlap, so pages agreeing on at least `threshold` of the bins either of them
+    filled are near duplicates. Signatures are indexed by band, `rows` bins each: pages that similar are very likely to share a
+    whole band, so a lookup only compares the signatures in the buckets of its own bands. Bands of empty bins say nothing about
+    a page and are never indexed, and a bucket keeps at most `max_bucket` signatures, so lookups stay cheap. Pages with fewer
+    than `min_shingles` shingles are too short to sign reliably, and are only checked for exact duplicates.
+
+    Only original pages are indexed, in memory, for the lifetime of the crawl. Signatures are packed in one array, and digests
+    are kept as raw bytes, so an original costs its URL and under a kilobyte.
+    '''
+
+    def __init__(self, threshold: float=.9, bands: int=8, rows: int=8, shingle_size: int=3, min_shingles: int=16,
+                 max_bucket: int=64):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.bins = bands * rows
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.max_bucket = max_bucket
+
+        self.lock = Lock()
+        self.urls = [] #URL of each original
+        self.dates = array('I') #WARC date of the record of each original, as a timestamp. 0 until `stored`
+        self.pending = {} #URL -> original not `stored` yet
+        self.digests = {} #Raw payload digest -> original
+        self.signatures = array('I') #`bins` per signed original, packed
+        self.signed = array('I') #Original of each signature
+        self.index = {} #Hash of (band, band values) -> signature, or list of them once shared
+
+        self.checked = 0
+        self.exact = 0
+        self.near = 0
+        self.bytes_saved = 0 #Payloads not stored again
+
+    def check(self, url: str, body: bytes, encoding: str='utf-8') -> 'Duplicate | None':
+        '''
+        Checks the page at `url`, returning None if it is an original, which is then indexed, or what it duplicates.
+        Exact duplicates come with the payload digest and the date of their original, as WARC revisit records need them.
+        Originals must be reported as `stored` with the date of their record: until then, their copies are only near duplicates,
+        stored in full, as a revisit would have nothing to refer to.
+        '''
+
+        raw = hashlib.sha1(body).digest()
+        signature = self.signature(body, encoding) #Outside the lock, the expensive part
+
+        with self.lock:
+            self.checked += 1
+
+            original = self.digests.get(raw)
+            if original is not None and self.dates[original] == 0: #Not written yet
+                self.near += 1
+                return Duplicate(False, self.urls[original], None, _format_digest(raw))
+
+            if original is not None:
+                self.exact += 1
+                self.bytes_saved += len(body)
+                date = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.dates[original]))
+                return Duplicate(True, self.urls[original], date, _format_digest(raw))
+
+            if signature is not None:
+                match = self._find(signature)
+                if match is not None:
+                    self.near += 1
+                    return Duplicate(False, self.urls[match], None, _format_digest(raw))
+
+            original = len(self.urls)
+            self.urls.append(url)
+            self.dates.append(0)
+            self.pending[url] = original
+            self.digests[raw] = original
+            if signature is not None:
+                self._add(signature, original)
+
+        return None
+
+    def stored(self, url: str, date: str) -> None:
+        '''Records the WARC date (`2024-01-31T12:00:00Z`) of the record the original page at `url` was written as'''
+
+        timestamp = calendar.timegm(time.strptime(date, '%Y-%m-%dT%H:%M:%SZ'))
+        with self.lock:
+            original = self.pending.pop(url, None)
+            if original is not None:
+                self.dates[original] = timestamp
+
+    def signature(self, body: bytes, encoding: str='utf-8') -> tuple[int, ...] | None:
+        '''Gets the MinHash signature of the visible text of `body`, or None if the text is too short'''
+
+        text = markup_regex.sub(' ', body.decode(encoding, 'replace'))
+        words = word_regex.findall(text.lower())
+        shingles = set(zip(*(words[i:] for i in range(self.shingle_size))))
+        if len(shingles) < self.min_shingles:
+            return None
+
+        bins = self.bins
+        mins = [empty_bin] * bins #Empty bins keep the highest value, the same for every page
+        for shingle in shingles:
+            h = hash(shingle) & 0xFFFFFFFFFFFFFFFF
+            b = (h >> 32) % bins
+            h &= 0xFFFFFFFF
+            if h < mins[b]:
+                mins[b] = h
+        return tuple(mins)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'checked': self.checked, 'exact': self.exact, 'near': self.near, 'bytes_saved': self.bytes_saved,
+                    'indexed': len(self.signed)}
+
+    def _add(self, signature: tuple[int, ...], original: int) -> None:
+        'Lock before calling this! Indexes the signature of an original.'
+
+        slot = len(self.signed)
+        self.signatures.extend(signature)
+        self.signed.append(original)
+        for key in self._keys(signature):
+            bucket = self.index.get(key)
+            if bucket is None:
+                self.index[key] = slot
+            elif isinstance(bucket, int):
+                self.index[key] = [bucket, slot]
+            elif len(bucket) < self.max_bucket:
+                bucket.append(slot)
+
+    def _find(self, signature: tuple[int, ...]) -> int | None:
+        'Lock before calling this! Gets the original agreeing with `signature` on `threshold` of their filled bins, if any.'
+
+        seen = set()
+        for key in self._keys(signature):
+            bucket = self.index.get(key, ())
+            for slot in (bucket,) if isinstance(bucket, int) else bucket:
+                if slot in seen:
+                    continue
+                seen.add(slot)
+
+                candidate = self.signatures[slot * self.bins:(slot + 1) * self.bins]
+                filled = agree = 0
+                for a, b in zip(candidate, signature):
+                    if a != empty_bin or b != empty_bin:
+                        filled += 1
+                        agree += a == b
+                if agree >= self.threshold * filled:
+                    return self.signed[slot]
+        return None
+
+    def _keys(self, signature: tuple[int, ...]) -> list[int]:
+        'Index keys of the bands of `signature` that are not all empty'
+
+        keys = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            if any(v != empty_bin for v in values):
+                keys.append(hash((band, values)))
+        return keys
+
+class Duplicate:
+    '''A page found by DuplicateDetector to be a copy of `url`, exactly or not'''
+
+    __slots__ = ('exact', 'url', 'date', 'digest')
+
+    def __init__(self, exact: bool, url: str, date: str | None, digest: str):
+        self.exact = exact
+        self.url = url #Of the original
+        self.date = date #WARC date the original was fetched, for exact duplicates
+        self.digest = digest #Payload digest of this page
+
+def payload_digest(body: bytes) -> str:
+    '''SHA-1 of a payload in the format of the `WARC-Payload-Digest` header'''
+    return _format_digest(hashlib.sha1(body).digest())
+
+def _format_digest(raw: bytes) -> str:
+    return 'sha1:' + base64.b32encode(raw).decode('ascii')
@@ -1,153 +1,547 @@
-from queue import Queue, PriorityQueue, Empty, Full
+from collections import deque
 from BloomFilter import BloomFilter
+from SeenStore import SeenStore
+from SpillQueue import SpillQueue
 import time
+import os
+import json
+import heapq
+import shutil
+import tempfile
 from urllib.parse import urlparse
 from PolicyManager import PolicyManager
 import threading
+import asyncio
+import random
+from UrlScorer import UrlScorer
+from BackQueue import BackQueue
 
 class Frontier:
     '''
     Class representing a mercator style URL frontier.
-    
-    Since no priorization is needed, only one Front Queue is used, and the number of Back Queues is proportional to `num_workers`.
-    This structure also fires a daemon thread, responsible for managing the front/back queues and the heap when needed.
+
+    URLs are prioritized into several Front Queues by a scorer (see UrlScorer), and the number of Back Queues is proportional
+    to `num_workers`. This structure also fires a daemon thread, responsible for refilling back queues from the front queues,
+    picking each URL from a random non-empty front queue in proportion to the scorer's weights.
+
+    Scheduling is event driven: workers wait on a condition variable until the earliest back queue in the heap is allowed
+    to be fetched, so they are only handed back queues that are ready. Back queues that drain are refilled right away,
+    and once all `num_workers` workers are waiting on an empty frontier, the frontier is closed and every `get` returns None.
+
+    Workers can be parked and unparked (see ConcurrencyController), and the number of back queues follows the number of
+    workers with `resize`.
 
     For more details about the mercator style URL frontier: `https://nlp.stanford.edu/IR-book/html/htmledition/the-url-frontier-1.html`
     '''
-    def __init__(self, policies: PolicyManager, num_workers, starting, filter_size, filter_error=.01):
-        self.front = Queue() #Front is a simple queue, no prioritization yet
-        for url in starting:
-            self.front.put(url)
+    def __init__(self, policies: PolicyManager, num_workers, starting, filter_size, filter_error=.01, seen_dir=None,
+                 spill_dir=None, front_memory=1000000, resume_dir=None, close_when_empty=True, dns=None, scorer=None, metrics=None):
+        '''
+        URLs are marked as visited in a Bloom Filter sized for `filter_size` items. If `seen_dir` is given, an exact
+        disk backed SeenStore is kept there, with the Bloom Filter as its negative pre-check, so no URL is ever dropped as a false positive.
+
+        URLs are queued along with their depth from the `starting` URLs, and `scorer` (a UrlScorer by default) gives their front queue.
+        The front queues keep up to `front_memory` URLs in memory, spilling the rest into `spill_dir` (a temporary directory by default).
+        If `resume_dir` is given, the frontier is restored from a checkpoint written by `checkpoint` and `starting` is ignored.
+
+        If URLs can also come from outside the workers (see Shard), pass `close_when_empty=False`: workers then wait on an empty
+        frontier until `close` is called, and `exhausted` tells whether there is nothing left for now.
+
+        If a DnsCache is given as `dns`, domains are resolved in the background as soon as they get a back queue.
+        With `metrics` (see Metrics), the visited lock reports its contention, and queue sizes are exposed as gauges.
+        '''
+        #Front queues, most important first. Items are "depth url" lines
+        self.scorer = scorer or UrlScorer()
+        spill_dir = spill_dir or tempfile.mkdtemp(prefix='frontier-')
+        self.fronts = [SpillQueue(os.path.join(spill_dir, str(i)), max(front_memory // self.scorer.num_queues, 1))
+                       for i in range(self.scorer.num_queues)]
 
-        #Mercator recommendation #back_queues = 3 * crawler threads
-        self.back = [Queue() for _ in range(3*num_workers)]
+        #Mercator recommendation #back_queues = 3 * crawler threads. A back queue holds one domain, kept in domain_map,
+        #so it only stores the path of its URLs (see BackQueue), which become strings again when handed to a worker
+        self.num_workers = num_workers
+        self.back = [BackQueue() for _ in range(3*num_workers)]
 
-        #These 2 structures don't need locks, only handled by scheduler (single thread)
+        #Everything below is guarded by self.lock
         self.inactive_back = set(range(len(self.back))) #Track inactive back queues
+        self.retired = set() #Inactive back queues past `back_limit`, left out until the frontier grows again
+        self.back_limit = len(self.back)
         self.domain_map = {} #Maps domain -> back queue, and back queue -> domain (Two way map)
+        self.heap = [] #Maintain heap for politeness, (allowed_time, back queue), one entry per fetch the host allows at once
+        self.scheduled = [0] * len(self.back) #Heap entries of each back queue
+        self.fetching = [0] * len(self.back) #Workers fetching from each back queue
 
-        self.heap = PriorityQueue() #Maintain heap for politeness
+        #(depth, URL) handed to each worker, until it asks for the next one. Kept so checkpoints never lose pages being processed
+        self.holding = {}
+        self.claimed = set() #Workers whose held URL already counts towards the crawl budget, see `claim`
 
-        self.visited_lock = threading.Lock()
+        self.idle = 0 #Workers waiting for a ready back queue
+        self.closed = False
+        self.close_when_empty = close_when_empty
+
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock) #Workers wait here for the heap
+        self.refill = threading.Condition(self.lock) #Scheduler waits here for front URLs and inactive back queues
+        self.async_waiters = deque() #(loop, future) of coroutines waiting for the heap
+
+        self.visited_lock = metrics.lock('frontier_visited') if metrics is not None else threading.Lock()
         self.visited = BloomFilter(filter_size, filter_error)
+        if seen_dir is not None and resume_dir is not None: #Visited state must match the checkpoint, not what was seen after it
+            os.makedirs(seen_dir, exist_ok=True)
+            shutil.copy(os.path.join(resume_dir, 'seen.fp'), os.path.join(seen_dir, 'seen.fp'))
+        self.seen = self.visited if seen_dir is None else SeenStore(seen_dir, bloom=self.visited, resume=resume_dir is not None) #URL-seen test
 
         self.policies = policies
+        self.dns = dns
 
-        self.hinted_empty_lock = threading.Lock()
-        self.hinted_empty = set() #Hints at scheduler back queues indexes that may be empty
-        self.has_empty = threading.Event()
+        if resume_dir is not None:
+            with self.lock:
+                self._restore(resume_dir)
+        else:
+            for url in starting:
+                if not self.seen.check_and_add(url): #Seen like any other URL, so links back to seeds do not fetch them again
+                    self.fronts[0].put(f"0 {url}")
+
+        if metrics is not None: #Read without the lock, a snapshot can be slightly off
+            metrics.gauge('front_queue_urls', self._front_size)
+            metrics.gauge('back_queue_urls', lambda: sum(len(q) for q in self.back))
+            metrics.gauge('heap_entries', lambda: len(self.heap))
+            metrics.gauge('active_back_queues', lambda: len(self.domain_map) // 2)
+            metrics.gauge('back_queue_limit', lambda: self.back_limit)
 
         #Start scheduler
         self.scheduler = threading.Thread(target=self._scheduler_loop, daemon=True)
         self.scheduler.start()
 
-    def get(self, fetch_func):
-        '''Grabs an URL from the frontier, calls `fetch_func`, handles structures and returns original `fetch_func` returned value'''
-        
-        #Nothing on heap means: nothing on back queues OR less back queues filled than threads (usually at start)
-        try:
-            allowed_time, back_idx = self.heap.get(timeout=60) #Blocking
-        except Empty:
-            return None
-
-        try: #Got value from heap, try extracting from back queue
-            url = self.back[back_idx].get_nowait()
-        except Empty: #Warn scheduler that this MIGHT be empty -> scheduler can be putting values here as we speak
-            with self.hinted_empty_lock:
-                self.hinted_empty.add(back_idx)
-            self.has_empty.set()
-            return None
-
-        #Enforce politeness.
-        now = time.time()
-        if now < allowed_time:
-            time.sleep(allowed_time - now)
-        
+    def get(self, fetch_func, worker=None):
+        '''
+        Grabs an URL from the frontier, calls `fetch_func`, handles structures and returns original `fetch_func` returned value.
+        Blocks until a back queue is ready, returning None if the frontier is closed.
+        The URL counts as being processed by `worker` until its next call.
+        '''
+
+        with self.lock:
+            self._unhold(worker)
+
+            while True:
+                back_idx, wait = self._next_ready()
+                if back_idx is not None or wait is None:
+                    break
+
+                self.idle += 1
+                self.ready.wait(None if wait == float('inf') else wait)
+                self.idle -= 1
+
+            if back_idx is None: #Closed
+                return None
+            url = self._take(back_idx, worker)
+
         #Fetch!
         ans = fetch_func(url)
 
-        #Re-add. If back queue is empty, it will be caught in an exception above
-        self.heap.put_nowait((time.time() + self.policies.get_delay(url), back_idx))
+        self._reschedule(back_idx, self.policies.get_delay(url))
 
         return ans
 
-    def put(self, url: str) -> None:
-        '''Takes in an url, which is to be put into frontier, if not yet seen.'''
+    async def get_async(self, fetch_func, worker=None):
+        '''
+        Async version of `get`, where `fetch_func` is a coroutine function.
+        Waiting for a ready back queue is done without blocking the event loop.
+        '''
+
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self._unhold(worker)
+
+        while True:
+            with self.lock:
+                back_idx, wait = self._next_ready()
+                if back_idx is not None:
+                    url = self._take(back_idx, worker)
+                    break
+                if wait is None:
+                    return None
+
+                #Woken up by _notify_ready, possibly from another thread
+                waiter = (loop, loop.create_future())
+                self.async_waiters.append(waiter)
+                self.idle += 1
+
+            try:
+                await asyncio.wait_for(waiter[1], None if wait == float('inf') else wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.lock:
+                    self.idle -= 1
+                    if waiter in self.async_waiters:
+                        self.async_waiters.remove(waiter)
+
+        ans = await fetch_func(url)
+
+        self._reschedule(back_idx, await self.policies.get_delay_async(url))
+
+        return ans
+
+    def depth(self, worker) -> int:
+        'Depth from the starting URLs of the URL handed to `worker`'
+
+        with self.lock:
+            held = self.holding.get(worker)
+        return held[0] if held else 0
+
+    def release(self, worker) -> None:
+        'Marks the URL handed to `worker` as fully processed'
+
+        with self.lock:
+            self._unhold(worker)
+
+    def claim(self, worker, claim_func) -> bool:
+        '''
+        Calls `claim_func`, which reserves a page of the crawl budget for the URL held by `worker`, and if it succeeds marks
+        that URL as claimed, in a single step for `checkpoint`. Returns what `claim_func` returned.
+        '''
+
+        with self.lock:
+            if not claim_func():
+                return False
+            if worker in self.holding:
+                self.claimed.add(worker)
+            return True
+
+    def _unhold(self, worker) -> None:
+        'Lock before calling this! Stops holding the URL of `worker`.'
+
+        self.holding.pop(worker, None)
+        self.claimed.discard(worker)
+
+    def park(self, worker) -> None:
+        '''Stops counting `worker` as one that can add URLs, until `unpark`. The URL it held must be fully processed.'''
+
+        with self.lock:
+            self._unhold(worker)
+            self.num_workers -= 1
+            self.ready.notify_all() #Waiting workers may be the last ones now
+            while self.async_waiters:
+                self._wake_async()
+
+    def unpark(self, worker) -> None:
+        with self.lock:
+            self.num_workers += 1
+
+    def resize(self, num_workers: int) -> None:
+        '''
+        Keeps `3 * num_workers` back queues in use, as the Mercator ratio goes. Back queues past it are retired once they
+        drain, and retired ones are used again first when growing.
+        '''
+
+        with self.lock:
+            self.back_limit = 3 * num_workers
+            while len(self.back) < self.back_limit:
+                self.back.append(BackQueue())
+                self.scheduled.append(0)
+                self.fetching.append(0)
+                self.retired.add(len(self.back) - 1)
+
+            for idx in [i for i in self.retired if i < self.back_limit]:
+                self.retired.remove(idx)
+                self.inactive_back.add(idx)
+            for idx in [i for i in self.inactive_back if i >= self.back_limit]:
+                self.inactive_back.remove(idx)
+                self.retired.add(idx)
+            self.refill.notify()
+
+    def load(self) -> tuple[int, int]:
+        '''Back queues ready to be fetched from right now, and workers waiting for one'''
+
+        with self.lock:
+            now = time.time()
+            return sum(when <= now for when, _ in self.heap), self.idle
+
+    def close(self) -> None:
+        'Closes the frontier, waking everyone up. Every following `get` returns None.'
+
+        with self.lock:
+            self.closed = True
+            self.ready.notify_all()
+            self.refill.notify_all()
+            while self.async_waiters:
+                self._wake_async()
+
+    def _next_ready(self) -> tuple:
+        '''
+        Lock before calling this! Pops the back queue whose turn has come, returning `(back_idx, None)`.
+        Otherwise returns `(None, wait)`, `wait` being how long to wait for the next one (`inf` if unknown),
+        or `(None, None)` if the frontier is closed. Closes the frontier if the caller is the last worker and nothing is left.
+        '''
+
+        if self.closed:
+            return None, None
+
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            back_idx = heapq.heappop(self.heap)[1]
+            self.scheduled[back_idx] -= 1
+
+            if not self.back[back_idx]: #Drained by a parallel fetch
+                self._release(back_idx)
+                continue
+
+            blocked = self.policies.blocked_for(self.domain_map[back_idx])
+            if blocked > 0: #Host started backing off after this entry was pushed
+                self._push(back_idx, now + blocked)
+                continue
+
+            return back_idx, None
+
+        if self.heap:
+            return None, self.heap[0][0] - now
 
+        #Every other worker is waiting too, so nobody can add URLs anymore
+        if self.close_when_empty and self.idle + 1 >= self.num_workers and self._empty():
+            self.closed = True
+            self.ready.notify_all()
+            self.refill.notify_all()
+            while self.async_waiters:
+                self._wake_async()
+            return None, None
+
+        return None, float('inf')
+
+    def exhausted(self) -> bool:
+        'Checks if every worker is waiting on an empty frontier'
+
+        with self.lock:
+            return self.idle >= self.num_workers and self._empty()
+
+    def _empty(self) -> bool:
+        'Lock before calling this! Checks if there are no URLs left in the front and back queues.'
+        return self._front_size() == 0 and not self.domain_map
+
+    def _front_size(self) -> int:
+        return sum(q.qsize() for q in self.fronts)
+
+    def _take(self, back_idx: int, worker) -> str:
+        '''
+        Lock before calling this! Pops an URL from back queue `back_idx`, registering it as held by `worker`.
+        If the host allows more fetches at once, the back queue goes back into the heap for another worker.
+        '''
+
+        depth, path = self.back[back_idx].popleft()
+        url = self._join(self.domain_map[back_idx], path)
+        self.holding[worker] = (depth, url)
+        self.fetching[back_idx] += 1
+
+        if self.back[back_idx] and self.fetching[back_idx] + self.scheduled[back_idx] < self.policies.get_parallelism(url):
+            self._push(back_idx, time.time() + self.policies.get_delay(url, block=False))
+        return url
+
+    def _reschedule(self, back_idx: int, delay: float) -> None:
+        'Puts a back queue back into the heap after a fetch, or releases it to the scheduler if it is drained'
+
+        with self.lock:
+            self.fetching[back_idx] -= 1
+            if not self.back[back_idx]: #Empty, give it to another domain
+                self._release(back_idx)
+            elif self.scheduled[back_idx] + self.fetching[back_idx] < self.policies.get_parallelism(self.domain_map[back_idx]):
+                self._push(back_idx, time.time() + delay)
+
+    def _push(self, back_idx: int, when: float) -> None:
+        'Lock before calling this! Allows one more fetch from back queue `back_idx` at time `when`'
+
+        heapq.heappush(self.heap, (when, back_idx))
+        self.scheduled[back_idx] += 1
+        self._notify_ready()
+
+    def _release(self, back_idx: int) -> None:
+        'Lock before calling this! Gives an empty back queue to another domain, once nobody fetches from it or waits for it.'
+
+        if self.fetching[back_idx] or self.scheduled[back_idx]:
+            return
+
+        domain = self.domain_map.pop(back_idx)
+        del self.domain_map[domain]
+        (self.retired if back_idx >= self.back_limit else self.inactive_back).add(back_idx)
+        self.refill.notify()
+        self._notify_ready() #The last worker may be waiting to find out the frontier is empty
+
+    def _notify_ready(self) -> None:
+        'Lock before calling this! Wakes up one waiting worker, thread or coroutine, to look at the heap again'
+
+        self.ready.notify()
+        if self.async_waiters:
+            self._wake_async()
+
+    def _wake_async(self) -> None:
+        'Lock before calling this! Wakes up the oldest waiting coroutine'
+
+        loop, future = self.async_waiters.popleft()
+        loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+    def put(self, url: str, depth: int=0) -> None:
+        '''Takes in an url found `depth` links away from the starting URLs, which is to be put into frontier, if not yet seen.'''
+        self.put_many([url], depth)
+
+    def put_many(self, urls: list[str], depth: int=0) -> None:
+        '''
+        Takes in all outlinks of a page, found `depth` links away from the starting URLs, putting the unseen ones into the front
+        queue given by the scorer, unless it drops them. The visited lock is taken only once.
+        '''
+
+        added = False
         with self.visited_lock:
-            #Not seen before
-            if self.visited.check(url):
-                return
-            
-            self.visited.add(url)
+            for url in urls:
+                if self.seen.check_and_add(url): #Seen before
+                    continue
 
-        #Put in front even if there's inactive at back, scheduler will handle.
-        self.front.put(url)
+                #Put in front even if there's inactive at back, scheduler will handle.
+                #Done under the lock, so a checkpoint never sees an URL as visited but not queued
+                queue = self.scorer.score(url, depth)
+                if queue is not None:
+                    self.fronts[queue].put(f"{depth} {url}")
+                    added = True
 
-    def _scheduler_loop(self) -> None:
+        if added:
+            self._notify_refill()
+
+    def _notify_refill(self) -> None:
+        'Wakes up the scheduler after new front URLs, if it has back queues to fill'
+
+        if self.inactive_back: #Otherwise, the next drained back queue wakes it up
+            with self.lock:
+                self.refill.notify()
+
+    def checkpoint(self, directory: str, state=None) -> dict:
         '''
-        Manages scheduling of back queues and front queues, handling required structures. 
-        Avoids busy wait only when all back queues are filled.
+        Writes the frontier state into `directory`: every queued or held URL in `urls.txt` as "depth url" lines (held first,
+        then back queues, then each front queue), the Bloom Filter bitset and, if used, the SeenStore file. The crawl is paused
+        while doing so, and `state`, if given, is called then, so the caller's own state matches the frontier's.
+        Returns the metadata needed by `_restore`, with `claimed` held URLs already counted by `claim`, and what `state` returned.
+        '''
+
+        with self.visited_lock, self.lock:
+            extra = state() if state is not None else {}
+            claimed = len(self.claimed)
+
+            with open(os.path.join(directory, 'urls.txt'), 'w', encoding='utf-8') as f:
+                held = list(self.holding.values())
+                for depth, url in held:
+                    f.write(f"{depth} {url}\n")
+
+                back = []
+                for idx, q in enumerate(self.back):
+                    if idx not in self.domain_map: continue
+                    for depth, path in q:
+                        f.write(f"{depth} {self._join(self.domain_map[idx], path)}\n")
+                    back.append([self.domain_map[idx], len(q)])
 
-        Also responsible for refilling empty back queues hinted by the workers, and re-adding "lost" back queues back into the heap.
+                front = [q.dump(f) for q in self.fronts]
+
+            with open(os.path.join(directory, 'bloom.bin'), 'wb') as f:
+                f.write(self.visited.bitset)
+
+            if self.seen is not self.visited:
+                self.seen.flush()
+                shutil.copy(self.seen.path, os.path.join(directory, 'seen.fp'))
+
+        return {'held': len(held), 'claimed': claimed, 'back': back, 'front': front,
+                'filter_size': self.visited.size, 'filter_k': self.visited.k, **extra}
+
+    def _scheduler_loop(self) -> None:
+        '''
+        Refills inactive back queues from the front queues, sleeping until there are both front URLs and inactive back queues.
+        URLs whose domain already has a back queue go straight into it.
 
         This function should not be called by multiple threads, or by an external object.
         '''
 
-        while(True):
-            self.has_empty.clear()
-
-            with self.hinted_empty_lock: #Check queues hinted as empty
-                while self.hinted_empty:
-                    idx = self.hinted_empty.pop()
-                    if self.back[idx].qsize() == 0: #Really is empty
-                        self.inactive_back.add(idx)
-
-                        domain = self.domain_map[idx]
-                        del self.domain_map[idx] #idx -> domain
-                        del self.domain_map[domain] #domain -> idx
-            
-                    else: #False alarm, readd into heap
-                        delay = self.policies.get_delay(self.domain_map[idx])
-                        self.heap.put((time.time()+delay, idx))
-            
-            
-            #Check if we need to fill, either by empty heap or new empty entry        
-            while self.front.qsize() != 0 and len(self.inactive_back) != 0:
-                url = self.front.get()
-                domain = self._url_to_domain(url)
-
-                if domain in self.domain_map: #Already in a back queue
-                    self.back[self.domain_map[domain]].put_nowait(url)
-
-                    #Preventing future work: check if this was called for inactive_back
-                    add = False
-                    with self.hinted_empty_lock:
-                        if self.domain_map[domain] in self.hinted_empty:
-                            add = True
-                            self.hinted_empty.remove(self.domain_map[domain]) #Remove the index
-                    if add:
-                        self.heap.put((time.time(), self.domain_map[domain]))
-
-                else: #Allocate an empty back queue
-                    idx = self.inactive_back.pop()
-                    #Put in actual queue + register on map & heap
-                    self.back[idx].put(url)
-                    self.domain_map[domain] = idx
-                    self.domain_map[idx] = domain
-
-                    #Add delay just in case
-                    delay = self.policies.get_delay(domain)
-                    self.heap.put_nowait((time.time() + delay, idx))
-        
-            if len(self.inactive_back) == len(self.back): #Everything is inactive, nothing will call empty
-                time.sleep(.1)
-            else:
-                self.has_empty.wait()
+        with self.lock:
+            while not self.closed:
+                if self._front_size() != 0 and self.inactive_back:
+                    self._schedule()
+                else:
+                    self.refill.wait()
+
+    def _schedule(self) -> None:
+        '''Lock before calling this! Moves front URLs into back queues until either runs out'''
+
+        while len(self.inactive_back) != 0:
+            queues = [i for i, q in enumerate(self.fronts) if q.qsize() != 0]
+            if not queues:
+                break
+            queue = random.choices(queues, [self.scorer.weights[i] for i in queues])[0]
+
+            depth, url = self.fronts[queue].get().split(' ', 1)
+            depth = int(depth)
+            domain = self._url_to_domain(url)
+
+            if domain in self.domain_map: #Already in a back queue, which is in the heap or being fetched
+                self.back[self.domain_map[domain]].append(depth, self._path(url, domain))
+
+            else: #Allocate an empty back queue
+                idx = self.inactive_back.pop()
+                #Put in actual queue + register on map & heap
+                self.back[idx].append(depth, self._path(url, domain))
+                self.domain_map[domain] = idx
+                self.domain_map[idx] = domain
+
+                #Start resolving and fetching robots.txt now, so both are cached once a worker gets here. Never block the scheduler on it
+                if self.dns is not None:
+                    self.dns.prefetch(domain)
+                self.policies.prefetch(domain)
+
+                #Add delay just in case
+                delay = self.policies.get_delay(domain, block=False)
+                self._push(idx, time.time() + delay)
+
+    def _restore(self, directory: str) -> None:
+        '''Restores the state written by `checkpoint`. Must be called before the scheduler starts.'''
+
+        with open(os.path.join(directory, 'state.json')) as f:
+            state = json.load(f)
+
+        self.visited.size, self.visited.k = state['filter_size'], state['filter_k']
+        with open(os.path.join(directory, 'bloom.bin'), 'rb') as f:
+            self.visited.bitset = bytearray(f.read())
+
+        with open(os.path.join(directory, 'urls.txt'), encoding='utf-8') as f:
+            urls = (line.rstrip('\n') for line in f)
+
+            #Held URLs were not finished, process them again first
+            for _ in range(state['held']):
+                self.fronts[0].put(next(urls))
+
+            #Back queues get their domain back, as long as there are enough of them
+            for domain, count in state['back']:
+                if not self.inactive_back or count == 0:
+                    for _ in range(count):
+                        self.fronts[0].put(next(urls))
+                    continue
+
+                idx = self.inactive_back.pop()
+                self.domain_map[domain] = idx
+                self.domain_map[idx] = domain
+                for _ in range(count):
+                    depth, url = next(urls).split(' ', 1)
+                    self.back[idx].append(int(depth), self._path(url, domain))
+                self._push(idx, time.time())
+
+            for queue, count in enumerate(state['front']):
+                front = self.fronts[min(queue, len(self.fronts) - 1)]
+                for _ in range(count):
+                    front.put(next(urls))
 
     def _url_to_domain(self, url: str) -> str:
         'Gets the domain from an URL'
 
         parsed = urlparse(url)
         return f"{parsed.scheme}://{parsed.netloc}"
-    
\ No newline at end of file
+
+    def _path(self, url: str, domain: str) -> str:
+        'What a back queue of `domain` stores of `url`: what follows the domain, or the whole URL if spelled differently'
+
+        return url[len(domain):] if url.startswith(domain) else url
+
+    def _join(self, domain: str, path: str) -> str:
+        'Turns what `_path` stored back into its URL. Paths start with a separator, never like a scheme.'
+
+        return domain + path if path[:1] in ('', '/', '?', '#') else path
+
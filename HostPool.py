@@ -0,0 +1,216 @@
+import time
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+class HostPool(HTTPAdapter):
+    '''
+    Transport adapter keeping one pool of keep-alive connections per host, shared by every worker: a single `requests.Session`
+    mounting it reuses a host's warm connection no matter which worker fetches from it.
+
+    At most `max_hosts` host pools are kept (least recently used ones are closed), each keeping up to `per_host` idle connections.
+    Connections idle for over `idle_timeout` seconds are closed, and at most `max_sockets` connections are open at once: past it,
+    idle connections of the least recently used hosts are closed, or the request waits for one to be released.
+
+    `created` and `reused` count connections opened and requests sent on an already open connection, and `requests` every
+    request sent. If set, `observer` is called after every request as `observer(url, elapsed, status, retry_after)`,
+    with a None status if it failed.
+    '''
+
+    def __init__(self, max_hosts: int=1000, per_host: int=2, max_sockets: int=512, idle_timeout: float=30, **kwargs):
+        self.max_sockets = max_sockets
+        self.idle_timeout = idle_timeout
+
+        #Guards everything below. Never held while taking urllib3's pools lock: urllib3 closes the pools it drops under that lock,
+        #and closing a connection takes this one
+        self.cond = threading.Condition(threading.RLock())
+        self.open = set() #Open connections, idle or not
+        self.created = 0
+        self.reused = 0
+        self.requests = 0
+
+        #Pool classes reporting back to this adapter
+        self.pool_classes = {'http': type('HostHTTPPool', (_TrackedPool, HTTPConnectionPool), {'owner': self}),
+                             'https': type('HostHTTPSPool', (_TrackedPool, HTTPSConnectionPool), {'owner': self})}
+
+        super().__init__(pool_connections=max_hosts, pool_maxsize=per_host, **kwargs)
+
+        self.observer = None
+        self.parent = self #Adapter counting the requests, see `with_retries`
+        self.closed = False
+        threading.Thread(target=self._evict_loop, daemon=True).start()
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+        #urllib3 2 leaves dropped pools to the garbage collector, their idle connections would stay open and count against
+        #`max_sockets` forever. Closed under the pools lock, so `cond` must never be held when taking it
+        self.poolmanager.pools.dispose_func = lambda pool: pool.close()
+
+    def with_retries(self, max_retries) -> 'HostPool':
+        '''
+        Adapter sending through the same pools, to the same observer, which retries as `max_retries` says instead.
+        Its requests are counted by this one. Set the observer first.
+        '''
+
+        adapter = object.__new__(HostPool) #Not copy.copy, HTTPAdapter pickles itself with new pools
+        adapter.__dict__.update(self.__dict__)
+        adapter.max_retries = Retry.from_int(max_retries)
+        return adapter
+
+    def send(self, request, *args, **kwargs):
+        with self.cond:
+            self.parent.requests += 1
+
+        start = time.monotonic()
+        try:
+            res = super().send(request, *args, **kwargs)
+        except Exception:
+            if self.observer is not None:
+                self.observer(request.url, time.monotonic() - start, None)
+            raise
+
+        if self.observer is not None:
+            self.observer(request.url, time.monotonic() - start, res.status_code, res.headers.get('Retry-After'))
+        return res
+
+    def stats(self) -> dict:
+        hosts = len(self.poolmanager.pools)
+        with self.cond:
+            return {'open': len(self.open), 'created': self.created, 'reused': self.reused, 'requests': self.requests,
+                    'hosts': hosts}
+
+    def close(self) -> None:
+        self.closed = True
+        super().close()
+
+    def _acquired(self, conn) -> None:
+        '''Counts a connection taken from a pool as reused, or registers it as new, first making room for it under `max_sockets`'''
+
+        with self.cond:
+            if conn in self.open:
+                if conn.sock is not None:
+                    self.reused += 1
+                return
+
+        #New, or closed (dropped by the server, evicted...) and about to reconnect
+        while True:
+            with self.cond:
+                if len(self.open) < self.max_sockets:
+                    self.open.add(conn)
+                    self.created += 1
+                    break
+
+            if not self._evict(1): #Outside the lock, see `__init__`
+                with self.cond:
+                    if len(self.open) >= self.max_sockets:
+                        self.cond.wait(1) #Every connection is busy, wait for one to be released
+
+        if not getattr(conn, 'tracked', False):
+            close = conn.close
+            def tracked_close():
+                close()
+                with self.cond:
+                    self.open.discard(conn)
+                    self.cond.notify()
+            conn.close = tracked_close
+            conn.tracked = True
+
+    def _released(self) -> None:
+        'A connection went back to its pool, where it can be evicted'
+
+        with self.cond:
+            self.cond.notify()
+
+    def _evict(self, count: int=None, idle_for: float=0) -> int:
+        '''
+        Closes up to `count` (all if None) connections idle for at least `idle_for` seconds,
+        from the least recently used hosts first. Returns how many were closed.
+        Takes the pools lock, then `cond`, one after the other: call it without holding either.
+        '''
+
+        pools = self.poolmanager.pools
+        with pools.lock: #Least recently used first. Read the container directly, lookups would make them most recently used
+            pools = list(pools._container.values())
+
+        evicted = [] #Closed once no lock is held, closing takes `cond`
+        now = time.monotonic()
+        for pool in pools:
+            idle = pool.pool
+            if idle is None:
+                continue
+
+            #Idle connections are on a LIFO queue, padded with None. Take them all out and put back the ones kept, in order
+            kept = []
+            while True:
+                try:
+                    conn = idle.get(block=False)
+                except Exception: #Empty, or closed meanwhile
+                    break
+
+                if conn is not None and (count is None or len(evicted) < count) and now - conn.idle_since >= idle_for:
+                    with self.cond:
+                        tracked = conn in self.open
+                    if tracked:
+                        evicted.append(conn)
+                        conn = None
+                kept.append(conn)
+
+            for conn in reversed(kept):
+                try:
+                    idle.put(conn, block=False)
+                except Exception:
+                    if conn is not None:
+                        evicted.append(conn)
+
+            if pool.pool is not idle: #Closed meanwhile, its queue drained while connections were out of it
+                evicted += _drain(idle)
+
+            if count is not None and len(evicted) >= count:
+                break
+
+        for conn in evicted:
+            conn.close()
+        return len(evicted)
+
+    def _evict_loop(self) -> None:
+        'Closes connections idle for over `idle_timeout` seconds, checking every half of it'
+
+        while not self.closed:
+            time.sleep(self.idle_timeout / 2)
+            self._evict(idle_for=self.idle_timeout)
+
+def _drain(idle) -> list:
+    'Takes every connection out of the idle queue of a pool'
+
+    conns = []
+    while True:
+        try:
+            conn = idle.get(block=False)
+        except Exception:
+            return conns
+        if conn is not None:
+            conns.append(conn)
+
+class _TrackedPool:
+    '''urllib3 connection pool reporting its connections to `owner`, a HostPool'''
+
+    owner = None
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        self.owner._acquired(conn)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.idle_since = time.monotonic()
+        idle = self.pool
+        super()._put_conn(conn)
+
+        #urllib3 puts connections back without a lock, so one may land in the queue of a pool closed meanwhile, after it was drained
+        if idle is not None and self.pool is not idle:
+            for conn in _drain(idle):
+                conn.close()
+        self.owner._released()
@@ -0,0 +1,56 @@
+import re
+from html import unescape
+
+#One pass over the raw bytes, each match being a token we care about: comments and script/style blocks are consumed
+#whole (so links inside them are ignored, as html.parser does), and <a>/<base> start tags capture their attributes.
+token_regex = re.compile(
+        rb'<!--.*?(?:-->|$)|' #comments
+        rb'<(script|style)\b[^>]*>.*?(?:</\1\s*>|$)|' #raw text elements
+        rb'<(a|base)(?=[\s/>])((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', #<a ...> and <base ...>
+        re.IGNORECASE | re.DOTALL)
+
+attr_regex = re.compile(rb'([^\s/>"\'=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]*)))?')
+
+class LinkExtractor:
+    '''
+    Extracts link targets from HTML without building a document tree. Raw response bytes are tokenized in a single
+    regex pass, and only `href` attributes of `<a>` and `<base>` tags are decoded.
+    '''
+
+    def extract(self, body: bytes, encoding: str='utf-8') -> tuple[str | None, list[str]]:
+        '''
+        Returns `(base, links)`: the `<base href>` of the page, or None if there is none, and the `href` of every `<a>` tag
+        in document order. Values are decoded with `encoding` and have character references unescaped.
+        '''
+
+        base = None
+        links = []
+
+        for match in token_regex.finditer(body):
+            tag = match.group(2)
+            if tag is None: #Comment or script/style
+                continue
+
+            href = self._get_href(match.group(3))
+            if href is None:
+                continue
+
+            href = unescape(href.decode(encoding, 'replace'))
+            if len(tag) == 1: #<a>
+                links.append(href)
+            elif base is None: #First <base> wins
+                base = href
+
+        return base, links
+
+    def _get_href(self, attrs: bytes) -> bytes | None:
+        'Gets the raw `href` value from the attributes of a tag. Like BeautifulSoup, the last duplicate wins.'
+
+        if b'href' not in attrs.lower():
+            return None
+
+        href = None
+        for name, double, single, bare in attr_regex.findall(attrs):
+            if name.lower() == b'href':
+                href = double or single or bare
+        return href
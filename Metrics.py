@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#Upper bounds of latency histogram buckets, in seconds. Anything slower goes in a last +Inf bucket
+buckets = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+class Metrics:
+    '''
+    Counters, latency histograms and gauges of a crawl, cheap enough for the hot path: recording is a dict update under
+    a lock, and gauges are only read when a snapshot is taken. Names may carry Prometheus labels, as in
+    `fetch_seconds{method="get"}`.
+
+    Locks created by `lock` count their acquisitions, and how long callers waited for them when contended.
+
+    `snapshot` gives everything as a dict, and `prometheus` in the Prometheus text format. They can be written to files
+    every `interval` seconds with `start_writer`, or served over HTTP with `serve`. If a SamplingProfiler is attached
+    as `profiler`, snapshots also list the functions it saw the most.
+    '''
+
+    def __init__(self, prefix: str='crawler_'):
+        self.prefix = prefix
+        self.mutex = threading.Lock()
+        self.counters = Counter()
+        self.histograms = {} #name -> [count per bucket..., +Inf count, sum]
+        self.gauges = {} #name -> function returning its value
+        self.locks = {} #name -> TimedLock
+        self.profiler = None
+        self.started = time.time()
+        self.closed = False
+
+    def count(self, name: str, n: int=1) -> None:
+        with self.mutex:
+            self.counters[name] += n
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.mutex:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = [0] * (len(buckets) + 2)
+            h[bisect_left(buckets, seconds)] += 1
+            h[-1] += seconds
+
+    def timer(self, name: str) -> 'Timer':
+        '''Context manager observing the time spent in its block into histogram `name`'''
+        return Timer(self, name)
+
+    def gauge(self, name: str, func) -> None:
+        '''Registers a gauge, whose value `func()` is read on every snapshot'''
+        self.gauges[name] = func
+
+    def lock(self, name: str) -> 'TimedLock':
+        '''Creates a lock reporting its contention under `name`'''
+
+        lock = self.locks[name] = TimedLock(self, name)
+        return lock
+
+    def totals(self, family: str) -> tuple[int, float]:
+        '''Count and sum of the histograms of `family`, whatever their labels'''
+
+        with self.mutex:
+            hs = [h for name, h in self.histograms.items() if name.partition('{')[0] == family]
+            return sum(sum(h[:-1]) for h in hs), sum(h[-1] for h in hs)
+
+    def snapshot(self) -> dict:
+        '''Gets every metric: counters, gauges, histograms (with estimated percentiles), locks and profile'''
+
+        with self.mutex:
+            counters = dict(self.counters)
+            histograms = {name: list(h) for name, h in self.histograms.items()}
+
+        gauges = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception: #Structure being torn down
+                pass
+
+        snapshot = {'time': time.time(), 'uptime': time.time() - self.started, 'counters': counters, 'gauges': gauges,
+                    'histograms': {name: self._summary(h) for name, h in sorted(histograms.items())},
+                    'locks': {name: lock.stats() for name, lock in sorted(self.locks.items())}}
+        if self.profiler is not None:
+            snapshot['profile'] = self.profiler.top()
+        return snapshot
+
+    def prometheus(self) -> str:
+        '''Gets every metric in the Prometheus text format'''
+
+        snapshot = self.snapshot()
+        with self.mutex:
+            histograms = {name: list(h) for name, h in self.histograms.items()}
+
+        families = {} #Family -> its lines, as the samples of a family must be contiguous
+        def add(name, kind, labels, value, suffix=''):
+            family, labels = self._split(name, labels)
+            if family not in families:
+                families[family] = [f"# TYPE {self.prefix}{family} {kind}"]
+            families[family].append(f"{self.prefix}{family}{suffix}{labels} {value}")
+
+        for name, value in sorted(snapshot['counters'].items()):
+            add(name, 'counter', '', value)
+        for name, value in sorted(snapshot['gauges'].items()):
+            add(name, 'gauge', '', value)
+        for name, lock in snapshot['locks'].items():
+            label = f'lock="{name}"'
+            add('lock_acquired_total', 'counter', label, lock['acquired'])
+            add('lock_contended_total', 'counter', label, lock['contended'])
+            add('lock_wait_seconds_total', 'counter', label, lock['wait'])
+
+        for name, h in sorted(histograms.items()):
+            total = 0
+            for bound, n in zip(list(buckets) + ['+Inf'], h[:-1]):
+                total += n
+                add(name, 'histogram', f'le="{bound}"', total, '_bucket')
+            add(name, 'histogram', '', h[-1], '_sum')
+            add(name, 'histogram', '', total, '_count')
+
+        return '\n'.join(line for lines in families.values() for line in lines) + '\n'
+
+    def write(self, directory: str) -> None:
+        '''Writes a snapshot into `directory`, as `metrics.json` and `metrics.prom`, replacing the previous one'''
+
+        for name, text in [('metrics.json', json.dumps(self.snapshot(), indent=1)), ('metrics.prom', self.prometheus())]:
+            path = os.path.join(directory, name)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+
+        if self.profiler is not None:
+            self.profiler.write(os.path.join(directory, 'profile.txt'))
+
+    def start_writer(self, directory: str, interval: float) -> None:
+        '''Writes a snapshot into `directory` every `interval` seconds, until `close`'''
+
+        def loop():
+            while not self.closed:
+                time.sleep(interval)
+                if not self.closed:
+                    self.write(directory)
+        threading.Thread(target=loop, daemon=True).start()
+
+    def serve(self, port: int, host: str='127.0.0.1') -> ThreadingHTTPServer:
+        '''Serves `/metrics` (Prometheus text) and `/metrics.json` on `host:port`, in a daemon thread'''
+
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, mime = metrics.prometheus().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, mime = json.dumps(metrics.snapshot()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', mime)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self) -> None:
+        self.closed = True
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def _summary(self, h: list) -> dict:
+        'Count, sum, mean and percentiles of a histogram, percentiles being the upper bound of their bucket'
+
+        count = sum(h[:-1])
+        summary = {'count': count, 'sum': h[-1], 'mean': h[-1] / count if count else 0}
+        for p in (50, 90, 99):
+            seen = 0
+            for i, n in enumerate(h[:-1]):
+                seen += n
+                if count and seen >= count * p / 100:
+                    summary[f"p{p}"] = buckets[i] if i < len(buckets) else None #Slower than every bucket
+                    break
+        return summary
+
+    def _split(self, name: str, labels: str) -> tuple[str, str]:
+        'Splits `name{labels}` into its family and a label block, merged with `labels`'
+
+        family, _, own = name.partition('{')
+        merged = ','.join(l for l in (own.rstrip('}'), labels) if l)
+        return family, '{' + merged + '}' if merged else ''
+
+class Timer:
+    '''Times a block into a histogram of Metrics, see `Metrics.timer`'''
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+class TimedLock:
+    '''
+    Lock counting its acquisitions, and the time callers waited when it was already held, into a `lock_wait_seconds`
+    histogram. Uncontended acquisitions cost a single extra attempt, and counts are only updated while holding the lock.
+    '''
+
+    __slots__ = ('inner', 'metrics', 'name', 'acquired', 'contended', 'wait')
+
+    def __init__(self, metrics: Metrics, name: str):
+        self.inner = threading.Lock()
+        self.metrics = metrics
+        self.name = name
+        self.acquired = 0
+        self.contended = 0
+        self.wait = 0.0
+
+    def acquire(self, blocking: bool=True, timeout: float=-1) -> bool:
+        if self.inner.acquire(False):
+            self.acquired += 1
+            return True
+        if not blocking:
+            return False
+
+        start = time.perf_counter()
+        if not self.inner.acquire(True, timeout):
+            return False
+        waited = time.perf_counter() - start
+
+        self.acquired += 1
+        self.contended += 1
+        self.wait += waited
+        self.metrics.observe(f'lock_wait_seconds{{lock="{self.name}"}}', waited)
+        return True
+
+    def release(self) -> None:
+        self.inner.release()
+
+    def locked(self) -> bool:
+        return self.inner.locked()
+
+    def stats(self) -> dict:
+        return {'acquired': self.acquired, 'contended': self.contended, 'wait': self.wait}
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class SamplingProfiler:
+    '''
+    Statistical profiler for a live crawl: every `interval` seconds, the stack of every other thread is sampled.
+    `write` outputs them as collapsed stacks (`frame;frame;frame count` lines, outermost first), the input of flame graph
+    tools, and `top` gives the functions found most often on top of a stack. Costs nothing until started.
+    '''
+
+    def __init__(self, interval: float=0.01, max_depth: int=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True, name='profiler')
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+
+    def top(self, n: int=20) -> list[tuple[str, float]]:
+        '''The `n` functions most often running, with the share of samples they were running in'''
+
+        own = Counter()
+        with self.lock:
+            for stack, count in self.stacks.items():
+                own[stack.rsplit(';', 1)[-1]] += count
+            samples = sum(self.stacks.values())
+        return [(frame, count / samples) for frame, count in own.most_common(n)] if samples else []
+
+    def write(self, path: str) -> None:
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks)
+        os.replace(path + '.tmp', path)
+
+    def _loop(self) -> None:
+        me = threading.get_ident()
+        while self.running:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+
+                stack = [] #Innermost first, without reading any source, unlike traceback
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+
+                with self.lock:
+                    self.stacks[';'.join(reversed(stack))] += 1
@@ -1,67 +1,306 @@
 from protego import Protego
 from urllib.parse import urlparse
 import requests
-from threading import Lock
+from threading import Lock, Event
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import time
+import asyncio
+import aiohttp
+from email.utils import parsedate_to_datetime
 
 class PolicyManager:
     '''
     Synchronized class that manages policy data specified in `robots.txt` such as crawl-delay and allowed/disallowed pages.
     To avoid excess memory usage and eventually update old `robots.txt` files, this class operates on a cache.
+
+    The lock only guards the cache structures, never a fetch: the first caller for a host fetches its `robots.txt`
+    while concurrent callers for the same host wait on it (single-flight), and other hosts proceed normally.
+    Entries expire after `ttl` seconds. Failures (no `robots.txt`, dead hosts) are kept apart in a cheaper cache,
+    expiring after `failure_ttl` seconds, so hosts dropped by the LRU are not retried on every lookup.
+
+    Politeness adapts to each host, Mercator style: fetches are reported to `observe`, and without a crawl-delay, the delay
+    between fetches is `latency_factor` times the host's smoothed response time, within `[min_delay, max_delay]`, so a host
+    is kept busy about a tenth of the time. `min_delay` is never below `default_delay`: fast hosts are not fetched more
+    often than hosts not observed yet. 429 and 503 responses back off exponentially, up to `max_backoff` seconds, honoring
+    Retry-After. Parallel fetches are opt-in: with `max_parallel > 1`, fast and healthy hosts whose `robots.txt` sets no
+    crawl-delay or request rate may be fetched by up to `max_parallel` workers at once.
+
+    With `metrics` (see Metrics), the lock reports its contention.
     '''
 
-    def __init__(self, cache_size:int=1000, default_delay:float=0.1):
-        self.cache = OrderedDict() #Caches hosts' robots.txt
+    def __init__(self, cache_size:int=1000, default_delay:float=0.1, ttl:float=3600, failure_ttl:float=600,
+                 prefetch_workers:int=8, latency_factor:float=10, min_delay:float=None, max_delay:float=30,
+                 max_backoff:float=600, max_parallel:int=1, slow_latency:float=1, metrics=None):
+        self.cache = OrderedDict() #Caches hosts' robots.txt, host -> (rules, expires)
         self.cache_size = cache_size
+        self.failures = OrderedDict() #Hosts without usable robots.txt, host -> expires
+        self.failure_cache_size = 10 * cache_size
 
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
         self.default_delay = default_delay
 
-        self.lock = Lock()
+        self.lock = metrics.lock('policies') if metrics is not None else Lock()
+        self.pending = {} #Hosts being fetched right now, host -> Event set when done
+
+        self.prefetcher = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='robots')
+
+        #Adaptive politeness, also guarded by the lock
+        self.hosts = OrderedDict() #Observed hosts, host -> HostState
+        self.hosts_size = 10 * cache_size
+        self.latency_factor = latency_factor
+        self.min_delay = default_delay if min_delay is None else max(min_delay, default_delay)
+        self.max_delay = max_delay
+        self.max_backoff = max_backoff
+        self.max_parallel = max_parallel
+        self.slow_latency = slow_latency
 
-    def get_delay(self, url: str) -> float:
-        '''Gets crawl-delay from host, or default delay if not inexistent.'''
+        self.session = None #aiohttp session used by the async methods, set by AsyncCrawler
+        self.http = requests #requests session (or the module) used by the other methods, set by Crawler
+
+    def get_delay(self, url: str, block: bool=True) -> float:
+        '''
+        Gets crawl-delay from host, or default delay if not inexistent.
+        If `block` is False and the rules are not cached yet, starts a prefetch and returns the default delay.
+        '''
 
         h = self._extract_host(url)
 
-        with self.lock:
-            if h not in self.cache: #miss
-                self._get_rules(h)
-            else:
-                self._touch(h)
-        
-            val = self.cache[h].crawl_delay('') if self.cache[h] else None
+        if block:
+            rules = self._get_rules(h)
+        else:
+            found, rules = self._lookup(h)
+            if not found:
+                self.prefetch(h)
 
-        return self.default_delay if val == None else val
+        return self._delay(h, rules)
 
     def can_fetch(self, url: str) -> bool:
         '''Returns if crawling the given url is allowed.'''
 
+        val = self._get_rules(self._extract_host(url))
+
+        return True if val == None else val.can_fetch(url, '')
+
+    def prefetch(self, url: str) -> None:
+        '''Fetches the `robots.txt` of the url's host in the background, if not cached or already being fetched.'''
+
         h = self._extract_host(url)
+        with self.lock:
+            if h in self.pending or self._lookup_locked(h)[0]:
+                return
+
+        self.prefetcher.submit(self._get_rules, h)
+
+    def observe(self, url: str, elapsed: float, status: int | None, retry_after: str | None=None) -> None:
+        '''
+        Reports a fetch from the url's host: how long it took, its status (None if it failed) and its Retry-After header.
+        429 and 503 back the host off, other answers update its response time.
+        '''
 
+        h = self._extract_host(url)
+        now = time.time()
         with self.lock:
-            if h not in self.cache: #miss
-                self._get_rules(h)
-            else:
-                self._touch(h)
+            state = self.hosts.get(h)
+            if state is None:
+                state = self.hosts[h] = HostState()
+                if len(self.hosts) > self.hosts_size:
+                    self.hosts.popitem(last=False)
+            self.hosts.move_to_end(h)
 
-            val = self.cache[h]
+            if status in (429, 503):
+                state.backoff = min(max(2 * state.backoff, 1), self.max_backoff)
+                wait = max(self._parse_retry_after(retry_after, now), state.backoff)
+                state.blocked_until = max(state.blocked_until, now + min(wait, self.max_backoff))
+                return
 
-        return True if val == None else val.can_fetch(url, '')
+            state.latency = elapsed if state.latency is None else .7 * state.latency + .3 * elapsed
+            if status is not None and status < 500: #Healthy again
+                state.backoff /= 2
+                if state.backoff < 1:
+                    state.backoff = 0
 
-    def _get_rules(self, host: str) -> None:
-        '''Acquire lock before calling!! Fetches `robots.txt` from host'''
+    def blocked_for(self, url: str) -> float:
+        '''Seconds until the url's host can be fetched again after backing off, 0 if it can now'''
 
-        if len(self.cache) >= self.cache_size: # remove LRU cache
-            self.cache.popitem(last=False)
+        with self.lock:
+            state = self.hosts.get(self._extract_host(url))
+            return max(state.blocked_until - time.time(), 0) if state else 0
+
+    def get_parallelism(self, url: str) -> int:
+        '''
+        How many fetches of the url's host may run at once: `max_parallel` if its `robots.txt` is known and sets no crawl-delay
+        or request rate, and it answers faster than `slow_latency` without backing off. Otherwise 1. Never fetches.
+        '''
+
+        if self.max_parallel <= 1:
+            return 1
+
+        h = self._extract_host(url)
+        with self.lock:
+            found, rules = self._lookup_locked(h)
+            state = self.hosts.get(h)
+            if not found or state is None or state.latency is None:
+                return 1
+            if state.backoff or state.blocked_until > time.time() or state.latency > self.slow_latency:
+                return 1
+
+        if rules is not None and (rules.crawl_delay('') is not None or rules.request_rate('') is not None):
+            return 1
+        return self.max_parallel
+
+    async def get_delay_async(self, url: str) -> float:
+        '''Async version of `get_delay`. The event loop is not blocked while `robots.txt` is fetched.'''
+
+        h = self._extract_host(url)
+        rules = await self._get_rules_async(h)
+
+        return self._delay(h, rules)
+
+    async def can_fetch_async(self, url: str) -> bool:
+        '''Async version of `can_fetch`.'''
+
+        rules = await self._get_rules_async(self._extract_host(url))
+
+        return True if rules == None else rules.can_fetch(url, '')
+
+    def _get_rules(self, host: str) -> Protego | None:
+        '''Returns the rules for `host`, fetching its `robots.txt` on a miss. Must not be called with the lock held.'''
+
+        owner, found, rules, done = self._claim(host)
+        if found:
+            return rules
+        if not owner: #Someone else is fetching it
+            done.wait()
+            return self._lookup(host)[1]
 
         try:
-            resp = requests.get(f"{host}/robots.txt", timeout=1) #Tighter timeout for robots
+            resp = self.http.get(f"{host}/robots.txt", timeout=1) #Tighter timeout for robots
             resp.raise_for_status()
-            self.cache[host] = Protego.parse(resp.text)
+            rules = Protego.parse(resp.text)
 
         except requests.RequestException: #Website does not have robots.txt or not responding
-            self.cache[host] = None
-    
+            rules = None
+
+        finally:
+            self._store(host, rules)
+
+        return rules
+
+    async def _get_rules_async(self, host: str) -> Protego | None:
+        '''Async version of `_get_rules`, fetching `robots.txt` with `self.session`'''
+
+        owner, found, rules, done = self._claim(host)
+        if found:
+            return rules
+        if not owner: #The fetch may be running on a thread, so poll its event
+            while not done.is_set():
+                await asyncio.sleep(.05)
+            return self._lookup(host)[1]
+
+        try:
+            async with self.session.get(f"{host}/robots.txt", timeout=aiohttp.ClientTimeout(total=1)) as resp:
+                resp.raise_for_status()
+                rules = Protego.parse(await resp.text())
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+            rules = None
+
+        finally:
+            self._store(host, rules)
+
+        return rules
+
+    def _delay(self, host: str, rules: Protego | None) -> float:
+        '''Delay before fetching `host` again: its crawl-delay, or else the adaptive one, and at least what is left of a backoff'''
+
+        val = rules.crawl_delay('') if rules else None
+        delay = self.default_delay if val == None else val
+
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None:
+                return delay
+
+            if val == None and state.latency is not None:
+                delay = min(max(self.latency_factor * state.latency, self.min_delay), self.max_delay)
+            return max(delay, state.blocked_until - time.time())
+
+    def _parse_retry_after(self, value: str | None, now: float) -> float:
+        '''Seconds to wait according to a Retry-After header, either seconds or an HTTP date. 0 if missing or invalid.'''
+
+        if not value:
+            return 0
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - now, 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def _claim(self, host: str) -> tuple:
+        '''
+        Looks `host` up, registering the caller as the one fetching it on a miss.
+        Returns `(owner, found, rules, done)`, where `done` is the Event to wait on when someone else is fetching.
+        '''
+
+        with self.lock:
+            found, rules = self._lookup_locked(host)
+            if found:
+                return False, True, rules, None
+
+            done = self.pending.get(host)
+            if done is not None:
+                return False, False, None, done
+
+            self.pending[host] = Event()
+            return True, False, None, None
+
+    def _lookup(self, host: str) -> tuple:
+        '''Returns `(found, rules)` for `host`, without fetching'''
+
+        with self.lock:
+            return self._lookup_locked(host)
+
+    def _lookup_locked(self, host: str) -> tuple:
+        '''Acquire lock before calling!! Returns `(found, rules)`, dropping expired entries'''
+
+        now = time.time()
+        if host in self.cache:
+            rules, expires = self.cache[host]
+            if expires > now:
+                self._touch(host)
+                return True, rules
+            del self.cache[host]
+
+        if host in self.failures:
+            if self.failures[host] > now:
+                return True, None
+            del self.failures[host]
+
+        return False, None
+
+    def _store(self, host: str, rules: Protego | None) -> None:
+        '''Caches the result of a fetch and wakes up whoever waits on it'''
+
+        with self.lock:
+            if rules is None:
+                if len(self.failures) >= self.failure_cache_size: #Oldest failure first
+                    self.failures.popitem(last=False)
+                self.failures[host] = time.time() + self.failure_ttl
+            else:
+                if len(self.cache) >= self.cache_size: # remove LRU cache
+                    self.cache.popitem(last=False)
+                self.cache[host] = (rules, time.time() + self.ttl)
+
+            done = self.pending.pop(host, None)
+
+        if done is not None:
+            done.set()
+
     def _touch(self, host: str) -> None:
         '''Move a host to end, indicating it was used'''
 
@@ -71,4 +310,14 @@ class PolicyManager:
         '''Extracts the host from the URL. Assumes URL is valid.'''
 
         parsed = urlparse(url)
-        return f"{parsed.scheme}://{parsed.netloc}"
\ No newline at end of file
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+class HostState:
+    '''What PolicyManager observed of a host'''
+
+    __slots__ = ('latency', 'backoff', 'blocked_until')
+
+    def __init__(self):
+        self.latency = None #Smoothed response time, None until a first answer
+        self.backoff = 0 #Current backoff after 429/503, doubling each time
+        self.blocked_until = 0 #No fetches before this time
@@ -0,0 +1,174 @@
+import os
+import mmap
+import bisect
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from BloomFilter import BloomFilter
+
+class SeenStore:
+    '''
+    Exact URL-seen test in the style of Mercator, for crawls whose visited set does not fit in memory.
+
+    URLs are reduced to 64 bit fingerprints, kept sorted in a file on disk which is memory mapped and binary searched.
+    New fingerprints are buffered in memory and merged into the file in batches of `batch_size`, so memory stays flat
+    however large the crawl grows. A full buffer is swapped out and merged by a background thread, the file and both buffers
+    being checked until the merged file replaces the old one, so callers only wait when a merge is still running once the
+    next buffer fills up. An LRU cache of the `cache_size` most recently seen fingerprints answers most lookups
+    (the same nav/footer links show up on every page of a site) without touching the disk. The optional `bloom` filter
+    is used as a negative pre-check: a URL it has never seen is new for sure, and its false positives only cost a lookup.
+
+    Not synchronized, the Frontier calls it under its visited lock. The merge thread only reads the map and the buffer it was given.
+    '''
+
+    def __init__(self, directory: str, batch_size: int=100000, cache_size: int=100000,
+                 bloom: BloomFilter | None=None, resume: bool=False):
+        '''Fingerprints are stored in `directory/seen.fp`, which is kept when `resume` is set and truncated otherwise.'''
+
+        self.path = os.path.join(directory, 'seen.fp')
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.bloom = bloom
+
+        self.cache = OrderedDict() #Recently seen fingerprints
+        self.buffer = set() #Fingerprints not merged into disk yet
+        self.merging = frozenset() #Fingerprints being merged into disk by `merger`
+        self.merger = None #Background merge thread
+        self.merge_error = None
+
+        os.makedirs(directory, exist_ok=True)
+        if not resume or not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+
+        self.file = None
+        self.map = None
+        self.sorted = None #Fingerprints on disk, as a sequence of ints
+        self._open()
+
+    def check_and_add(self, url: str) -> bool:
+        '''Adds `url`, returning if it was already seen. Unlike a Bloom filter, the answer is exact.'''
+
+        fp = self._fingerprint(url)
+        if self.merger is not None and not self.merger.is_alive():
+            self._finish_merge()
+
+        if fp in self.cache: #Hot path
+            self.cache.move_to_end(fp)
+            return True
+
+        #Never seen by the Bloom filter means never seen at all
+        seen = (self.bloom is None or self.bloom.check_and_add(url)) and (fp in self.buffer or fp in self.merging or self._on_disk(fp))
+
+        if not seen:
+            self.buffer.add(fp)
+
+        self.cache[fp] = None
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        if len(self.buffer) >= self.batch_size:
+            self._start_merge()
+
+        return seen
+
+    def __len__(self) -> int:
+        return len(self.sorted) + len(self.merging) + len(self.buffer)
+
+    def flush(self) -> None:
+        '''Merges buffered fingerprints into the sorted file on disk, waiting for it, so the file holds every URL seen'''
+
+        self._start_merge()
+        self._finish_merge()
+
+    def _start_merge(self) -> None:
+        'Swaps the buffer out and merges it in a background thread, after the merge still running if any'
+
+        if self.merger is not None:
+            self._finish_merge()
+        if not self.buffer:
+            return
+
+        self.merging = frozenset(self.buffer)
+        self.buffer = set()
+        self.merger = threading.Thread(target=self._merge_thread, args=(self.merging,), daemon=True)
+        self.merger.start()
+
+    def _merge_thread(self, new: frozenset[int]) -> None:
+        'Writes the merged file next to the current one, which `_finish_merge` replaces'
+
+        try:
+            with open(self.path + '.tmp', 'wb') as out:
+                self._merge(out, sorted(new))
+        except Exception as e:
+            self.merge_error = e
+
+    def _finish_merge(self) -> None:
+        'Waits for the merge thread, then maps the merged file in place of the old one'
+
+        if self.merger is None:
+            return
+
+        self.merger.join()
+        self.merger = None
+        if self.merge_error is not None:
+            error, self.merge_error = self.merge_error, None
+            self.buffer |= self.merging #Retried by the next merge
+            self.merging = frozenset()
+            raise error
+
+        self._close_map()
+        os.replace(self.path + '.tmp', self.path)
+        self._open()
+        self.merging = frozenset()
+
+    def _merge(self, out, new: list[int]) -> None:
+        'Writes the file contents merged with `new` into `out`. No slice of the map may outlive this call, or it cannot be closed.'
+
+        i = 0
+        for start in range(0, len(self.sorted), self.batch_size):
+            chunk = self.sorted[start:start + self.batch_size]
+
+            #Buffered fingerprints that go before the end of this chunk
+            j = bisect.bisect_right(new, chunk[-1], i)
+            out.write(array('Q', sorted([*chunk, *new[i:j]])).tobytes()) #Two sorted runs, timsort merges them
+            chunk.release()
+            i = j
+
+        out.write(array('Q', new[i:]).tobytes())
+
+    def close(self) -> None:
+        '''Flushes the buffer and releases the file'''
+
+        self.flush()
+        self._close_map()
+
+    def _on_disk(self, fp: int) -> bool:
+        'Binary search over the memory mapped file'
+
+        i = bisect.bisect_left(self.sorted, fp)
+        return i < len(self.sorted) and self.sorted[i] == fp
+
+    def _fingerprint(self, url: str) -> int:
+        'Gets the 64 bit fingerprint of an URL'
+
+        return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), 'little')
+
+    def _open(self) -> None:
+        'Maps the file on disk. Empty files cannot be mapped, so an empty sequence stands in for them.'
+
+        if os.path.getsize(self.path) == 0:
+            self.sorted = ()
+            return
+
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sorted = memoryview(self.map).cast('Q')
+
+    def _close_map(self) -> None:
+        if self.map is not None:
+            self.sorted.release()
+            self.map.close()
+            self.file.close()
+            self.map = self.file = None
+        self.sorted = ()
@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+import multiprocessing
+from itertools import groupby
+from zlib import crc32
+from urllib.parse import urlparse
+from Crawler import Crawler
+from AsyncCrawler import AsyncCrawler
+
+def shard_of(url: str, num_shards: int) -> int:
+    '''Gets the shard owning the host of `url`. Stable across processes, unlike `hash`.'''
+    return crc32(urlparse(url).netloc.lower().encode()) % num_shards
+
+class Shard:
+    '''
+    One process of a sharded crawl. Every host belongs to a single shard (see `shard_of`), so each process has its own Frontier,
+    Bloom Filter, robots.txt cache and Corpus, and politeness still holds without sharing anything.
+
+    Outlinks to hosts of other shards are buffered and sent to their `inboxes` in batches of `batch_size` `(depth, url)` pairs,
+    or every `flush_interval` seconds. The page budget is `budget`, shared by all shards. The crawl is over once the budget is spent, or once every shard's
+    frontier is exhausted with no batch in transit, counted in `in_flight`. `idle`, `in_flight` and `finished` are only
+    changed under `lock`, so that check is consistent.
+    '''
+
+    def __init__(self, index: int, num_shards: int, inboxes: list, budget, to_crawl: int, lock, idle, in_flight, finished,
+                 batch_size: int=500, flush_interval: float=0.5):
+        self.index = index
+        self.num_shards = num_shards
+        self.inboxes = inboxes
+        self.budget = budget
+        self.to_crawl = to_crawl
+        self.lock = lock
+        self.idle = idle
+        self.in_flight = in_flight
+        self.finished = finished
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        for inbox in inboxes: #Never wait on exit for batches nobody will read anymore
+            inbox.cancel_join_thread()
+
+        self.outboxes = [[] for _ in range(num_shards)]
+        self.outbox_lock = threading.Lock()
+        self.frontier = None
+
+    def owns(self, url: str) -> bool:
+        return shard_of(url, self.num_shards) == self.index
+
+    def attach(self, frontier) -> None:
+        '''Starts receiving batches into `frontier`, and watching for the end of the crawl'''
+
+        self.frontier = frontier
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+        threading.Thread(target=self._monitor_loop, daemon=True).start()
+
+    def route(self, urls: list[str], depth: int=0) -> list[str]:
+        '''Buffers URLs of other shards to be sent to them along with their `depth`, returning the ones of this shard'''
+
+        own = []
+        full = []
+        with self.outbox_lock:
+            for url in urls:
+                shard = shard_of(url, self.num_shards)
+                if shard == self.index:
+                    own.append(url)
+                    continue
+
+                self.outboxes[shard].append((depth, url))
+                if len(self.outboxes[shard]) >= self.batch_size:
+                    full.append((shard, self.outboxes[shard]))
+                    self.outboxes[shard] = []
+
+        for shard, batch in full:
+            self._send(shard, batch)
+        return own
+
+    def claim(self) -> bool:
+        'Reserves one page of the global budget. Returns False if it is exhausted.'
+
+        with self.budget.get_lock():
+            if self.budget.value >= self.to_crawl: return False
+            self.budget.value += 1
+        return True
+
+    def done(self) -> bool:
+        return self.finished.value or self.budget.value >= self.to_crawl
+
+    def _send(self, shard: int, batch: list[str]) -> None:
+        with self.lock: #Counted before it is sent, so the batch is never missing from both sides
+            self.in_flight.value += 1
+        self.inboxes[shard].put(batch)
+
+    def _flush(self) -> None:
+        'Sends every buffered URL'
+
+        with self.outbox_lock:
+            batches = [(shard, batch) for shard, batch in enumerate(self.outboxes) if batch]
+            self.outboxes = [[] for _ in range(self.num_shards)]
+
+        for shard, batch in batches:
+            self._send(shard, batch)
+
+    def _receive_loop(self) -> None:
+        'Puts batches from other shards into the frontier'
+
+        inbox = self.inboxes[self.index]
+        while True:
+            batch = inbox.get()
+            with self.lock: #Not idle anymore by the time the batch stops being in transit
+                for depth, urls in groupby(batch, key=lambda item: item[0]): #Outlinks of a page come together
+                    self.frontier.put_many([url for _, url in urls], depth)
+                self.idle[self.index] = 0
+                self.in_flight.value -= 1
+
+    def _monitor_loop(self) -> None:
+        'Flushes outboxes every `flush_interval` seconds, and closes the frontier once the crawl is over'
+
+        while not self.done():
+            time.sleep(self.flush_interval)
+            self._flush()
+
+            with self.lock: #Workers buffer outlinks before going idle, so check the outboxes after the frontier
+                self.idle[self.index] = int(self.frontier.exhausted() and not any(self.outboxes))
+                if self.in_flight.value == 0 and all(self.idle):
+                    self.finished.value = 1
+
+        self.frontier.close()
+
+def run_shards(seeds: list[str], to_crawl: int, num_shards: int, use_async: bool=False, num_workers: int=12,
+               verbose: bool=False, output_dir: str="./output", seen_dir: str | None=None, **kwargs) -> int:
+    '''
+    Crawls with `num_shards` processes, each owning the hosts mapped to it and running `num_workers` threads (or coroutines,
+    with `use_async`). Shard `i` writes into `output_dir/shard-i` (and `seen_dir/shard-i`), and serves its metrics on
+    `metrics_port + i` if given. Other arguments are passed to each Crawler.
+    Returns the number of pages crawled.
+    '''
+
+    ctx = multiprocessing.get_context('spawn')
+    budget = ctx.Value('q', 0)
+    shared = dict(lock=ctx.Lock(), idle=ctx.Array('b', num_shards, lock=False), in_flight=ctx.Value('q', 0, lock=False),
+                  finished=ctx.Value('b', 0, lock=False))
+    inboxes = [ctx.Queue() for _ in range(num_shards)]
+    started = ctx.Barrier(num_shards)
+
+    processes = [ctx.Process(target=_shard_main, args=(i, num_shards, inboxes, budget, shared, started, seeds, to_crawl,
+                                                       use_async, num_workers, verbose, output_dir, seen_dir, kwargs))
+                 for i in range(num_shards)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    return budget.value
+
+def _shard_main(index, num_shards, inboxes, budget, shared, started, seeds, to_crawl, use_async, num_workers, verbose,
+                output_dir, seen_dir, kwargs) -> None:
+    'Entry point of a shard process'
+
+    shard = Shard(index, num_shards, inboxes, budget, to_crawl, **shared)
+    shard_dir = os.path.join(output_dir, f"shard-{index}")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    if kwargs.get('metrics_port') is not None: #One endpoint per shard
+        kwargs = {**kwargs, 'metrics_port': kwargs['metrics_port'] + index}
+
+    cls = AsyncCrawler if use_async else Crawler
+    c = cls(seeds, to_crawl, verbose, num_workers, output_dir=shard_dir,
+            seen_dir=os.path.join(seen_dir, f"shard-{index}") if seen_dir is not None else None, shard=shard, **kwargs)
+
+    with budget.get_lock(): #Pages restored from a checkpoint
+        budget.value += c.crawled
+    started.wait()
+
+    if use_async:
+        c.run()
+    else:
+        threads = [threading.Thread(target=c.crawl, args=(i,)) for i in range(num_workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
@@ -0,0 +1,186 @@
+import os
+from collections import deque
+from queue import Empty
+from threading import Lock
+
+class SpillQueue:
+    '''
+    Thread-safe FIFO queue of URLs, keeping at most `memory_items` of them in memory.
+
+    Past the memory budget, URLs are appended to segment files in `directory` (one URL per line, `segment_items` per file),
+    which are read back lazily, one at a time, once the in-memory part drains. While anything is on disk, new URLs go to disk
+    too, so FIFO order is preserved. In memory, URLs are kept in prefix compressed blocks (see BlockQueue).
+    '''
+
+    def __init__(self, directory: str, memory_items: int=1000000, segment_items: int=100000):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.segment_items = segment_items
+
+        os.makedirs(directory, exist_ok=True)
+        for f in os.listdir(directory): #Leftovers from a previous run
+            if f.endswith('.seg'):
+                os.remove(os.path.join(directory, f))
+
+        self.memory = BlockQueue()
+        self.segments = deque() #Sealed segment files, oldest first
+        self.writer = None #Segment being appended to
+        self.writer_path = None
+        self.writer_count = 0
+        self.next_segment = 0
+
+        self.size = 0
+        self.lock = Lock()
+
+    def put(self, url: str) -> None:
+        with self.lock:
+            if self.writer is None and not self.segments and len(self.memory) < self.memory_items:
+                self.memory.append(url)
+            else:
+                self._spill(url)
+            self.size += 1
+
+    def get(self) -> str:
+        '''Pops the oldest URL, raising `queue.Empty` if there is none'''
+
+        with self.lock:
+            if not self.memory:
+                self._load()
+            if not self.memory:
+                raise Empty
+
+            self.size -= 1
+            return self.memory.popleft()
+
+    def qsize(self) -> int:
+        return self.size
+
+    def dump(self, f) -> int:
+        '''Writes every queued URL into text file `f`, one per line and in order, returning how many were written'''
+
+        with self.lock:
+            for url in self.memory:
+                f.write(url + '\n')
+
+            if self.writer is not None:
+                self.writer.flush()
+            for path in [*self.segments, self.writer_path] if self.writer is not None else self.segments:
+                with open(path, encoding='utf-8') as segment:
+                    for line in segment:
+                        f.write(line)
+
+            return self.size
+
+    def _spill(self, url: str) -> None:
+        'Lock before calling this! Appends an URL to the current segment, opening a new one if needed.'
+
+        if self.writer is None:
+            self.writer_path = os.path.join(self.directory, f"front-{self.next_segment}.seg")
+            self.writer = open(self.writer_path, 'w', encoding='utf-8')
+            self.writer_count = 0
+            self.next_segment += 1
+
+        self.writer.write(url + '\n')
+        self.writer_count += 1
+        if self.writer_count >= self.segment_items:
+            self._seal()
+
+    def _seal(self) -> None:
+        'Lock before calling this! Closes the current segment, making it readable.'
+
+        self.writer.close()
+        self.segments.append(self.writer_path)
+        self.writer = None
+
+    def _load(self) -> None:
+        'Lock before calling this! Moves the oldest segment on disk into memory.'
+
+        if not self.segments and self.writer is not None:
+            self._seal()
+        if not self.segments:
+            return
+
+        path = self.segments.popleft()
+        with open(path, encoding='utf-8') as f:
+            self.memory.extend(line.rstrip('\n') for line in f)
+        os.remove(path)
+
+class BlockQueue:
+    '''
+    FIFO of lines (without newlines) kept in prefix compressed blocks of `block_size`: each line is stored as the length
+    of the prefix it shares with the previous one (up to 255), followed by the rest, UTF-8 encoded. URLs queued one after
+    the other often share their host and path, so a line mostly costs its own tail instead of a whole str.
+
+    New lines are appended to an open block of plain strings, compressed once full. Lines are popped from the decoded
+    head block, so only two blocks are ever uncompressed.
+    '''
+
+    def __init__(self, block_size: int=128):
+        self.block_size = block_size
+        self.head = deque() #Decoded oldest block
+        self.blocks = deque() #Compressed blocks, oldest first
+        self.tail = [] #Open block
+        self.size = 0
+
+    def append(self, line: str) -> None:
+        self.tail.append(line)
+        self.size += 1
+        if len(self.tail) >= self.block_size:
+            self.blocks.append(self._encode(self.tail))
+            self.tail = []
+
+    def extend(self, lines) -> None:
+        for line in lines:
+            self.append(line)
+
+    def popleft(self) -> str:
+        if not self.head:
+            if self.blocks:
+                self.head.extend(self._decode(self.blocks.popleft()))
+            elif self.tail:
+                self.head.extend(self.tail)
+                self.tail = []
+            else:
+                raise IndexError('pop from an empty BlockQueue')
+
+        self.size -= 1
+        return self.head.popleft()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        yield from self.head
+        for block in self.blocks:
+            yield from self._decode(block)
+        yield from self.tail
+
+    def _encode(self, lines: list[str]) -> bytes:
+        out = bytearray()
+        prev = b''
+        for line in lines:
+            cur = line.encode()
+            lo, hi = 0, min(len(prev), len(cur), 255) #Longest common prefix, by halves as slices compare in C
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if prev[:mid] == cur[:mid]:
+                    lo = mid
+                else:
+                    hi = mid - 1
+
+            out.append(lo)
+            out += cur[lo:]
+            out.append(10) #Newline, never part of a line
+            prev = cur
+        return bytes(out)
+
+    def _decode(self, block: bytes) -> list[str]:
+        lines = []
+        prev = b''
+        pos = 0
+        while pos < len(block):
+            end = block.index(b'\n', pos + 1) #The prefix length itself may be a newline
+            prev = prev[:block[pos]] + block[pos + 1:end]
+            lines.append(prev.decode())
+            pos = end + 1
+        return lines
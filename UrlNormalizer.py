@@ -0,0 +1,105 @@
+import re
+from functools import lru_cache
+from urllib.parse import urljoin
+from url_normalize import url_normalize
+
+#Taken from https://github.com/django/django/blob/main/django/core/validators.py
+url_regex = re.compile(
+        r'^(?:http)s?://' # http:// or https://
+        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|' #domain...
+        r'localhost|' #localhost...
+        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
+        r'(?::\d+)?' # optional port
+        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+#URLs already in the form url_normalize would give them, and valid according to url_regex: lowercase http(s) domain with
+#a common TLD, optional port, and a path of characters url_normalize never escapes. No query (filter_params drops it), no fragment.
+canonical_regex = re.compile(
+        r"(https?)://((?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,6})(?::([1-9][0-9]{0,4}))?"
+        r"(/[A-Za-z0-9._~!$&'()*+,;=:@\[\]/-]*)")
+
+#Hrefs with a host, resolved the same way against any base of the same scheme
+absolute_regex = re.compile(r'(?:[A-Za-z][A-Za-z0-9+.-]*:)?//[^/?#\x00-\x20]')
+relative_start = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._~%-')
+
+class UrlNormalizer:
+    '''
+    Thread-safe URL normalization with memoization, giving the same results as resolving with `urljoin`, validating with
+    `url_regex` and normalizing with `url_normalize(..., filter_params=True)` without fragments.
+
+    Results are cached in a bounded LRU keyed on the href and the part of the base it actually depends on: nothing for
+    absolute hrefs, the scheme and host for `/path` hrefs, the base directory for relative paths. So the nav and footer links
+    repeated on every page of a site are only normalized once. URLs that are already canonical skip `url_normalize`.
+    '''
+
+    def __init__(self, cache_size: int=100000):
+        self._cached = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def normalize(self, original_url: str, new_url: str) -> str:
+        '''Normalizes `new_url`, found in `original_url`. If URL is invalid, returns `''`.'''
+
+        return self._cached(self._context(original_url, new_url), new_url)
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+    def _context(self, base: str, href: str) -> str:
+        '''
+        Gets the shortest prefix of `base` that resolves `href` to the same URL, used as cache key and base: its scheme for
+        hrefs with a host, its host for absolute paths, its directory for relative paths, or all of it (without fragment).
+        '''
+
+        base = base.split('#', 1)[0]
+        scheme_end = base.find('://')
+        if scheme_end == -1 or '\t' in href or '\n' in href or '\r' in href: #urljoin drops these anywhere
+            return base
+
+        if absolute_regex.match(href):
+            return base[:scheme_end + 1]
+
+        host_end = base.find('/', scheme_end + 3)
+        if href[:1] == '/' and href[1:2] != '/': #Absolute path, only the host matters
+            return base if host_end == -1 else base[:host_end]
+
+        if href[:1] in relative_start and ':' not in href.split('/', 1)[0] and host_end != -1: #Relative path, only the directory matters
+            path = base.split('?', 1)[0]
+            return path[:path.rfind('/') + 1]
+
+        return base
+
+    def _normalize(self, base: str, href: str) -> str:
+        'Uncached normalization of `href` against `base`'
+
+        #Handle relative url + relative protocols
+        try:
+            new_url = urljoin(base, href)
+        except: #A lot can go wrong here, just skip if needed
+            return ''
+
+        #Fast path, nothing to normalize
+        match = canonical_regex.fullmatch(new_url)
+        if match and self._is_canonical(*match.groups()):
+            return new_url
+
+        #Check this BEFORE normalization, since url_normalize is apparently very cost inneficient
+        if url_regex.match(new_url) == None:
+            return ''
+
+        try:
+            normal = url_normalize(new_url, filter_params=True)
+            normal = normal.split('#', 1)[0] #Remove hashes # in links too
+        except: #Couldnt parse url, probably not an url in the first place...
+            return ''
+
+        return normal #Sucess
+
+    def _is_canonical(self, scheme: str, host: str, port: str | None, path: str) -> bool:
+        'Checks what `canonical_regex` cannot: IDNA labels, default ports, dot segments, empty segments and trailing `&` or `;`'
+
+        if '--' in host:
+            return False
+        if port is not None and port == ('80' if scheme == 'http' else '443'):
+            return False
+
+        segments = path + '/'
+        return '//' not in segments and '/./' not in segments and '/../' not in segments and not path.endswith(('&', ';'))
@@ -0,0 +1,72 @@
+import re
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit
+
+#Extensions of resources that are never HTML
+binary_extensions = frozenset(
+    'jpg jpeg png gif bmp webp svg ico tif tiff psd heic avif '
+    'pdf doc docx xls xlsx ppt pptx odt ods odp rtf epub '
+    'zip rar 7z tar gz tgz bz2 xz iso dmg exe msi apk deb rpm jar bin '
+    'mp3 wav ogg flac aac m4a mp4 m4v avi mov mkv webm wmv flv mpg mpeg '
+    'css js json xml rss atom txt csv woff woff2 ttf otf eot swf'.split())
+
+#Calendars, pagination, sorting... Where crawlers tend to get lost
+trap_regex = re.compile(r'(?:^|[/?&_-])(?:calendar|date|year|month|day|page|sort|order|sid|sessionid|phpsessid|jsessionid)\b', re.I)
+
+class UrlScorer:
+    '''
+    Decides which of the `num_queues` front queues of the Frontier an URL goes into, 0 being the most important, or drops it.
+    Refills pick queue `i` in proportion to `weights[i]`.
+
+    URLs of binary resources (by extension) and crawler traps are dropped: paths with more than `max_segments` segments,
+    a segment repeated more than `max_repeats` times, or over `max_params` query parameters. Otherwise, pages start in a queue
+    given by their depth from the seeds, and go down a queue for a query string, for trap-like words (calendars, sessions...),
+    and for every `host_quota` URLs already queued from their host, so no single site takes over the crawl. Counts are kept
+    for the `max_hosts` most recently seen hosts: one not seen in that long starts over, as it was not taking over anything.
+
+    Any object with `num_queues`, `weights` and `score` can replace it, see Frontier.
+    '''
+
+    def __init__(self, num_queues: int=4, weights: list[float]=None, max_segments: int=12, max_repeats: int=2,
+                 max_params: int=6, host_quota: int=5000, max_hosts: int=100000):
+        self.num_queues = num_queues
+        self.weights = weights or [2 ** (num_queues - i - 1) for i in range(num_queues)]
+        self.max_segments = max_segments
+        self.max_repeats = max_repeats
+        self.max_params = max_params
+        self.host_quota = host_quota
+        self.max_hosts = max_hosts
+        self.host_counts = OrderedDict() #URLs queued per host, least recently seen first
+
+    def score(self, url: str, depth: int) -> int | None:
+        '''Gets the front queue of `url`, found `depth` links away from a seed, or None to drop it'''
+
+        parts = urlsplit(url)
+        segments = [s for s in parts.path.split('/') if s]
+
+        last = segments[-1] if segments else ''
+        ext = last.rsplit('.', 1)[1].lower() if '.' in last else ''
+        if ext in binary_extensions:
+            return None
+
+        #Traps
+        if len(segments) > self.max_segments or parts.query.count('&') + 1 > self.max_params:
+            return None
+        if segments and Counter(segments).most_common(1)[0][1] > self.max_repeats:
+            return None
+
+        queue = depth // 2
+        if parts.query:
+            queue += 1
+        if trap_regex.search(parts.path) or trap_regex.search(parts.query):
+            queue += 1
+
+        host = parts.netloc
+        count = self.host_counts.get(host, 0)
+        queue += count // self.host_quota
+        self.host_counts[host] = count + 1
+        self.host_counts.move_to_end(host)
+        if len(self.host_counts) > self.max_hosts:
+            self.host_counts.popitem(last=False)
+
+        return min(queue, self.num_queues - 1)
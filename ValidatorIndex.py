@@ -0,0 +1,89 @@
+import os
+from threading import Lock
+from CdxIndex import CdxIndex
+
+class ValidatorIndex:
+    '''
+    Validators (ETag, Last-Modified and payload digest) of the pages stored by previous runs, read from the CDXJ index
+    Corpus writes into `directory`, so recrawls can send conditional requests. The index stays on disk, see CdxIndex.
+
+    The archived copy of a page is its last response record, and it is only used if no capture since has a different
+    payload digest: later revisits (unchanged pages, exact duplicates) keep it current, and update its validators.
+    '''
+
+    def __init__(self, directory: str, base_name: str='pages'):
+        path = os.path.join(directory, f"{base_name}.cdxj")
+        self.index = CdxIndex(path) if os.path.exists(path) else None #First run, nothing to revalidate
+        self.lock = Lock() #Lookups seek a shared file
+        self.hits = 0 #URLs with validators
+
+    def lookup(self, url: str) -> dict | None:
+        '''
+        Gets the validators of `url` and its archived copy, as `{'etag', 'last_modified', 'digest', 'capture'}`,
+        `capture` being the index entry of its response record. None if it was never stored.
+        '''
+
+        if self.index is None:
+            return None
+
+        with self.lock:
+            captures = self.index.lookup(url)
+        captures = [c for c in captures if c['url'] == url] #SURT keys fold case, scheme and www. together
+        captures.sort(key=self._order)
+
+        responses = [c for c in captures if c['mime'] != 'warc/revisit']
+        if not responses:
+            return None
+
+        capture = responses[-1]
+        later = captures[captures.index(capture):]
+        if any(c['digest'] != capture['digest'] for c in later):
+            return None #Last seen with another payload, stored elsewhere
+
+        entry = {'etag': None, 'last_modified': None, 'digest': capture['digest'], 'capture': capture}
+        for c in later: #Newest validators win
+            entry['etag'] = c.get('etag', entry['etag'])
+            entry['last_modified'] = c.get('last_modified', entry['last_modified'])
+
+        if entry['etag'] is None and entry['last_modified'] is None:
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return entry
+
+    def headers(self, entry: dict) -> dict:
+        '''Conditional request headers for an entry returned by `lookup`'''
+
+        headers = {}
+        if entry['etag'] is not None:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified'] is not None:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, entry: dict) -> tuple[str | None, bytes]:
+        '''Reads the archived copy of an entry returned by `lookup`, as its Content-Type header and payload'''
+
+        record = self.index.load(entry['capture'])
+        return record.http_headers.get_header('Content-Type'), record.content_stream().read()
+
+    def warc_date(self, entry: dict) -> str:
+        '''WARC date of the archived copy, as revisit records refer to it'''
+
+        t = entry['capture']['timestamp']
+        return f"{t[:4]}-{t[4:6]}-{t[6:8]}T{t[8:10]}:{t[10:12]}:{t[12:14]}Z"
+
+    def _order(self, capture: dict) -> tuple:
+        'Sort key of captures, oldest first. Index lines only sort by second, files and offsets grow with every run.'
+
+        num = capture['filename'].rsplit('-', 1)[-1].split('.', 1)[0]
+        return capture['timestamp'], int(num) if num.isdigit() else 0, int(capture['offset'])
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits}
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.close()
@@ -0,0 +1,62 @@
+'''
+Compares crawl throughput of the threaded Crawler against the AsyncCrawler, against a local web (see `local_web.py`).
+
+Usage: python benchmarks/bench_async.py [-n PAGES] [--hosts HOSTS] [--latency SECONDS] [--threads N] [--concurrency N]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Crawler import Crawler
+from AsyncCrawler import AsyncCrawler
+from local_web import LocalWeb
+
+def run_threads(seeds, n, workers, output_dir, **kwargs):
+    c = Crawler(seeds, n, num_workers=workers, output_dir=output_dir, **kwargs)
+    threads = [threading.Thread(target=c.crawl, args=(i,), daemon=True) for i in range(workers)]
+
+    start = time.time()
+    for t in threads:
+        t.start()
+    while not c.done(): #Idle workers can linger on the heap, only time until the target is reached
+        time.sleep(.01)
+    elapsed = time.time() - start
+
+    for t in threads: #Let the corpus close before the output goes away
+        t.join()
+    return c.crawled, elapsed, c
+
+def run_async(seeds, n, concurrency, output_dir, **kwargs):
+    c = AsyncCrawler(seeds, n, num_workers=concurrency, output_dir=output_dir, **kwargs)
+
+    start = time.time()
+    t = threading.Thread(target=c.run, daemon=True)
+    t.start()
+    while not c.done():
+        time.sleep(.01)
+    elapsed = time.time() - start
+
+    t.join()
+    return c.crawled, elapsed, c
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=1000, help='pages crawled per run')
+    parser.add_argument('--hosts', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2, help='server side delay per response')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--concurrency', type=int, default=500)
+    args = parser.parse_args()
+
+    with LocalWeb(hosts=args.hosts, latency=args.latency) as web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for name, func, workers in [('threads', run_threads, args.threads), ('async', run_async, args.concurrency)]:
+            output_dir = os.path.join(out, name)
+            os.mkdir(output_dir)
+            crawled, elapsed, _ = func(seeds, args.n, workers, output_dir)
+            print(f"{name:8} workers={workers:<5} pages={crawled:<6} time={elapsed:7.2f}s pages/sec={crawled / elapsed:8.1f}")
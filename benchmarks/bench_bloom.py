@@ -0,0 +1,53 @@
+'''
+Compares the BloomFilter against its previous SHA-512/hex hashing, reporting ops/sec for insertions and lookups
+and the measured false positive rate.
+
+Usage: python benchmarks/bench_bloom.py [-n ITEMS] [--epsilon RATE]
+'''
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BloomFilter import BloomFilter
+
+class Sha512BloomFilter(BloomFilter):
+    'The previous implementation: SHA-512 hex digest parsed into two ints, separate check and add'
+
+    def check_and_add(self, s):
+        if self.check(s):
+            return True
+        h1, h2 = self._get_h1_h2(s)
+        hsh = h1
+        for _ in range(self.k):
+            self.bitset[hsh // 8] |= (1 << (hsh % 8))
+            hsh = (hsh + h2) % self.size
+        return False
+
+    def _get_h1_h2(self, s):
+        full = hashlib.sha512(s.encode()).hexdigest()
+        return int(full[:64], 16) % self.size, int(full[64:], 16) % self.size
+
+def timed(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200000, help='items inserted')
+    parser.add_argument('--epsilon', type=float, default=.01, help='target false positive rate')
+    args = parser.parse_args()
+
+    inserted = [f"https://www.example{i % 997}.com/path/{i}/page.html?id={i}" for i in range(args.n)]
+    absent = [f"https://www.absent{i % 997}.org/other/{i}.html" for i in range(args.n)]
+
+    for name, cls in [('sha512', Sha512BloomFilter), ('blake2b', BloomFilter)]:
+        bloom = cls(args.n, args.epsilon)
+        adds = timed(bloom.check_and_add, inserted)
+        checks = timed(bloom.check, absent)
+        fp = sum(bloom.check(url) for url in absent) / len(absent)
+        print(f"{name:8} check_and_add ops/sec={adds:10.0f} check ops/sec={checks:10.0f} false positives={fp:.4%}")
@@ -0,0 +1,64 @@
+'''
+Compares the CharsetResolver against the previous `res.text` path, where requests takes the charset from the Content-Type
+header or else runs charset_normalizer over the whole body, reporting per page decode time over saved pages (see
+`corpus.load_pages`). Pages saved as files have no Content-Type, the worst case for `res.text`.
+
+Usage: python benchmarks/bench_charset.py PATH [PATH ...] [--limit N] [--strip-charset]
+'''
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import requests
+from CharsetResolver import CharsetResolver
+from corpus import load_pages
+
+def requests_text(body, content_type):
+    res = requests.Response()
+    res._content = body
+    if content_type:
+        res.headers['Content-Type'] = content_type
+    res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+    return res.text
+
+def resolver_text(body, content_type, resolver=CharsetResolver()):
+    return body.decode(resolver.resolve(content_type, body), 'replace')
+
+def source(body, content_type, resolver=CharsetResolver()):
+    'Which step of the resolver found the encoding'
+
+    for name, found in [('header', lambda: resolver.from_header(content_type)), ('bom', lambda: resolver.from_bom(body)),
+                        ('meta', lambda: resolver.from_meta(body)), ('detect', lambda: resolver.detect(body))]:
+        if found():
+            return name
+    return 'default'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of pages loaded')
+    parser.add_argument('--strip-charset', action='store_true', help='drop charset from Content-Type headers, as many servers do')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths, args.limit)
+    if not pages:
+        sys.exit("error: no pages found")
+    if args.strip_charset:
+        pages = [(url, body, content_type.split(';', 1)[0] if content_type else None) for url, body, content_type in pages]
+
+    size = sum(len(body) for _, body, _ in pages)
+    print(f"{len(pages)} pages, {size / 2**20:.1f} MB")
+    print('resolved by: ' + ', '.join(f"{k}={v}" for k, v in Counter(source(b, ct) for _, b, ct in pages).most_common()))
+
+    results = {}
+    for name, func in [('res.text', requests_text), ('resolver', resolver_text)]:
+        start = time.perf_counter()
+        results[name] = [func(body, content_type) for _, body, content_type in pages]
+        elapsed = time.perf_counter() - start
+        print(f"{name:10} time={elapsed:7.2f}s ms/page={1000 * elapsed / len(pages):8.3f}")
+
+    differ = sum(a != b for a, b in zip(results['res.text'], results['resolver']))
+    print(f"pages decoded differently: {differ}")
@@ -0,0 +1,60 @@
+'''
+Compares fixed worker counts against the ConcurrencyController on two local webs: many ready hosts, where more workers
+pay off, and a few slow hosts, where politeness caps the crawl and extra workers only wait. Reports throughput and the
+mean and peak worker limit the controller used.
+
+Usage: python benchmarks/bench_concurrency.py [-n PAGES] [--min-workers N] [--max-workers N] [--adapt-interval SECONDS]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Crawler import Crawler
+from local_web import LocalWeb
+
+def run(seeds, n, workers, output_dir, **kwargs):
+    'Crawls like `bench_async.run_threads`, sampling the worker limit every 0.1s'
+
+    c = Crawler(seeds, n, num_workers=workers, output_dir=output_dir, **kwargs)
+    threads = [threading.Thread(target=c.crawl, args=(i,), daemon=True) for i in range(workers)]
+
+    limits = []
+    start = time.time()
+    for t in threads:
+        t.start()
+    while not c.done():
+        time.sleep(.1)
+        limits.append(c.controller.limit if c.controller is not None else workers)
+    elapsed = time.time() - start
+
+    for t in threads:
+        t.join()
+    return c.crawled, elapsed, limits
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=1500, help='pages crawled per run on many hosts, a tenth on few')
+    parser.add_argument('--min-workers', type=int, default=2)
+    parser.add_argument('--max-workers', type=int, default=48)
+    parser.add_argument('--adapt-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    webs = [('many hosts', dict(hosts=60, latency=0.05), args.n), ('few slow', dict(hosts=3, latency=0.3), args.n // 10)]
+    runs = [('fixed 12', 12, {}), (f"fixed {args.max_workers}", args.max_workers, {}),
+            ('adaptive', args.max_workers, dict(min_workers=args.min_workers, adapt_interval=args.adapt_interval))]
+
+    for web_name, config, n in webs:
+        with LocalWeb(**config) as web, tempfile.TemporaryDirectory() as out:
+            seeds = [f"{web.url(h)}/p/0.html" for h in range(config['hosts'])]
+
+            for name, workers, kwargs in runs:
+                output_dir = os.path.join(out, name.replace(' ', '-'))
+                os.mkdir(output_dir)
+
+                crawled, elapsed, limits = run(seeds, n, workers, output_dir, **kwargs)
+                print(f"{web_name:10} {name:9} pages={crawled:<6} time={elapsed:6.2f}s pages/sec={crawled / elapsed:7.1f} "
+                      f"mean workers={sum(limits) / max(len(limits), 1):5.1f} peak workers={max(limits, default=0)}")
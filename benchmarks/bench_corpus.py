@@ -0,0 +1,78 @@
+'''
+Compares the Corpus writer pipeline against the previous Corpus, which built and compressed every record while holding
+one global lock. Several threads write synthetic HTML responses, reporting records/sec and MB/sec.
+
+Usage: python benchmarks/bench_corpus.py [-n RECORDS] [--threads N] [--size BYTES] [--processes N]
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from warcio.warcwriter import WARCWriter
+from warcio.statusandheaders import StatusAndHeaders
+from Corpus import Corpus
+
+class LockedCorpus:
+    'The previous Corpus: one lock held while building, compressing and writing each record'
+
+    def __init__(self, target_directory, pages_ratio=1000):
+        self.lock = threading.Lock()
+        self.cur_file = open(f"{target_directory}/locked-1.warc.gz", 'wb')
+        self.writer = WARCWriter(self.cur_file, gzip=True)
+
+    def write(self, url, resp):
+        with self.lock:
+            http_headers = StatusAndHeaders(f"{resp.status_code} {resp.reason}", resp.raw.headers.items(),
+                                            protocol=resp.raw.version_string)
+            record = self.writer.create_warc_record(url, 'response', payload=BytesIO(resp.content), http_headers=http_headers)
+            self.writer.write_record(record)
+
+    def close(self):
+        self.cur_file.close()
+
+def fake_response(size, rand):
+    words = [''.join(rand.choices('abcdefghijklmnopqrstuvwxyz', k=rand.randint(2, 10))) for _ in range(2000)]
+    body = ('<html><body>' + ' '.join(rand.choices(words, k=size // 6)) + '</body></html>').encode()[:size]
+    headers = {'Content-Type': 'text/html; charset=utf-8', 'Content-Length': str(len(body))}
+    return SimpleNamespace(status_code=200, reason='OK', content=body,
+                           raw=SimpleNamespace(headers=headers, version_string='HTTP/1.1'))
+
+def run(corpus, responses, threads):
+    def work(i):
+        for j in range(i, len(responses), threads):
+            corpus.write(f"http://example.com/{j}", responses[j])
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    corpus.close()
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help='records written')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--size', type=int, default=50000, help='bytes per response body')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='process pool size for the pooled run')
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    templates = [fake_response(args.size, rand) for _ in range(20)]
+    responses = [templates[i % len(templates)] for i in range(args.n)]
+    total = sum(len(r.content) for r in responses) / 2**20
+
+    with tempfile.TemporaryDirectory() as out:
+        for name, corpus in [('locked', LockedCorpus(out)), ('pipeline', Corpus(out)),
+                             (f'pool({args.processes})', Corpus(out, base_name='pool', processes=args.processes))]:
+            elapsed = run(corpus, responses, args.threads)
+            print(f"{name:12} records/sec={args.n / elapsed:8.1f} MB/sec={total / elapsed:7.1f}")
@@ -0,0 +1,60 @@
+'''
+Measures the DuplicateDetector against a local web where a `--mirrors` fraction of links point to exact copies of pages
+and to variants of them, comparing a crawl storing and following every page (as before) with a deduplicating one.
+Reports HTTP requests sent, pages stored, how many of them are distinct, revisit records, WARC bytes written and the
+detector's own counts.
+
+Usage: python benchmarks/bench_dedup.py [-n PAGES] [--hosts HOSTS] [--pages-per-host N] [--latency SECONDS] [--mirrors FRACTION] [--words N] [--threads N]
+'''
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_async import run_threads
+from local_web import LocalWeb
+
+page_regex = re.compile(r'//([^/]+)/(?:p|m|v/\d+)/(\d+)\.html')
+
+def read_index(output_dir):
+    'Gets the index entries written by the Corpus'
+
+    with open(os.path.join(output_dir, 'pages.cdxj'), encoding='utf-8') as f:
+        return [json.loads(line.split(' ', 2)[2]) for line in f]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=100000, help='pages stored per run, by default until the web is exhausted')
+    parser.add_argument('--hosts', type=int, default=10)
+    parser.add_argument('--pages-per-host', type=int, default=50, help='small enough for copies to be found')
+    parser.add_argument('--latency', type=float, default=0.02, help='server side delay per response')
+    parser.add_argument('--mirrors', type=float, default=0.3, help='fraction of links to copies of pages')
+    parser.add_argument('--words', type=int, default=300, help='words of text per page')
+    parser.add_argument('--threads', type=int, default=12)
+    args = parser.parse_args()
+
+    web = LocalWeb(hosts=args.hosts, pages_per_host=args.pages_per_host, latency=args.latency, words=args.words,
+                   mirrors=args.mirrors)
+    with web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for name, dedup in [('no dedup', False), ('dedup', True)]:
+            output_dir = os.path.join(out, name.replace(' ', '-'))
+            os.mkdir(output_dir)
+
+            crawled, elapsed, c = run_threads(seeds, args.n, args.threads, output_dir, dedup=dedup, fetch_mode='stream')
+            entries = read_index(output_dir)
+            stored = [e for e in entries if e['mime'] != 'warc/revisit']
+            distinct = len({page_regex.search(e['url']).groups() for e in stored})
+            size = sum(os.path.getsize(p) for p in glob.glob(os.path.join(output_dir, '*.warc.gz')))
+            requests = c.pool.stats()['requests']
+
+            print(f"{name:8} requests={requests:<6} stored={len(stored):<6} distinct={distinct:<6} "
+                  f"revisits={len(entries) - len(stored):<5} warc={size / 1e6:6.2f}MB requests/distinct={requests / distinct:5.2f} "
+                  f"time={elapsed:6.2f}s")
+            if dedup:
+                print(f"{'':8} {c.duplicates.stats()}")
@@ -0,0 +1,64 @@
+'''
+Measures the DnsCache against a local web whose host names are resolved by a stub resolver taking `--dns-latency` seconds
+per lookup, comparing a cache that keeps nothing (every connection resolves, as before) with the default one. Reports
+pages per second, lookups reaching the resolver and the cache hit rate.
+
+Usage: python benchmarks/bench_dns.py [-n PAGES] [--hosts HOSTS] [--latency SECONDS] [--dns-latency SECONDS] [--threads N] [--async]
+'''
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from DnsCache import DnsCache
+from bench_async import run_threads, run_async
+from local_web import LocalWeb
+
+class StubResolver:
+    '''`socket.getaddrinfo` stand-in resolving `*.localweb.test` to 127.0.0.1 after `latency` seconds, counting lookups'''
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lookups = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        with self.lock:
+            self.lookups += 1
+        time.sleep(self.latency)
+
+        if not host.endswith('.localweb.test'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('127.0.0.1', port or 0))]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=500, help='pages crawled per run')
+    parser.add_argument('--hosts', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.02, help='server side delay per response')
+    parser.add_argument('--dns-latency', type=float, default=0.05, help='stub resolver delay per lookup')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--async', dest='use_async', action='store_true', help='crawl with the AsyncCrawler (500 coroutines)')
+    args = parser.parse_args()
+
+    with LocalWeb(hosts=args.hosts, latency=args.latency, host_names=True) as web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for name, ttl in [('no cache', 0), ('cache', 300)]:
+            output_dir = os.path.join(out, name.replace(' ', '-'))
+            os.mkdir(output_dir)
+
+            resolver = StubResolver(args.dns_latency)
+            dns = DnsCache(ttl=ttl, negative_ttl=ttl, resolver=resolver)
+            if args.use_async:
+                crawled, elapsed, _ = run_async(seeds, args.n, 500, output_dir, dns=dns)
+            else:
+                crawled, elapsed, _ = run_threads(seeds, args.n, args.threads, output_dir, dns=dns)
+
+            stats = dns.stats()
+            print(f"{name:9} pages={crawled:<6} time={elapsed:7.2f}s pages/sec={crawled / elapsed:8.1f} "
+                  f"lookups={resolver.lookups:<6} hit rate={stats['hit_rate']:.1%}")
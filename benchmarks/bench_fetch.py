@@ -0,0 +1,34 @@
+'''
+Compares the `head` and `stream` fetch modes of the Crawler against a local web with few hosts, where per-host politeness
+is the bottleneck, reporting pages per second per host, and connections opened and reused. Each mode runs with one worker
+per host, then with `--max-per-host` workers fetching each host at once.
+
+Usage: python benchmarks/bench_fetch.py [-n PAGES] [--hosts HOSTS] [--latency SECONDS] [--threads N] [--max-per-host N]
+'''
+import argparse
+import os
+import tempfile
+
+from bench_async import run_threads
+from local_web import LocalWeb
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200, help='pages crawled per run')
+    parser.add_argument('--hosts', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05, help='server side delay per response')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--max-per-host', type=int, default=4)
+    args = parser.parse_args()
+
+    with LocalWeb(hosts=args.hosts, latency=args.latency) as web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for mode in ['head', 'stream']:
+            for per_host in sorted({1, args.max_per_host}):
+                output_dir = os.path.join(out, f"{mode}-{per_host}")
+                os.mkdir(output_dir)
+                crawled, elapsed, c = run_threads(seeds, args.n, args.threads, output_dir, fetch_mode=mode, max_per_host=per_host)
+                stats = c.pool.stats()
+                print(f"{mode:8} per host={per_host:<3} pages={crawled:<6} time={elapsed:7.2f}s "
+                      f"pages/sec/host={crawled / elapsed / args.hosts:6.2f} connections={stats['created']:<5} reused={stats['reused']}")
@@ -0,0 +1,104 @@
+'''
+Measures the memory per queued URL of the frontier's queues on a large synthetic frontier, against the plain
+representation they replaced: front queues as a deque of "depth url" strings against SpillQueue's prefix compressed
+BlockQueue, and back queues as deques of (depth, url) tuples against BackQueue paths. Also times filling and draining them.
+
+Usage: python benchmarks/bench_frontier_memory.py [-n URLS] [--hosts HOSTS] [--links N]
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BackQueue import BackQueue
+from SpillQueue import SpillQueue
+
+def urls(n, hosts, links, seed=0):
+    'Yields `(depth, domain, url)`, as outlinks come: `links` per page, mostly to the host of the page'
+
+    rand = random.Random(seed)
+    for i in range(n):
+        if i % links == 0:
+            host = rand.randrange(hosts)
+            depth = rand.randrange(1, 6)
+        h = host if rand.random() < .8 else rand.randrange(hosts)
+        domain = f"https://www.site-{h}.example.com"
+        path = f"/{rand.choice(['news', 'blog', 'products', 'wiki'])}/{rand.randrange(1000)}/article-{rand.randrange(10**6)}.html"
+        if rand.random() < .3:
+            path += f"?page={rand.randrange(50)}&sort=date"
+        yield depth, domain, domain + path
+
+def measure(fill, drain):
+    'Bytes retained by what `fill` builds, and seconds to fill (generating URLs included) and drain it, untraced'
+
+    start = time.perf_counter()
+    queues = fill()
+    fill_time = time.perf_counter() - start
+    start = time.perf_counter()
+    drain(queues)
+    drain_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    queues = fill()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, fill_time, drain_time
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=1000000, help='URLs queued')
+    parser.add_argument('--hosts', type=int, default=10000)
+    parser.add_argument('--links', type=int, default=20, help='outlinks per page, queued together')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as spill:
+        def deque_front():
+            q = deque()
+            for depth, _, url in urls(args.n, args.hosts, args.links):
+                q.append(f"{depth} {url}")
+            return q
+
+        def spill_front():
+            q = SpillQueue(spill, memory_items=args.n) #Never spilling
+            for depth, _, url in urls(args.n, args.hosts, args.links):
+                q.put(f"{depth} {url}")
+            return q
+
+        def drain_front(q):
+            get = q.popleft if isinstance(q, deque) else q.get
+            for _ in range(args.n):
+                get()
+
+        def deque_back():
+            back = {}
+            for depth, domain, url in urls(args.n, args.hosts, args.links):
+                back.setdefault(domain, deque()).append((depth, url))
+            return back
+
+        def compact_back():
+            back = {}
+            for depth, domain, url in urls(args.n, args.hosts, args.links):
+                q = back.get(domain)
+                if q is None:
+                    q = back[domain] = BackQueue()
+                q.append(depth, url[len(domain):])
+            return back
+
+        def drain_back(back):
+            for domain, q in back.items():
+                while q:
+                    depth, path = q.popleft()
+                    url = domain + path if isinstance(q, BackQueue) else path
+
+        runs = [('front', 'deque of str', deque_front, drain_front), ('front', 'SpillQueue', spill_front, drain_front),
+                ('back', 'deque of tuples', deque_back, drain_back), ('back', 'BackQueue', compact_back, drain_back)]
+        for kind, name, fill, drain in runs:
+            size, fill_time, drain_time = measure(fill, drain)
+            print(f"{kind:5} {name:15} bytes/url={size / args.n:6.1f} total={size / 2**20:7.1f}MB "
+                  f"fill={fill_time / args.n * 1e6:5.2f}us/url drain={drain_time / args.n * 1e6:5.2f}us/url")
@@ -0,0 +1,45 @@
+'''
+Compares the LinkExtractor against the previous BeautifulSoup path (`soup.find_all('a')`) over saved pages,
+reporting links found and pages per second. Pages can be `.warc.gz` files from a crawl or directories of HTML files.
+
+Usage: python benchmarks/bench_links.py PATH [PATH ...] [--limit N]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bs4 import BeautifulSoup
+from LinkExtractor import LinkExtractor
+from corpus import load_pages
+
+def soup_links(body):
+    soup = BeautifulSoup(body.decode('utf-8', 'replace'), 'html.parser')
+    return [tag.get('href') for tag in soup.find_all('a') if tag.get('href') is not None]
+
+def extractor_links(body, extractor=LinkExtractor()):
+    return extractor.extract(body, 'utf-8')[1]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of pages loaded')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths, args.limit)
+    if not pages:
+        sys.exit("error: no pages found")
+    size = sum(len(body) for _, body, _ in pages)
+    print(f"{len(pages)} pages, {size / 2**20:.1f} MB")
+
+    results = {}
+    for name, func in [('soup', soup_links), ('extractor', extractor_links)]:
+        start = time.perf_counter()
+        results[name] = [func(body) for _, body, _ in pages]
+        elapsed = time.perf_counter() - start
+        links = sum(len(l) for l in results[name])
+        print(f"{name:10} links={links:<8} time={elapsed:7.2f}s pages/sec={len(pages) / elapsed:8.1f}")
+
+    differ = sum(a != b for a, b in zip(results['soup'], results['extractor']))
+    print(f"pages with different links: {differ}")
@@ -0,0 +1,69 @@
+'''
+Measures the cost of Metrics on the hot path: each recording primitive, and a TimedLock against a plain Lock, then a crawl
+of a local web without and with the SamplingProfiler. Prints the last metrics snapshot of the profiled crawl.
+
+Usage: python benchmarks/bench_metrics.py [-n PAGES] [--hosts HOSTS] [--latency SECONDS] [--threads N] [--profile-interval SECONDS]
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Metrics import Metrics
+from bench_async import run_threads
+from local_web import LocalWeb
+
+def per_call(func, n=200000):
+    'Nanoseconds per call of `func`'
+
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1e9
+
+def locked(lock):
+    def func():
+        with lock:
+            pass
+    return func
+
+def timed(metrics):
+    def func():
+        with metrics.timer('bench_seconds'):
+            pass
+    return func
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=500, help='pages crawled per run')
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help='server side delay per response')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--profile-interval', type=float, default=0.005)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    for name, func in [('count', lambda: metrics.count('bench_total')),
+                       ('observe', lambda: metrics.observe('bench_seconds', .001)),
+                       ('timer', timed(metrics)),
+                       ('Lock', locked(threading.Lock())),
+                       ('TimedLock', locked(metrics.lock('bench')))]:
+        print(f"{name:10} {per_call(func):7.0f} ns/call")
+
+    with LocalWeb(hosts=args.hosts, latency=args.latency, words=100) as web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for name, interval in [('no profiler', 0), ('profiler', args.profile_interval)]:
+            output_dir = os.path.join(out, name.replace(' ', '-'))
+            os.mkdir(output_dir)
+
+            crawled, elapsed, c = run_threads(seeds, args.n, args.threads, output_dir, metrics_interval=1,
+                                              profile_interval=interval)
+            print(f"{name:11} pages={crawled:<6} time={elapsed:7.2f}s pages/sec={crawled / elapsed:8.1f}")
+
+        with open(os.path.join(output_dir, 'metrics.json')) as f:
+            print(json.dumps(json.load(f), indent=1))
@@ -0,0 +1,115 @@
+'''
+Compares the UrlNormalizer against the previous `Crawler.normalize_url` (urljoin, Django regex and `url_normalize` on
+every link), checking both give exactly the same URL for every link, and reporting links per second.
+
+Links come from a built-in corpus of edge cases, plus the pages at PATH if given (see `corpus.load_pages`). Pages saved
+as files get an `https://docs.example.com/` URL. Every page is normalized `--passes` times, as the same nav/footer links
+show up across a site.
+
+Usage: python benchmarks/bench_normalize.py [PATH ...] [--limit N] [--passes N]
+'''
+import argparse
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from url_normalize import url_normalize
+from LinkExtractor import LinkExtractor
+from UrlNormalizer import UrlNormalizer, url_regex
+from corpus import load_pages
+
+#(base, href) pairs for the equivalence check
+EDGE_CASES = [(base, href) for base in [
+    'http://example.com/', 'https://example.com/a/b/c.html', 'http://example.com/a/b/?q=1#top', 'https://example.com',
+    'http://Example.COM:80/dir/', 'https://www.google.com/search?q=x', 'http://localhost:8000/a/b', 'http://127.0.0.1/x/',
+    'http://bücher.de/p/', 'ftp://example.com/', 'http://example.com/a;p?q', 'not a url',
+] for href in [
+    'http://example.com', 'http://example.com/', 'HTTP://EXAMPLE.COM/A', 'https://example.com:443/x', 'http://example.com:80/x',
+    'http://example.com:8080/x', 'http://example.com:0/x', 'http://example.com:99999/x', 'http://example.com:080/x',
+    'http://user:pw@example.com/x', 'http://@example.com/x', 'http://example.com./x', 'http://.example.com/x',
+    'http://exa_mple.com/x', 'http://a..b.com/', 'http://xn--bcher-kva.de/', 'http://ab--cd.com/', 'http://-a.com/',
+    'http://a-.com/', 'http://intranet/x', 'http://example.museum/x', 'http://example.c0m/x', 'http://example.toolongtld/',
+    'http://bücher.de/x', 'http://example.com/ü', 'http://example.com/%7Ex', 'http://example.com/%7ex',
+    'http://example.com/%41', 'http://example.com/a%2Fb', 'http://example.com/a b', 'http://example.com/a\tb',
+    'http://example.com/a/./b', 'http://example.com/a/../b', 'http://example.com/a/..', 'http://example.com/a/.',
+    'http://example.com//a', 'http://example.com/a//b', 'http://example.com/a/', 'http://example.com/a&', 'http://example.com/a;',
+    'http://example.com/a;b', "http://example.com/a!$&'()*+,;=:@b", 'http://example.com/[a]', 'http://example.com/a{b}',
+    'http://example.com/a|b', 'http://example.com/a"b', 'http://example.com/a<b>', 'http://example.com/a^b',
+    'http://example.com/a`b', 'http://example.com/a\\b', 'http://example.com/~user/', 'http://example.com/?',
+    'http://example.com/a?', 'http://example.com/a?b=1', 'http://example.com/a?b=1&', 'http://example.com/a?&&b',
+    'http://example.com/#!/page', 'http://example.com/a#frag', 'http://example.com/a#', 'https://www.google.com/search?q=a+b&x=1',
+    'https://www.youtube.com/watch?v=abc&t=1', 'http://www.bing.com/search?q=x', 'http://[::1]/x', 'http://1.2.3.4/',
+    'http://1.2.3.4:8080/a', 'http://example.com/a?b=%zz', '//example.com/x', '//EXAMPLE.com', '///x', '/', '/a/b',
+    '/a/../b', '/a?b=1', '/a#b', 'a', 'a/b.html', './a', '../a', '../../../../a', '.', '..', 'a/./b/../c', '?q=1', '?',
+    ';p', ' a', ' /a', ' ?q', '\ta', 'a b', '%20a', 'mailto:x@example.com', 'javascript:void(0)', 'ftp://example.com/x',
+    'data:text/html,x', 'http:a', 'http:/a', 'http:///a', 'https:a', 'tel:123', 'http://', 'http://example.com:/x',
+    'http://example.com:abc/x', 'http://[::1', 'http://exa mple.com/', 'ü', '_a', '~a', '-a', '.hidden', '\x00a',
+]]
+
+def reference(original_url: str, new_url: str) -> str:
+    'The previous `Crawler.normalize_url`'
+
+    try:
+        new_url = urljoin(original_url, new_url)
+    except:
+        return ''
+
+    if re.match(url_regex, new_url) == None:
+        return ''
+
+    try:
+        normal = url_normalize(new_url, filter_params=True)
+        normal = normal.split('#', 1)[0]
+    except:
+        return ''
+
+    return normal
+
+def page_links(paths: list[str], limit: int) -> list[tuple[str, str]]:
+    extractor = LinkExtractor()
+    pairs = []
+    for url, body, _ in load_pages(paths, limit):
+        if url.startswith('file://'):
+            url = 'https://docs.example.com/' + os.path.relpath(url[len('file://'):], os.path.commonpath(paths)).replace(os.sep, '/')
+
+        base, links = extractor.extract(body, 'utf-8')
+        if base:
+            try:
+                url = urljoin(url, base)
+            except:
+                pass
+        pairs.extend((url, link) for link in links if link != '' and link[0] != '#')
+    return pairs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of pages loaded')
+    parser.add_argument('--passes', type=int, default=3, help='times every link is normalized')
+    args = parser.parse_args()
+
+    pairs = EDGE_CASES + (page_links([os.path.abspath(p) for p in args.paths], args.limit) if args.paths else [])
+    print(f"{len(pairs)} links, {len(EDGE_CASES)} edge cases")
+
+    #Equivalence
+    normalizer = UrlNormalizer()
+    mismatches = [(base, href, reference(base, href), normalizer.normalize(base, href)) for base, href in pairs
+                  if reference(base, href) != normalizer.normalize(base, href)]
+    for base, href, expected, got in mismatches[:20]:
+        print(f"mismatch: base={base!r} href={href!r} expected={expected!r} got={got!r}")
+    print(f"mismatches: {len(mismatches)}")
+
+    #Speed, with a cold cache
+    for name, func in [('reference', reference), ('normalizer', UrlNormalizer().normalize)]:
+        start = time.perf_counter()
+        for _ in range(args.passes):
+            for base, href in pairs:
+                func(base, href)
+        elapsed = time.perf_counter() - start
+        print(f"{name:10} time={elapsed:7.2f}s links/sec={len(pairs) * args.passes / elapsed:10.0f}")
+
+    if mismatches:
+        sys.exit("error: normalizer differs from reference")
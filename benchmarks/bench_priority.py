@@ -0,0 +1,47 @@
+'''
+Measures the HTML yield of the front queue scorer against a local web where a `--junk` fraction of links point to images,
+PDFs, archives and crawler traps, comparing a single FIFO front queue (every URL accepted, as before) with the UrlScorer.
+Reports HTML pages stored per HTTP request sent, and pages per second.
+
+Usage: python benchmarks/bench_priority.py [-n PAGES] [--hosts HOSTS] [--latency SECONDS] [--junk FRACTION] [--threads N] [--mode MODE]
+'''
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from UrlScorer import UrlScorer
+from bench_async import run_threads
+from local_web import LocalWeb
+
+class FifoScorer:
+    '''Single front queue taking every URL, the frontier without prioritization'''
+
+    num_queues = 1
+    weights = [1]
+
+    def score(self, url: str, depth: int) -> int:
+        return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=500, help='pages stored per run')
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help='server side delay per response')
+    parser.add_argument('--junk', type=float, default=0.4, help='fraction of links to non-HTML resources and traps')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--mode', choices=['head', 'stream'], default='stream', help='fetch mode of the crawler')
+    args = parser.parse_args()
+
+    with LocalWeb(hosts=args.hosts, latency=args.latency, junk=args.junk) as web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for name, scorer in [('fifo', FifoScorer()), ('scorer', UrlScorer())]:
+            output_dir = os.path.join(out, name)
+            os.mkdir(output_dir)
+
+            crawled, elapsed, c = run_threads(seeds, args.n, args.threads, output_dir, scorer=scorer, fetch_mode=args.mode)
+            requests = c.pool.stats()['requests']
+            print(f"{name:7} pages={crawled:<6} requests={requests:<6} html/request={crawled / requests:6.3f} "
+                  f"time={elapsed:7.2f}s pages/sec={crawled / elapsed:8.1f}")
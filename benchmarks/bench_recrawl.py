@@ -0,0 +1,60 @@
+'''
+Measures incremental recrawls against a local web answering conditional requests. A first crawl stores the whole web,
+then a `--changes` fraction of its pages change, and it is crawled again both from scratch and incrementally, on top
+of the first crawl. Reports pages crawled, HTTP requests, body bytes served, 304 revisits and time.
+
+Usage: python benchmarks/bench_recrawl.py [--hosts HOSTS] [--pages-per-host N] [--latency SECONDS] [--changes FRACTION] [--threads N] [--mode MODE]
+'''
+import argparse
+import glob
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Corpus import last_file
+from bench_async import run_threads
+from local_web import LocalWeb
+
+def not_modified(output_dir, after):
+    'Counts the 304 revisits in the indexes of the WARC files numbered after `after`'
+
+    count = 0
+    for path in glob.glob(os.path.join(output_dir, 'pages-*.cdxj')):
+        if int(path.rsplit('-', 1)[1][:-5]) > after:
+            with open(path, encoding='utf-8') as f:
+                count += sum('"status":"304"' in line for line in f)
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hosts', type=int, default=10)
+    parser.add_argument('--pages-per-host', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.01, help='server side delay per response')
+    parser.add_argument('--changes', type=float, default=0.1, help='fraction of pages changed between crawls')
+    parser.add_argument('--words', type=int, default=1000, help='words of text per page')
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--mode', choices=['head', 'stream'], default='stream', help='fetch mode of the crawler')
+    args = parser.parse_args()
+
+    web = LocalWeb(hosts=args.hosts, pages_per_host=args.pages_per_host, latency=args.latency, words=args.words,
+                   changes=args.changes)
+    with web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+        first, scratch = os.path.join(out, 'first'), os.path.join(out, 'scratch')
+        os.mkdir(first)
+        os.mkdir(scratch)
+
+        runs = [('first', first, False), ('scratch', scratch, False), ('incremental', first, True)]
+        for name, output_dir, incremental in runs:
+            if name != 'first':
+                web.revision = 1
+
+            sent, files = web.bytes_sent, last_file(output_dir)
+            crawled, elapsed, c = run_threads(seeds, args.hosts * args.pages_per_host, args.threads, output_dir, fetch_mode=args.mode,
+                                              incremental=incremental)
+            requests = c.pool.stats()['requests']
+            revisits = not_modified(output_dir, files)
+
+            print(f"{name:11} pages={crawled:<6} requests={requests:<6} body bytes={web.bytes_sent - sent:<10} "
+                  f"304 revisits={revisits:<6} time={elapsed:6.2f}s")
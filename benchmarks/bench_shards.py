@@ -0,0 +1,37 @@
+'''
+Measures how sharded crawling scales with the number of processes, against a local web with many hosts and low latency, so
+the crawler's CPU is the bottleneck. Scaling stops at the number of cores, including the ones serving the local web.
+
+Usage: python benchmarks/bench_shards.py [-n PAGES] [--hosts HOSTS] [--latency SECONDS] [--shards N [N ...]] [--async]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Shard import run_shards
+from local_web import LocalWeb
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help='pages crawled per run')
+    parser.add_argument('--hosts', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.01, help='server side delay per response')
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--workers', type=int, default=12, help='threads (or coroutines) per shard')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='run async crawlers in each shard')
+    args = parser.parse_args()
+
+    with LocalWeb(hosts=args.hosts, latency=args.latency) as web, tempfile.TemporaryDirectory() as out:
+        seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+
+        for shards in args.shards:
+            output_dir = os.path.join(out, str(shards))
+            os.mkdir(output_dir)
+
+            start = time.time() #Includes starting the processes
+            crawled = run_shards(seeds, args.n, shards, args.use_async, args.workers, output_dir=output_dir)
+            elapsed = time.time() - start
+            print(f"shards={shards:<3} pages={crawled:<6} time={elapsed:7.2f}s pages/sec={crawled / elapsed:8.1f}")
@@ -0,0 +1,169 @@
+'''
+End to end benchmark suite: crawls synthetic webs (see `local_web.py`) with the threaded Crawler, sweeping web configs
+and worker counts. Each run is a separate process, so CPU time and peak RSS are the crawler's own, the web being served
+by this one. Reports pages/sec, CPU time per page, peak RSS, HTTP requests, robots.txt violations and how the frontier
+grew (peak and mean of its gauges, sampled every `--sample-interval` seconds).
+
+Results are written as JSON with `--output`. With `--baseline`, they are compared against a previous output, and the
+suite fails if a run got slower or more expensive by more than `--tolerance`.
+
+Usage: python benchmarks/bench_suite.py [--configs NAME,...] [--workers N,...] [-n PAGES] [--hosts HOSTS] [--pages-per-host N]
+                                        [--fetch-mode MODE] [--repeat N] [--output FILE] [--baseline FILE] [--tolerance FRACTION]
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Crawler import Crawler
+from local_web import LocalWeb
+
+#Web configs, as LocalWeb arguments on top of the hosts, pages per host and seed given on the command line
+configs = {
+    'baseline': dict(latency=0.02, words=200),
+    'jitter': dict(latency=0.01, jitter=0.02, jitter_distribution='exponential', words=200),
+    'robots': dict(latency=0.02, words=200, robots=True, crawl_delay=0.2, disallowed=0.1),
+    'messy': dict(latency=0.02, words=200, junk=0.2, redirects=0.1, throttled=0.01),
+    'heavy': dict(latency=0.02, words=2000, size_distribution='pareto', out_degree=30),
+}
+
+#Frontier gauges sampled during a run
+gauges = ('front_queue_urls', 'back_queue_urls', 'heap_entries', 'active_back_queues')
+
+def crawl(seeds, n, workers, output_dir, sample_interval, results, **kwargs):
+    'Runs one crawl in this process, putting its measures into `results`'
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    c = Crawler(seeds, n, num_workers=workers, output_dir=output_dir, **kwargs)
+    threads = [threading.Thread(target=c.crawl, args=(i,), daemon=True) for i in range(workers)]
+
+    samples = {name: [] for name in gauges}
+    usage, start = resource.getrusage(resource.RUSAGE_SELF), time.time()
+    for t in threads:
+        t.start()
+    while not c.done(): #Same end as bench_async, the target being reached
+        time.sleep(sample_interval)
+        values = c.metrics.snapshot()['gauges']
+        for name in gauges:
+            samples[name].append(values.get(name, 0))
+    elapsed = time.time() - start
+
+    for t in threads:
+        t.join()
+    end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = end.ru_utime + end.ru_stime - usage.ru_utime - usage.ru_stime
+
+    snapshot = c.metrics.snapshot()
+    results.put({
+        'pages': c.crawled,
+        'elapsed': elapsed,
+        'pages_per_sec': c.crawled / elapsed,
+        'cpu_per_page_ms': cpu / max(c.crawled, 1) * 1000,
+        'cpu_utilization': cpu / elapsed,
+        'base_rss_mb': base_rss / 1024,
+        'peak_rss_mb': end.ru_maxrss / 1024, #Kilobytes on Linux
+        'crawler_requests': c.pool.stats()['requests'],
+        'frontier': {name: {'peak': max(values, default=0), 'mean': statistics.fmean(values) if values else 0}
+                     for name, values in samples.items()},
+        'fetch_seconds': {name: h for name, h in snapshot['histograms'].items() if name.startswith('fetch_seconds')},
+        'counters': snapshot['counters'],
+    })
+
+def run(web, seeds, n, workers, sample_interval, **kwargs) -> dict:
+    'Crawls `web` in a child process, adding what the web saw to its measures'
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    requests, violations = web.requests, web.violations
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        p = ctx.Process(target=crawl, args=(seeds, n, workers, output_dir, sample_interval, results), kwargs=kwargs)
+        p.start()
+        result = results.get()
+        p.join()
+
+    result['requests'] = web.requests - requests
+    result['robots_violations'] = web.violations - violations
+    return result
+
+def compare(runs: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    '''Regressions of `runs` against a previous output, comparing medians of each config and worker count. Configs changed since are skipped.'''
+
+    def medians(runs):
+        groups = {}
+        for r in runs:
+            groups.setdefault((r['config'], r['workers']), []).append(r)
+        return {key: {m: statistics.median(r[m] for r in group) for m in ('pages_per_sec', 'cpu_per_page_ms', 'peak_rss_mb')}
+                for key, group in groups.items()}
+
+    old, new = medians(baseline['runs']), medians(runs)
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        if baseline['configs'].get(key[0]) != configs[key[0]]: #Another web, not comparable
+            continue
+        for metric, higher_is_better in (('pages_per_sec', True), ('cpu_per_page_ms', False), ('peak_rss_mb', False)):
+            before, after = old[key][metric], new[key][metric]
+            change = (after - before) / before if before else 0
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{key[0]} workers={key[1]} {metric}: {before:.2f} -> {after:.2f} ({change:+.0%})")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--configs', default='baseline,jitter,robots,messy,heavy',
+                        help=f"comma separated web configs, among {', '.join(configs)}")
+    parser.add_argument('--workers', default='4,12,24', help='comma separated worker counts')
+    parser.add_argument('-n', type=int, default=500, help='pages crawled per run')
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--pages-per-host', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fetch-mode', choices=['head', 'stream'], default='stream')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each config and worker count')
+    parser.add_argument('--sample-interval', type=float, default=0.1, help='seconds between frontier samples')
+    parser.add_argument('--output', help='JSON file to write results into')
+    parser.add_argument('--baseline', help='JSON output of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    names = args.configs.split(',')
+    for name in names:
+        if name not in configs:
+            sys.exit(f"error: unknown config {name}")
+
+    runs = []
+    for name in names:
+        web = LocalWeb(hosts=args.hosts, pages_per_host=args.pages_per_host, seed=args.seed, **configs[name])
+        with web:
+            seeds = [f"{web.url(h)}/p/0.html" for h in range(args.hosts)]
+            for workers in map(int, args.workers.split(',')):
+                for i in range(args.repeat):
+                    result = run(web, seeds, args.n, workers, args.sample_interval, fetch_mode=args.fetch_mode)
+                    runs.append({'config': name, 'workers': workers, 'repeat': i, **result})
+
+                    f = result['frontier']
+                    print(f"{name:9} workers={workers:<4} pages={result['pages']:<6} pages/sec={result['pages_per_sec']:7.1f} "
+                          f"cpu/page={result['cpu_per_page_ms']:6.2f}ms peak rss={result['peak_rss_mb']:6.1f}MB "
+                          f"requests={result['requests']:<6} back queue urls={f['back_queue_urls']['peak']:<6} "
+                          f"violations={result['robots_violations']}")
+
+    output = {'time': time.time(), 'python': platform.python_version(), 'machine': platform.machine(),
+              'cpus': os.cpu_count(), 'args': vars(args), 'configs': {name: configs[name] for name in names}, 'runs': runs}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(runs, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}")
+        if regressions:
+            sys.exit(f"error: {len(regressions)} regressions against {args.baseline}")
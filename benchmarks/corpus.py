@@ -0,0 +1,34 @@
+import os
+from warcio.archiveiterator import ArchiveIterator
+
+def load_pages(paths: list[str], limit: int=None) -> list[tuple[str, bytes, str | None]]:
+    '''
+    Loads saved pages for the benchmarks as `(url, body, content_type)` tuples. Paths can be `.warc.gz` files written by
+    Corpus, or HTML files and directories of them (searched recursively), whose URL is their path.
+    '''
+
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, f) for root, _, names in os.walk(path) for f in names
+                           if f.endswith(('.html', '.htm', '.warc.gz')))
+        else:
+            files = [path]
+
+        for f in files:
+            if f.endswith('.warc.gz'):
+                with open(f, 'rb') as stream:
+                    for record in ArchiveIterator(stream):
+                        if record.rec_type != 'response':
+                            continue
+                        content_type = record.http_headers.get_header('Content-Type') if record.http_headers else None
+                        pages.append((record.rec_headers.get_header('WARC-Target-URI'),
+                                      record.content_stream().read(), content_type))
+            else:
+                with open(f, 'rb') as stream:
+                    pages.append((f"file://{os.path.abspath(f)}", stream.read(), None))
+
+            if limit and len(pages) >= limit:
+                return pages[:limit]
+
+    return pages
@@ -0,0 +1,251 @@
+import random
+import threading
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 #Crawlers open a lot of connections at once
+
+    def handle_error(self, request, client_address):
+        pass #Crawlers drop connections on purpose (aborted fetches, timeouts)
+
+class LocalWeb:
+    '''
+    Serves a generated web graph over local HTTP, used by the benchmarks. Each host is a separate server on its own port
+    of `127.0.0.1`, so the crawler sees `hosts` different domains. Pages link to `out_degree` pages on random hosts,
+    and every response is delayed by `latency` seconds. The graph is derived from `seed`, so runs are reproducible.
+
+    With `host_names`, URLs use names (`h0.localweb.test`, ...) instead of `127.0.0.1`, to be resolved by a stub resolver.
+
+    A `junk` fraction of links point to what a crawler should not spend requests on: images, PDFs and archives (`/f/...`),
+    and crawler traps (`/t/...`), pages linking to endlessly deeper paths and further pagination.
+
+    Pages get `words` words of random text. A `mirrors` fraction of links point to copies of pages: exact ones (`/m/...`),
+    and variants, like the pages of a mirror site with a slightly different template (`/v/<variant>/...`), linking to
+    their own copies.
+
+    Pages answer conditional requests: they have an ETag and a Last-Modified date, and get a 304 if unchanged. Bumping
+    `revision` changes a `changes` fraction of the pages. `bytes_sent` counts the bytes of bodies served, `requests` the
+    requests answered.
+
+    Latency gets a random `jitter` on top, `'uniform'` or `'exponential'` as set by `jitter_distribution`, with a mean
+    of `jitter` seconds. With `size_distribution='pareto'`, page text is heavy tailed instead of always `words` long,
+    averaging the same. A `redirects` fraction of links go through a 301 (`/r/...`), and a `throttled` fraction of
+    responses are 429s asking to retry after a second.
+
+    With `robots`, hosts serve a `robots.txt` with a `crawl_delay` if given, disallowing `/private/`, where a
+    `disallowed` fraction of links point. `violations` counts requests for disallowed pages.
+    '''
+
+    def __init__(self, hosts: int=20, pages_per_host: int=1000, out_degree: int=10, latency: float=0.05, seed: int=0,
+                 host_names: bool=False, junk: float=0, words: int=0, mirrors: float=0, changes: float=0,
+                 jitter: float=0, jitter_distribution: str='uniform', size_distribution: str='fixed', redirects: float=0,
+                 throttled: float=0, robots: bool=False, crawl_delay: float | None=None, disallowed: float=0):
+        self.hosts = hosts
+        self.pages_per_host = pages_per_host
+        self.out_degree = out_degree
+        self.latency = latency
+        self.seed = seed
+        self.host_names = host_names
+        self.junk = junk
+        self.words = words
+        self.mirrors = mirrors
+        self.changes = changes
+        self.jitter = jitter
+        self.jitter_distribution = jitter_distribution
+        self.size_distribution = size_distribution
+        self.redirects = redirects
+        self.throttled = throttled
+        self.robots = robots
+        self.crawl_delay = crawl_delay
+        self.disallowed = disallowed
+        self.revision = 0
+        self.bytes_sent = 0
+        self.requests = 0
+        self.violations = 0
+        self.lock = threading.Lock()
+
+        self.servers = []
+        self.threads = []
+
+    def start(self) -> list[str]:
+        'Starts all servers, returning one seed URL per host'
+
+        for _ in range(self.hosts):
+            server = _Server(('127.0.0.1', 0), self._handler())
+            t = threading.Thread(target=server.serve_forever, daemon=True)
+            t.start()
+            self.servers.append(server)
+            self.threads.append(t)
+
+        return [f"{self.url(h)}/p/0.html" for h in range(self.hosts)]
+
+    def stop(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def url(self, host: int) -> str:
+        name = f"h{host}.localweb.test" if self.host_names else '127.0.0.1'
+        return f"http://{name}:{self.servers[host].server_address[1]}"
+
+    def page(self, host: int, page: int, variant: int | None=None) -> bytes:
+        '''
+        Builds the HTML of a page, with links and text that only depend on the seed, host and page.
+        With a `variant`, builds that variant of the page instead.
+        '''
+
+        rand = random.Random(hash((self.seed, host, page)))
+        prefix = f"/v/{variant}" if variant is not None else '/p'
+        links = []
+        for _ in range(self.out_degree):
+            h = rand.randrange(self.hosts)
+            if self.mirrors and rand.random() < self.mirrors:
+                target = rand.randrange(self.pages_per_host)
+                if rand.random() < .5:
+                    links.append(f'<a href="{self.url(h)}/m/{target}.html">mirror</a>')
+                else:
+                    links.append(f'<a href="{self.url(h)}/v/{rand.randrange(10)}/{target}.html">variant</a>')
+            elif self.junk and rand.random() < self.junk / 2:
+                ext = rand.choice(['jpg', 'pdf', 'zip'])
+                links.append(f'<a href="{self.url(h)}/f/{rand.randrange(self.pages_per_host)}.{ext}">file</a>')
+            elif self.junk and rand.random() < self.junk / 2:
+                links.append(f'<a href="{self.url(h)}/t/{rand.randrange(self.pages_per_host)}/index.html">trap</a>')
+            elif self.redirects and rand.random() < self.redirects:
+                links.append(f'<a href="{self.url(h)}/r/{rand.randrange(self.pages_per_host)}.html">moved</a>')
+            elif self.disallowed and rand.random() < self.disallowed:
+                links.append(f'<a href="{self.url(h)}/private/{rand.randrange(self.pages_per_host)}.html">private</a>')
+            else:
+                links.append(f'<a href="{self.url(h)}{prefix}/{rand.randrange(self.pages_per_host)}.html">link</a>')
+
+        words = self.words
+        if self.size_distribution == 'pareto': #Mean of 2, capped so a page stays a page
+            words = min(int(words * rand.paretovariate(2) / 2), 50 * words)
+        text = ' '.join(f"w{rand.randrange(5000)}" for _ in range(words))
+        if variant is not None:
+            text = f"Mirror {variant}. " + text
+        changed = self.changed(host, page)
+        if changed:
+            text += f" Revision {changed}."
+
+        return (f"<html><head><title>Page {host}-{page}</title></head>"
+                f"<body><p>Synthetic page {page} of host {host}.</p><p>{text}</p>{''.join(links)}</body></html>").encode()
+
+    def changed(self, host: int, page: int) -> int:
+        'Last revision that changed a page, 0 if none did'
+
+        for revision in range(self.revision, 0, -1):
+            if random.Random(hash((self.seed, host, page, revision))).random() < self.changes:
+                return revision
+        return 0
+
+    def robots_txt(self) -> bytes:
+        delay = f"Crawl-delay: {self.crawl_delay}\n" if self.crawl_delay is not None else ''
+        return f"User-agent: *\n{delay}Disallow: /private/\n".encode()
+
+    def delay(self) -> float:
+        'Latency of a response, with its jitter'
+
+        if not self.jitter:
+            return self.latency
+        if self.jitter_distribution == 'exponential':
+            return self.latency + random.expovariate(1 / self.jitter)
+        return self.latency + random.uniform(0, 2 * self.jitter)
+
+    def trap(self, path: str) -> bytes:
+        'Builds a trap page, linking one level deeper and to the next page of itself'
+
+        base, _, query = path.partition('?')
+        n = int(query[5:]) + 1 if query.startswith('page=') and query[5:].isdigit() else 1
+        directory = base.rsplit('/', 1)[0]
+        return (f'<html><body><a href="{directory}/more/index.html">more</a>'
+                f'<a href="{base}?page={n}">next</a></body></html>').encode()
+
+    def _handler(self):
+        web = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' #Keep-alive
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body):
+                time.sleep(web.delay())
+                with web.lock:
+                    web.requests += 1
+
+                host = web.servers.index(self.server)
+                body, status, mime = b'not found', 404, 'text/html; charset=utf-8'
+                headers = {}
+                if web.throttled and random.random() < web.throttled:
+                    body, status, headers = b'slow down', 429, {'Retry-After': '1'}
+                elif self.path == '/robots.txt' and web.robots:
+                    body, status, mime = web.robots_txt(), 200, 'text/plain'
+                elif self.path.startswith('/r/'):
+                    status, headers = 301, {'Location': f"/p/{self.path[3:]}"}
+                    body = b'moved'
+                elif self.path.startswith('/private/') and self.path.endswith('.html') and self.path[9:-5].isdigit():
+                    body, status = web.page(host, int(self.path[9:-5]) % web.pages_per_host), 200
+                    if web.robots:
+                        with web.lock:
+                            web.violations += 1
+                elif self.path[:3] in ('/p/', '/m/', '/v/') and self.path.endswith('.html'):
+                    try:
+                        variant, _, page = self.path[3:-5].rpartition('/')
+                        page = int(page)
+                        variant = int(variant) if self.path.startswith('/v/') else None
+                        if 0 <= page < web.pages_per_host:
+                            body, status = web.page(host, page, variant), 200
+                            headers = {'ETag': f'"{zlib.crc32(body):08x}"',
+                                       'Last-Modified': formatdate(1600000000 + 86400 * web.changed(host, page), usegmt=True)}
+                            if self._not_modified(headers):
+                                body, status = b'', 304
+                    except ValueError:
+                        pass
+                elif self.path.startswith('/f/'):
+                    mime = {'jpg': 'image/jpeg', 'pdf': 'application/pdf'}.get(self.path.rsplit('.', 1)[-1], 'application/zip')
+                    body, status = bytes(4096), 200
+                elif self.path.startswith('/t/'):
+                    body, status = web.trap(self.path), 200
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header('Content-Type', mime)
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if send_body and body:
+                    self.wfile.write(body)
+                    with web.lock:
+                        web.bytes_sent += len(body)
+
+            def _not_modified(self, headers):
+                'Checks the validators of a conditional request, If-None-Match first'
+
+                if 'If-None-Match' in self.headers:
+                    return headers['ETag'] in [t.strip() for t in self.headers['If-None-Match'].split(',')]
+                try:
+                    return parsedate_to_datetime(self.headers['If-Modified-Since']) >= \
+                           parsedate_to_datetime(headers['Last-Modified'])
+                except (TypeError, ValueError):
+                    return False
+
+            def log_message(self, *args):
+                pass
+
+        Handler.server_version = 'LocalWeb'
+        return Handler
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
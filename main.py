@@ -1,6 +1,8 @@
 import argparse
 import sys
 from Crawler import Crawler
+from AsyncCrawler import AsyncCrawler
+from Shard import run_shards
 import threading
 
 def parse_arguments():
@@ -9,6 +11,44 @@ def parse_arguments():
     parser.add_argument('-s', type=str, help='path to seeds file', required=True)
     parser.add_argument('-n', type=int, help='target number of webpages to be crawled', required=True)
     parser.add_argument('-d', help='run in debug mode', action='store_true')
+    parser.add_argument('--mode', choices=['threads', 'async'], default='threads',
+                        help='crawl with a pool of worker threads or with a single asyncio event loop')
+    parser.add_argument('--concurrency', type=int, default=1000,
+                        help='number of concurrent fetch coroutines in async mode')
+    parser.add_argument('--min-workers', type=int, default=None,
+                        help='adapt the number of workers (coroutines in async mode) to the crawl at runtime, from this minimum')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='maximum number of workers when adapting, by default 4 times the fixed count (the concurrency in async mode)')
+    parser.add_argument('--fetch', choices=['head', 'stream'], default='head',
+                        help='send a HEAD before each GET, or a single streamed GET aborted early for non-HTML')
+    parser.add_argument('--seen-dir', type=str, default=None,
+                        help='track visited URLs exactly in a disk backed store in this directory, instead of only a Bloom filter')
+    parser.add_argument('--checkpoint-interval', type=float, default=300,
+                        help='seconds between checkpoints of the crawl state, 0 to disable')
+    parser.add_argument('--resume', help='resume from the last checkpoint instead of the seeds', action='store_true')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='number of crawler processes, each owning a share of the hosts')
+    parser.add_argument('--metrics-interval', type=float, default=30,
+                        help='seconds between snapshots of the crawl metrics in the output directory, 0 to disable')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve the crawl metrics over HTTP on this local port (the next ones for other shards)')
+    parser.add_argument('--profile-interval', type=float, default=0,
+                        help='sample the stack of every thread this often, in seconds, into profile.txt. 0 to disable')
+    parser.add_argument('--incremental', action='store_true',
+                        help='recrawl the pages stored in the output directory by previous runs with conditional requests')
+    parser.add_argument('--dedup', action='store_true',
+                        help='store exact duplicates of pages already crawled as revisits, and skip outlinks of near duplicates. '
+                             'Keeps about 1 KB per page in memory')
+    parser.add_argument('--max-per-host', type=int, default=1,
+                        help='fetch fast and healthy hosts whose robots.txt sets no crawl-delay with up to this many workers at once')
+    parser.add_argument('--latency-factor', type=float, default=10,
+                        help='without a crawl-delay, wait this many times the response time of a host between its fetches')
+    parser.add_argument('--min-delay', type=float, default=None,
+                        help='shortest delay between fetches of a host without a crawl-delay, in seconds. At least the default 0.1')
+    parser.add_argument('--max-delay', type=float, default=30,
+                        help='longest delay between fetches of a slow host without a crawl-delay, in seconds')
+    parser.add_argument('--slow-latency', type=float, default=1,
+                        help='hosts slower than this, in seconds, are never fetched by several workers at once')
 
     return parser.parse_args()
 
@@ -29,13 +69,45 @@ if __name__ == '__main__':
     except FileNotFoundError:
         sys.exit(f"error: file {args.s} not found")
     
-    #Call crawler
-    NUM_WORKERS = 12 #Sweetspot
-    c = Crawler(seeds, args.n, args.d, NUM_WORKERS)
-    threads = [threading.Thread(target=c.crawl, args= (i,)) for i in range(NUM_WORKERS)]
+    options = dict(fetch_mode=args.fetch, seen_dir=args.seen_dir,
+                   checkpoint_interval=args.checkpoint_interval, resume=args.resume, dedup=args.dedup,
+                   incremental=args.incremental, metrics_interval=args.metrics_interval, metrics_port=args.metrics_port,
+                   profile_interval=args.profile_interval, max_per_host=args.max_per_host,
+                   latency_factor=args.latency_factor, min_delay=args.min_delay, max_delay=args.max_delay,
+                   slow_latency=args.slow_latency)
 
-    for t in threads:
-        t.start()
-    
-    for t in threads:
-        t.join()
\ No newline at end of file
+    NUM_WORKERS = 12 #Sweetspot, see benchmarks/bench_suite.py
+    if args.mode == 'async' and args.concurrency <= 0:
+        sys.exit("error: concurrency must be positive")
+    if args.shards <= 0:
+        sys.exit("error: number of shards must be positive")
+    if args.max_per_host <= 0:
+        sys.exit("error: workers per host must be positive")
+    if args.latency_factor < 0 or args.max_delay < 0 or (args.min_delay or 0) < 0:
+        sys.exit("error: politeness delays must not be negative")
+
+    workers = args.concurrency if args.mode == 'async' else NUM_WORKERS
+    if args.min_workers is not None or args.max_workers is not None: #Adaptive, start every worker the controller may use
+        if args.max_workers is None:
+            args.max_workers = workers if args.mode == 'async' else 4 * NUM_WORKERS
+        options['min_workers'] = args.min_workers if args.min_workers is not None else 1
+        if not 0 < options['min_workers'] <= args.max_workers:
+            sys.exit("error: worker bounds must be positive, with --min-workers at most --max-workers")
+        workers = args.max_workers
+
+    if args.shards > 1:
+        run_shards(seeds, args.n, args.shards, args.mode == 'async', workers, args.d, **options)
+
+    elif args.mode == 'async':
+        AsyncCrawler(seeds, args.n, args.d, workers, **options).run()
+
+    else:
+        #Call crawler
+        c = Crawler(seeds, args.n, args.d, workers, **options)
+        threads = [threading.Thread(target=c.crawl, args= (i,)) for i in range(workers)]
+
+        for t in threads:
+            t.start()
+        
+        for t in threads:
+            t.join()
\ No newline at end of file